@@ -0,0 +1,103 @@
+import threading
+import time
+from typing import Optional
+import requests
+from .http_client import (
+    TOKEN_URL, HTTP_TIMEOUT, TOKEN_REFRESH_MARGIN, DEFAULT_TOKEN_EXPIRES_IN, create_session
+)
+from .rate_limit import RateLimiter, send_with_retry
+
+class TokenManager:
+    """Caches the Sophos OAuth token and refreshes it before it expires.
+
+    Safe to share between threads: concurrent callers that find the token
+    stale wait on one refresh instead of each calling id.sophos.com.
+    """
+
+    def __init__(
+        self,
+        client_id: str,
+        client_secret: str,
+        session: Optional[requests.Session] = None,
+        refresh_margin: float = TOKEN_REFRESH_MARGIN
+    ):
+        self.client_id = client_id
+        self.client_secret = client_secret
+        self.session = session or create_session()
+        self.refresh_margin = refresh_margin
+        self.access_token = None
+        self.expires_at = 0.0
+        self._lock = threading.Lock()
+
+    def _is_fresh(self) -> bool:
+        return self.access_token is not None and time.monotonic() < self.expires_at - self.refresh_margin
+
+    def get_token(self) -> Optional[str]:
+        """Return a valid access token, refreshing it if needed."""
+        if self._is_fresh():
+            return self.access_token
+
+        with self._lock:
+            # Another thread may have refreshed while we waited
+            if not self._is_fresh():
+                self._refresh()
+            return self.access_token
+
+    def invalidate(self, token: Optional[str] = None):
+        """Drop the cached token, e.g. after a 401.
+
+        Passing the rejected token only drops it if it is still current, so
+        a burst of 401s for one token causes a single refresh.
+        """
+        with self._lock:
+            if token is None or token == self.access_token:
+                self.access_token = None
+                self.expires_at = 0.0
+
+    def _refresh(self):
+        headers = {
+            "Content-Type": "application/x-www-form-urlencoded"
+        }
+
+        data = {
+            "grant_type": "client_credentials",
+            "client_id": self.client_id,
+            "client_secret": self.client_secret,
+            "scope": "token"
+        }
+
+        try:
+            response = self.session.post(TOKEN_URL, headers=headers, data=data, timeout=HTTP_TIMEOUT)
+            response.raise_for_status()
+
+            token_data = response.json()
+            self.access_token = token_data.get("access_token")
+            self.expires_at = time.monotonic() + float(token_data.get("expires_in") or DEFAULT_TOKEN_EXPIRES_IN)
+        except Exception as e:
+            print(f"❌ Error getting access token: {e}")
+            self.access_token = None
+            self.expires_at = 0.0
+
+    def request(self, method: str, url: str, rate_limiter: Optional[RateLimiter] = None, **kwargs) -> requests.Response:
+        """Send an authorized request, refreshing and retrying once on 401.
+
+        Throttled and 5xx responses are retried under ``rate_limiter``.
+        """
+        headers = dict(kwargs.pop("headers", None) or {})
+        kwargs.setdefault("timeout", HTTP_TIMEOUT)
+        token = None
+
+        def send():
+            headers["Authorization"] = f"Bearer {token}"
+            return self.session.request(method, url, headers=headers, **kwargs)
+
+        token = self.get_token()
+        response = send_with_retry(send, rate_limiter)
+
+        if response.status_code == 401:
+            response.close()
+            self.invalidate(token)
+            token = self.get_token()
+            response = send_with_retry(send, rate_limiter)
+
+        return response
@@ -0,0 +1,130 @@
+import asyncio
+import os
+import threading
+import uuid
+from collections import deque
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+# Events buffered per subscriber; a client that falls further behind loses the oldest
+STREAM_BUFFER_SIZE = int(os.getenv("STREAM_BUFFER_SIZE", "1000"))
+# Recent events kept for clients resuming with Last-Event-ID
+STREAM_REPLAY_SIZE = int(os.getenv("STREAM_REPLAY_SIZE", "5000"))
+# Seconds between keep-alive comments on an idle stream
+STREAM_HEARTBEAT_SECONDS = int(os.getenv("STREAM_HEARTBEAT_SECONDS", "15"))
+
+# Fields of siem_events pushed to subscribers, as in /data/events
+EVENT_FIELDS = (
+    "id", "event_id", "tenant_id", "endpoint_id", "event_type", "severity", "source",
+    "name", "location", "group", "created_at", "when", "fetched_at"
+)
+
+class Subscriber:
+    """One stream client: its filters and a bounded buffer of events to send."""
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, filters: Dict[str, Optional[str]], size: int):
+        self.loop = loop
+        self.filters = {field: value for field, value in filters.items() if value}
+        self.buffer: deque = deque(maxlen=size)
+        self.dropped = 0
+        self.ready = asyncio.Event()
+        self._lock = threading.Lock()
+
+    def matches(self, event: Dict[str, Any]) -> bool:
+        return all(event.get(field) == value for field, value in self.filters.items())
+
+    def push(self, items: List[Tuple[str, Dict[str, Any]]]):
+        """Buffer events from any thread, dropping the oldest when full."""
+        items = [item for item in items if self.matches(item[1])]
+        if not items:
+            return
+        with self._lock:
+            overflow = len(self.buffer) + len(items) - self.buffer.maxlen
+            if overflow > 0:
+                self.dropped += overflow
+            self.buffer.extend(items)
+        self.loop.call_soon_threadsafe(self.ready.set)
+
+    def drain(self) -> Tuple[List[Tuple[str, Dict[str, Any]]], int]:
+        """Take the buffered events and the number dropped since the last drain."""
+        with self._lock:
+            items, dropped = list(self.buffer), self.dropped
+            self.buffer.clear()
+            self.dropped = 0
+            self.ready.clear()
+        return items, dropped
+
+class EventBroadcaster:
+    """In-process fan-out of newly stored SIEM events to stream subscribers.
+
+    Every event gets an id ``<epoch>-<seq>``; the last ``STREAM_REPLAY_SIZE``
+    are kept so a reconnecting client can resume after its Last-Event-ID.
+    Ids from another process (or before a restart) can't be resumed.
+    """
+
+    def __init__(self, buffer_size: int = STREAM_BUFFER_SIZE, replay_size: int = STREAM_REPLAY_SIZE):
+        self.buffer_size = buffer_size
+        self.epoch = uuid.uuid4().hex[:8]
+        self._seq = 0
+        self._replay: deque = deque(maxlen=replay_size)
+        self._subscribers: List[Subscriber] = []
+        self._lock = threading.Lock()
+
+    def publish(self, rows: Iterable[Dict[str, Any]]):
+        """Hand committed siem_events rows to every subscriber. Safe from any thread."""
+        with self._lock:
+            items = []
+            for row in rows:
+                self._seq += 1
+                items.append((f"{self.epoch}-{self._seq}", {field: row.get(field) for field in EVENT_FIELDS}))
+            if not items:
+                return
+            self._replay.extend(items)
+            subscribers = list(self._subscribers)
+        for subscriber in subscribers:
+            subscriber.push(items)
+
+    def subscribe(self, filters: Dict[str, Optional[str]], last_event_id: Optional[str] = None) -> Tuple[Subscriber, bool]:
+        """Register a subscriber, pre-filled with the events after ``last_event_id``.
+
+        Returns the subscriber and whether the resume was complete; False means
+        events after ``last_event_id`` are no longer (or never were) in this
+        process's replay buffer.
+        """
+        subscriber = Subscriber(asyncio.get_running_loop(), filters, self.buffer_size)
+        complete = True
+        with self._lock:
+            if last_event_id:
+                epoch, _, seq = last_event_id.partition("-")
+                oldest = int(self._replay[0][0].rpartition("-")[2]) if self._replay else self._seq + 1
+                if epoch != self.epoch or not seq.isdigit() or int(seq) + 1 < oldest:
+                    complete = False
+                else:
+                    subscriber.push([item for item in self._replay if int(item[0].rpartition("-")[2]) > int(seq)])
+            self._subscribers.append(subscriber)
+        return subscriber, complete
+
+    def unsubscribe(self, subscriber: Subscriber):
+        with self._lock:
+            if subscriber in self._subscribers:
+                self._subscribers.remove(subscriber)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "subscribers": len(self._subscribers),
+                "published": self._seq,
+                "last_event_id": f"{self.epoch}-{self._seq}" if self._seq else None,
+                "replay_buffered": len(self._replay)
+            }
+
+event_broadcaster = EventBroadcaster()
+
+def sse_message(data: str, event: Optional[str] = None, event_id: Optional[str] = None) -> str:
+    """Format one Server-Sent Events message."""
+    lines = []
+    if event_id:
+        lines.append(f"id: {event_id}")
+    if event:
+        lines.append(f"event: {event}")
+    lines.extend(f"data: {line}" for line in data.split("\n"))
+    return "\n".join(lines) + "\n\n"
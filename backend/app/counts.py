@@ -0,0 +1,72 @@
+import json
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+from sqlalchemy.orm import Query
+from .versions import dataset_version
+
+# Exact counts kept per dataset and filter set
+COUNT_CACHE_SIZE = 256
+# Below this planner estimate, estimated mode counts exactly (and caches it)
+EXACT_COUNT_THRESHOLD = int(os.getenv("EXACT_COUNT_THRESHOLD", "10000"))
+
+_cache: "OrderedDict[Tuple[str, str], Tuple[str, int]]" = OrderedDict()
+_lock = threading.Lock()
+
+def _cached(key: Tuple[str, str], version: str) -> Optional[int]:
+    with _lock:
+        entry = _cache.get(key)
+        if entry is None or entry[0] != version:
+            return None
+        _cache.move_to_end(key)
+        return entry[1]
+
+def _store(key: Tuple[str, str], version: str, count: int):
+    with _lock:
+        _cache[key] = (version, count)
+        _cache.move_to_end(key)
+        while len(_cache) > COUNT_CACHE_SIZE:
+            _cache.popitem(last=False)
+
+def planner_estimate(query: Query) -> Optional[int]:
+    """Row count the Postgres planner expects ``query`` to return."""
+    session = query.session
+    if session.get_bind().dialect.name != "postgresql":
+        return None
+    compiled = query.order_by(None).statement.compile(dialect=session.get_bind().dialect)
+    plan = session.connection().exec_driver_sql(
+        "EXPLAIN (FORMAT JSON) " + str(compiled), compiled.params
+    ).scalar()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]["Plan"]["Plan Rows"])
+
+def count_rows(query: Query, dataset: str, filters: Dict[str, Any], mode: str) -> Tuple[Optional[int], str]:
+    """Total rows of a list query and the count mode actually used.
+
+    ``exact`` runs COUNT(*) unless a count for the same filters is cached at
+    the dataset's current version. ``estimated`` returns such a cached count
+    when there is one and the planner's row estimate otherwise, unless the
+    estimate is under ``EXACT_COUNT_THRESHOLD`` rows or unavailable; then it
+    counts exactly too. Every exact count is cached, and ingestion bumps the
+    dataset version, which invalidates them.
+    """
+    if mode == "none":
+        return None, "none"
+
+    key = (dataset, json.dumps(filters, sort_keys=True, default=str))
+    version = dataset_version(dataset)
+    count = _cached(key, version) if version is not None else None
+    if count is not None:
+        return count, "exact"
+
+    if mode == "estimated":
+        estimate = planner_estimate(query)
+        if estimate is not None and estimate >= EXACT_COUNT_THRESHOLD:
+            return estimate, "estimated"
+
+    count = query.order_by(None).count()
+    if version is not None:
+        _store(key, version, count)
+    return count, "exact"
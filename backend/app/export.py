@@ -0,0 +1,109 @@
+import csv
+import io
+import json
+import os
+import zlib
+from datetime import datetime
+from typing import Any, Iterator, List
+from sqlalchemy import select
+from .database import session_scope, Endpoint, SIEMEvent, ENDPOINT_SORT_KEY
+
+# Rows fetched per round trip from the server-side cursor, and written per chunk
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "2000"))
+
+EXPORT_FORMATS = {
+    "ndjson": ("application/x-ndjson", "ndjson"),
+    "csv": ("text/csv", "csv"),
+}
+
+EVENT_EXPORT_COLUMNS = [
+    SIEMEvent.id, SIEMEvent.event_id, SIEMEvent.tenant_id, SIEMEvent.endpoint_id,
+    SIEMEvent.event_type, SIEMEvent.severity, SIEMEvent.source, SIEMEvent.name,
+    SIEMEvent.location, SIEMEvent.group, SIEMEvent.created_at, SIEMEvent.when,
+    SIEMEvent.fetched_at,
+]
+
+ENDPOINT_EXPORT_COLUMNS = [
+    Endpoint.id, Endpoint.endpoint_id, Endpoint.tenant_id, Endpoint.hostname,
+    Endpoint.os_name, Endpoint.endpoint_type, Endpoint.online_status,
+    Endpoint.health_status, Endpoint.group_name, Endpoint.ip_addresses,
+    Endpoint.created_at, Endpoint.updated_at, Endpoint.deleted_at,
+]
+
+def events_export_query(start=None, end=None, tenant_id=None, severity=None, event_type=None):
+    """SIEM events oldest first, so an export can be resumed from its last ``created_at``."""
+    query = select(*EVENT_EXPORT_COLUMNS)
+    if start:
+        query = query.where(SIEMEvent.created_at >= start)
+    if end:
+        query = query.where(SIEMEvent.created_at < end)
+    if tenant_id:
+        query = query.where(SIEMEvent.tenant_id == tenant_id)
+    if severity:
+        query = query.where(SIEMEvent.severity == severity)
+    if event_type:
+        query = query.where(SIEMEvent.event_type == event_type)
+    return query.order_by(SIEMEvent.created_at, SIEMEvent.id)
+
+def endpoints_export_query(tenant_id=None, online_only=False, include_deleted=False):
+    """Endpoints in the same hostname order as ``/data/endpoints``."""
+    query = select(*ENDPOINT_EXPORT_COLUMNS)
+    if not include_deleted:
+        query = query.where(Endpoint.deleted_at.is_(None))
+    if tenant_id:
+        query = query.where(Endpoint.tenant_id == tenant_id)
+    if online_only:
+        query = query.where(Endpoint.online_status == True)
+    return query.order_by(*ENDPOINT_SORT_KEY)
+
+def _json_default(value: Any):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+def _csv_value(value: Any):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, (list, dict)):
+        return json.dumps(value)
+    return value
+
+def _encode_batch(rows, names: List[str], fmt: str) -> bytes:
+    if fmt == "csv":
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerows([_csv_value(value) for value in row] for row in rows)
+        return buffer.getvalue().encode()
+    return "".join(
+        json.dumps(dict(zip(names, row)), default=_json_default) + "\n" for row in rows
+    ).encode()
+
+def stream_export(query, fmt: str = "ndjson", compress: bool = False) -> Iterator[bytes]:
+    """Yield an export of ``query`` as NDJSON or CSV chunks, optionally gzipped.
+
+    Rows come from a server-side cursor ``EXPORT_BATCH_SIZE`` at a time and
+    each batch is written out before the next is fetched, so memory stays flat
+    however many rows are exported. The generator owns its session, which
+    stays open for as long as the client keeps reading.
+    """
+    names = [column.key for column in query.selected_columns]
+    gzipper = zlib.compressobj(wbits=31) if compress else None
+
+    def emit(data: bytes) -> bytes:
+        return gzipper.compress(data) if gzipper else data
+
+    if fmt == "csv":
+        yield emit(_encode_batch([names], names, "csv"))
+
+    count = 0
+    with session_scope() as db:
+        result = db.execute(query.execution_options(yield_per=EXPORT_BATCH_SIZE))
+        for rows in result.partitions():
+            count += len(rows)
+            chunk = emit(_encode_batch(rows, names, fmt))
+            if chunk:
+                yield chunk
+
+    if gzipper:
+        yield gzipper.flush()
+    print(f"📤 Exported {count} rows as {fmt}{' (gzip)' if compress else ''}")
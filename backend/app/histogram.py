@@ -0,0 +1,132 @@
+import os
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from .database import SIEMEvent, SIEMEventRollup
+from .writers import naive_utc
+
+# Bucket width -> its length and the window charted when no start is given
+HISTOGRAM_BUCKETS = {
+    "minute": (timedelta(minutes=1), timedelta(hours=1)),
+    "hour": (timedelta(hours=1), timedelta(days=1)),
+    "day": (timedelta(days=1), timedelta(days=30)),
+}
+
+# group_by -> (rollup dimension, siem_events column)
+HISTOGRAM_GROUPS = {
+    "severity": ("severity", SIEMEvent.severity),
+    "type": ("type", SIEMEvent.event_type),
+    "endpoint_id": ("endpoint", SIEMEvent.endpoint_id),
+    "group": ("group", SIEMEvent.group),
+}
+
+# Largest number of buckets one histogram may span
+MAX_HISTOGRAM_BUCKETS = int(os.getenv("MAX_HISTOGRAM_BUCKETS", "5000"))
+
+def floor_bucket(value: datetime, bucket: str) -> datetime:
+    value = value.replace(second=0, microsecond=0)
+    if bucket in ("hour", "day"):
+        value = value.replace(minute=0)
+    if bucket == "day":
+        value = value.replace(hour=0)
+    return value
+
+def _event_counts(
+    db: Session, bucket: str, group_by: Optional[str], start: datetime, end: datetime, tenant_id: Optional[str]
+) -> List[Any]:
+    """(bucket, [group,] count) rows grouped from ``siem_events`` between ``start`` and ``end``."""
+    time_bucket = func.date_trunc(bucket, SIEMEvent.created_at)
+    group = HISTOGRAM_GROUPS[group_by][1] if group_by else None
+    group_columns = [time_bucket] + ([group] if group is not None else [])
+    query = db.query(*group_columns, func.count())
+    query = query.filter(SIEMEvent.created_at >= start, SIEMEvent.created_at < end)
+    if tenant_id:
+        query = query.filter(SIEMEvent.tenant_id == tenant_id)
+    return query.group_by(*group_columns).order_by(time_bucket).all()
+
+def event_histogram(
+    db: Session,
+    bucket: str = "hour",
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    group_by: Optional[str] = None,
+    tenant_id: Optional[str] = None
+) -> Dict[str, Any]:
+    """Event counts per time bucket, optionally split by ``group_by``, from grouped queries.
+
+    Hour and day buckets are summed from the hourly rollups, so their cost
+    depends on the window rather than on the number of events; only the
+    part of the last hour before ``end`` is counted from ``siem_events``.
+    Minute buckets group ``siem_events`` itself over the partitions in the
+    window.
+
+    Every bucket from ``start`` (rounded down) to ``end`` is returned, empty
+    ones with a count of 0. Raises ``ValueError`` for more than
+    ``MAX_HISTOGRAM_BUCKETS`` buckets or an unknown ``bucket``/``group_by``.
+    """
+    if bucket not in HISTOGRAM_BUCKETS:
+        raise ValueError(f"Unknown bucket '{bucket}'")
+    if group_by is not None and group_by not in HISTOGRAM_GROUPS:
+        raise ValueError(f"Unknown group_by '{group_by}'")
+
+    width, default_window = HISTOGRAM_BUCKETS[bucket]
+    end = naive_utc(end) if end else datetime.utcnow()
+    start = naive_utc(start) if start else end - default_window
+    if start >= end:
+        raise ValueError("start must be before end")
+    start = floor_bucket(start, bucket)
+    if (end - start) / width > MAX_HISTOGRAM_BUCKETS:
+        raise ValueError(f"More than {MAX_HISTOGRAM_BUCKETS} {bucket} buckets; narrow the range or widen the bucket")
+
+    if bucket == "minute":
+        source = "events"
+        rows = _event_counts(db, bucket, group_by, start, end, tenant_id)
+    else:
+        source = "rollups"
+        # Rollups hold whole hours, and the hour ``end`` falls in reaches past
+        # it, so that part is counted from the events themselves
+        rollup_end = floor_bucket(end, "hour")
+        time_bucket = func.date_trunc(bucket, SIEMEventRollup.bucket)
+        group = SIEMEventRollup.value if group_by else None
+        # Every event is counted once per dimension; severity stands in for "all"
+        dimension = HISTOGRAM_GROUPS[group_by][0] if group_by else "severity"
+        query = db.query(time_bucket, *([group] if group is not None else []), func.sum(SIEMEventRollup.count))
+        query = query.filter(
+            SIEMEventRollup.dimension == dimension,
+            SIEMEventRollup.bucket >= start,
+            SIEMEventRollup.bucket < rollup_end
+        )
+        if tenant_id:
+            query = query.filter(SIEMEventRollup.tenant_id == tenant_id)
+        group_columns = [time_bucket] + ([group] if group is not None else [])
+        rows = query.group_by(*group_columns).order_by(time_bucket).all()
+        if rollup_end < end:
+            rows += _event_counts(db, bucket, group_by, rollup_end, end, tenant_id)
+
+    buckets: Dict[datetime, Dict[str, Any]] = {}
+    moment = start
+    while moment < end:
+        buckets[moment] = {"bucket": moment, "count": 0, **({"groups": {}} if group_by else {})}
+        moment += width
+    for row in rows:
+        entry = buckets.get(row[0])
+        if entry is None:
+            continue
+        count = int(row[-1])
+        entry["count"] += count
+        if group_by:
+            # Rollups store missing values as ""
+            value = row[1] or None
+            entry["groups"][value] = entry["groups"].get(value, 0) + count
+
+    series: List[Dict[str, Any]] = list(buckets.values())
+    return {
+        "bucket": bucket,
+        "start": start,
+        "end": end,
+        "group_by": group_by,
+        "source": source,
+        "total": sum(entry["count"] for entry in series),
+        "buckets": series
+    }
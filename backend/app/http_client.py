@@ -0,0 +1,66 @@
+import os
+from typing import Optional
+import requests
+from requests.adapters import HTTPAdapter
+
+try:
+    import httpx
+except ImportError:  # the async client is optional
+    httpx = None
+
+TOKEN_URL = "https://id.sophos.com/api/v2/oauth2/token"
+DEFAULT_API_HOST = "https://api-us01.central.sophos.com"
+GLOBAL_API_HOST = "https://api.central.sophos.com"
+WHOAMI_PATH = "/whoami/v1"
+PARTNER_TENANTS_PATH = "/partner/v1/tenants"
+ORGANIZATION_TENANTS_PATH = "/organization/v1/tenants"
+ENDPOINTS_PATH = "/endpoint/v1/endpoints"
+SIEM_EVENTS_PATH = "/siem/v1/events"
+
+# Refresh tokens this many seconds before they actually expire
+TOKEN_REFRESH_MARGIN = 60
+
+# Used when the token response has no expires_in (Sophos issues 1h tokens)
+DEFAULT_TOKEN_EXPIRES_IN = 3600
+
+# Connection pool settings, shared by the sync and async clients
+POOL_CONNECTIONS = int(os.getenv("SOPHOS_HTTP_POOL_CONNECTIONS", "4"))
+POOL_MAXSIZE = int(os.getenv("SOPHOS_HTTP_POOL_MAXSIZE", "10"))
+HTTP_TIMEOUT = float(os.getenv("SOPHOS_HTTP_TIMEOUT", "30"))
+
+DEFAULT_HEADERS = {
+    "Accept": "application/json",
+    "Accept-Encoding": "gzip, deflate",
+    "Connection": "keep-alive",
+}
+
+def create_session(
+    pool_connections: int = POOL_CONNECTIONS,
+    pool_maxsize: int = POOL_MAXSIZE
+) -> requests.Session:
+    """Create a keep-alive session with a pooled adapter for the Sophos hosts.
+
+    ``pool_connections`` is the number of hosts to keep pools for and
+    ``pool_maxsize`` the connections kept open per host.
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers.update(DEFAULT_HEADERS)
+    return session
+
+def create_async_client(
+    max_connections: int = POOL_MAXSIZE,
+    max_keepalive_connections: Optional[int] = None,
+    timeout: float = HTTP_TIMEOUT
+) -> "httpx.AsyncClient":
+    """Create a pooled ``httpx.AsyncClient`` for use on the event loop."""
+    if httpx is None:
+        raise RuntimeError("httpx is required for the async Sophos client")
+
+    limits = httpx.Limits(
+        max_connections=max_connections,
+        max_keepalive_connections=max_keepalive_connections or max_connections
+    )
+    return httpx.AsyncClient(limits=limits, timeout=timeout, headers=DEFAULT_HEADERS)
@@ -0,0 +1,199 @@
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+# Ingestion jobs run at the same time (each on its own stream)
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "4"))
+# Finished jobs kept for GET /jobs/{id}
+JOB_HISTORY = int(os.getenv("JOB_HISTORY", "100"))
+
+ACTIVE_STATUSES = ("queued", "running", "cancelling")
+# Streams jobs run on; at most one active job each
+JOB_STREAMS = ("endpoints", "siem_events", "siem_backfill")
+
+class JobCancelled(Exception):
+    """Raised inside a sync when its job has been cancelled."""
+
+class JobAlreadyRunning(Exception):
+    """A job for the same stream is still queued or running."""
+
+    def __init__(self, job: "Job"):
+        super().__init__(f"{job.stream} sync is already {job.status} as job {job.id}")
+        self.job = job
+
+class JobProgress:
+    """Progress counters a sync updates as it stores pages; also carries cancellation.
+
+    ``total``/``done`` count the units a sync knows up front and drive the
+    ETA: endpoint pages (from the API's page total), SIEM events (up to
+    ``max_events``) or backfill slices. Without a total there is no ETA.
+    """
+
+    def __init__(self):
+        self.pages = 0
+        self.rows = 0
+        self.total = 0
+        self.done = 0
+        self.started = None
+        self._cancelled = threading.Event()
+        self._lock = threading.Lock()
+
+    def add_page(self, rows: int):
+        with self._lock:
+            self.pages += 1
+            self.rows += rows
+
+    def expect(self, units: int):
+        with self._lock:
+            self.total += units
+
+    def complete(self, units: int = 1):
+        with self._lock:
+            self.done += units
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled.is_set()
+
+    def cancel(self):
+        self._cancelled.set()
+
+    def check_cancelled(self):
+        if self._cancelled.is_set():
+            raise JobCancelled("Job cancelled")
+
+    def to_dict(self) -> Dict[str, Any]:
+        elapsed = time.monotonic() - self.started if self.started else 0.0
+        eta = None
+        if self.total and self.done and elapsed:
+            eta = round(elapsed * (self.total - self.done) / self.done, 1)
+        return {
+            "pages": self.pages,
+            "rows": self.rows,
+            "rows_per_sec": round(self.rows / elapsed, 1) if elapsed else None,
+            "done": self.done,
+            "total": self.total or None,
+            "elapsed_seconds": round(elapsed, 1),
+            "eta_seconds": eta
+        }
+
+class Job:
+    def __init__(self, stream: str, params: Dict[str, Any]):
+        self.id = uuid.uuid4().hex
+        self.stream = stream
+        self.params = params
+        self.status = "queued"
+        self.progress = JobProgress()
+        self.result: Optional[Dict[str, Any]] = None
+        self.error: Optional[str] = None
+        self.created_at = datetime.utcnow()
+        self.started_at: Optional[datetime] = None
+        self.finished_at: Optional[datetime] = None
+        self.future = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "stream": self.stream,
+            "params": self.params,
+            "status": self.status,
+            "progress": self.progress.to_dict(),
+            "result": self.result,
+            "error": self.error,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at
+        }
+
+class JobRegistry:
+    """Runs ingestion jobs on a small pool, at most one active job per stream."""
+
+    def __init__(self, max_workers: int = JOB_WORKERS, history: int = JOB_HISTORY):
+        self.history = history
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._active: Dict[str, Job] = {}
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="ingest-job")
+
+    def submit(self, stream: str, target: Callable[..., Dict[str, Any]], *args, **kwargs) -> Job:
+        """Queue ``target(*args, progress=..., **kwargs)`` as the job of ``stream``.
+
+        Raises ``JobAlreadyRunning`` if that stream already has an active job.
+        """
+        with self._lock:
+            active = self._active.get(stream)
+            if active is not None:
+                raise JobAlreadyRunning(active)
+            job = Job(stream, dict(kwargs))
+            self._active[stream] = job
+            self._jobs[job.id] = job
+            self._prune()
+        job.future = self._pool.submit(self._run, job, target, args, kwargs)
+        return job
+
+    def _run(self, job: Job, target, args, kwargs):
+        try:
+            if job.progress.cancelled:
+                job.status = "cancelled"
+                return
+            job.status = "running"
+            job.started_at = datetime.utcnow()
+            job.progress.started = time.monotonic()
+            print(f"🚀 Job {job.id} ({job.stream}) started")
+
+            result = target(*args, progress=job.progress, **kwargs)
+            job.result = result
+            # Syncs report errors, including cancellation, in their result
+            failed = isinstance(result, dict) and result.get("success") is False
+            if failed:
+                job.error = result.get("error")
+            if job.progress.cancelled:
+                job.status = "cancelled"
+            elif failed:
+                job.status = "failed"
+            else:
+                job.status = "succeeded"
+        except Exception as e:
+            job.status = "cancelled" if isinstance(e, JobCancelled) else "failed"
+            job.error = str(e)
+        finally:
+            job.finished_at = datetime.utcnow()
+            with self._lock:
+                if self._active.get(job.stream) is job:
+                    del self._active[job.stream]
+            print(f"🏁 Job {job.id} ({job.stream}) {job.status}")
+
+    def _prune(self):
+        finished = [job_id for job_id, job in self._jobs.items() if job.status not in ACTIVE_STATUSES]
+        for job_id in finished[:max(0, len(finished) - self.history)]:
+            del self._jobs[job_id]
+
+    def get(self, job_id: str) -> Optional[Job]:
+        return self._jobs.get(job_id)
+
+    def list(self) -> List[Job]:
+        return list(reversed(self._jobs.values()))
+
+    def cancel(self, job_id: str) -> Optional[Job]:
+        """Ask a job to stop. A running sync stops after the page it is storing."""
+        job = self._jobs.get(job_id)
+        if job is None or job.status not in ACTIVE_STATUSES:
+            return job
+        job.progress.cancel()
+        if job.status == "running":
+            job.status = "cancelling"
+        elif job.future is not None and job.future.cancel():
+            # Never started, so _run won't clean up after it
+            job.status = "cancelled"
+            job.finished_at = datetime.utcnow()
+            with self._lock:
+                if self._active.get(job.stream) is job:
+                    del self._active[job.stream]
+        return job
+
+job_registry = JobRegistry()
@@ -1,18 +1,42 @@
-from fastapi import FastAPI, Depends, HTTPException, BackgroundTasks
+from fastapi import FastAPI, Depends, HTTPException, Header, Request, Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse
+from anyio import to_thread
 from fastapi.middleware.cors import CORSMiddleware
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, load_only, undefer
 from sqlalchemy import func, desc
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Literal
+import asyncio
+import json
+import os
 import schedule
 import threading
 import time
 from datetime import datetime, timedelta
 
-from .database import get_db, create_tables, Endpoint, SIEMEvent
-from .sophos_client import SophosClient
+from .database import (
+    get_db, session_scope, pool_stats, create_tables, DB_POOL_SIZE, DB_MAX_OVERFLOW,
+    Endpoint, SIEMEvent, SIEMEventPayload, SyncState, ENDPOINT_SORT_KEY
+)
+from .partitions import maintain_partitions
+from .rollups import rollup_counts
+from .histogram import event_histogram
+from .pagination import keyset_page, MAX_PAGE_SIZE
+from .counts import count_rows
+from .versions import EVENTS, ENDPOINTS
+from .response_cache import response_cache_middleware
+from .broadcast import event_broadcaster, sse_message, STREAM_HEARTBEAT_SECONDS
+from .export import stream_export, events_export_query, endpoints_export_query, EXPORT_FORMATS
+from .sophos_client import SophosClient, TENANT_WORKERS, SIEM_BACKFILL_WORKERS, ENDPOINT_INCREMENTAL_MINUTES
+from .jobs import job_registry, JobAlreadyRunning, JOB_WORKERS, JOB_STREAMS
+from .sync_state import reset_sync_state, sync_state_to_dict
+from .rate_limit import rate_limit_stats
 
 app = FastAPI(title="Sophos Aggregator API", version="1.0.0")
 
+# Response cache for the read routes; registered first so CORS wraps it
+app.middleware("http")(response_cache_middleware)
+
 # CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -22,6 +46,18 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Connections sync jobs can hold at once: one job per stream, each fanning out
+# over tenants or backfill slices with a session per worker
+INGEST_CONNECTIONS = min(JOB_WORKERS, len(JOB_STREAMS)) * max(TENANT_WORKERS, SIEM_BACKFILL_WORKERS)
+# Threads available to the blocking (plain def) route handlers. Each may hold
+# a session, so by default they get the DB pool left over by the sync jobs
+API_THREADPOOL_SIZE = int(os.getenv(
+    "API_THREADPOOL_SIZE", str(max(4, DB_POOL_SIZE + DB_MAX_OVERFLOW - INGEST_CONNECTIONS))
+))
+if API_THREADPOOL_SIZE + INGEST_CONNECTIONS > DB_POOL_SIZE + DB_MAX_OVERFLOW:
+    print(f"⚠️  {API_THREADPOOL_SIZE} request threads and up to {INGEST_CONNECTIONS} sync connections "
+          f"exceed the DB pool ({DB_POOL_SIZE}+{DB_MAX_OVERFLOW}); requests may wait for connections")
+
 # Global client instance
 sophos_client = SophosClient()
 
@@ -31,7 +67,10 @@ scheduler_running = False
 @app.on_event("startup")
 async def startup_event():
     """Initialize database tables and start scheduler on startup."""
+    # Plain def routes run in this pool, keeping DB and Sophos calls off the event loop
+    to_thread.current_default_thread_limiter().total_tokens = API_THREADPOOL_SIZE
     create_tables()
+    maintain_partitions()
     
     # Auto-start scheduler if enabled via environment variable
     import os
@@ -55,9 +94,22 @@ async def root():
             "health": "/health",
             "fetch_endpoints": "/fetch/endpoints",
             "fetch_events": "/fetch/events",
+            "backfill_events": "/backfill/events",
             "get_endpoints": "/data/endpoints",
             "get_events": "/data/events",
+            "get_event_raw": "/data/events/{event_id}/raw",
+            "get_event_histogram": "/data/events/histogram",
             "get_stats": "/data/stats",
+            "export_events": "/export/events",
+            "export_endpoints": "/export/endpoints",
+            "stream_events": "/stream/events",
+            "tenants": "/tenants",
+            "sync_state": "/sync/state",
+            "reset_cursor": "/sync/reset/{stream}",
+            "rate_limits": "/rate-limits",
+            "db_pool": "/db/pool",
+            "jobs": "/jobs",
+            "job": "/jobs/{job_id}",
             "start_scheduler": "/scheduler/start",
             "stop_scheduler": "/scheduler/stop"
         }
@@ -68,66 +120,168 @@ async def health_check():
     """Health check endpoint."""
     return {"status": "healthy", "timestamp": datetime.utcnow()}
 
-@app.post("/fetch/endpoints")
-async def fetch_endpoints(
-    background_tasks: BackgroundTasks,
-    page_size: int = 100,
-    db: Session = Depends(get_db)
-):
-    """Fetch and store endpoint data from Sophos API."""
+@app.get("/tenants")
+def get_tenants():
+    """List the tenants the configured credentials can sync."""
     try:
-        result = sophos_client.fetch_endpoints(db, page_size)
-        return {
-            "message": "Endpoint data fetched successfully",
-            "result": result,
-            "timestamp": datetime.utcnow()
-        }
+        tenants = sophos_client.discover_tenants()
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        raise HTTPException(status_code=502, detail=str(e))
+    return {"total": len(tenants), "tenants": tenants}
+
+def enqueue(response: Response, stream: str, target, *args, **kwargs) -> Dict[str, Any]:
+    """Queue a sync job and answer with its id, or 409 while the stream is already syncing."""
+    try:
+        job = job_registry.submit(stream, target, *args, **kwargs)
+    except JobAlreadyRunning as e:
+        raise HTTPException(status_code=409, detail=jsonable_encoder({"message": str(e), "job": e.job.to_dict()}))
+    response.headers["Location"] = f"/jobs/{job.id}"
+    return {
+        "message": f"{stream} sync queued",
+        "job": job.to_dict(),
+        "timestamp": datetime.utcnow()
+    }
+
+@app.post("/fetch/endpoints", status_code=202)
+def fetch_endpoints(
+    response: Response,
+    page_size: int = 100,
+    all_tenants: bool = False,
+    incremental: bool = False
+):
+    """Queue an endpoint sync from the Sophos API; follow it at ``/jobs/{id}``."""
+    if all_tenants:
+        return enqueue(response, "endpoints", sophos_client.sync_tenants, "endpoints",
+                       page_size=page_size, incremental=incremental)
+    return enqueue(response, "endpoints", run_with_session, sophos_client.fetch_endpoints,
+                   page_size=page_size, incremental=incremental)
 
-@app.post("/fetch/events")
-async def fetch_events(
-    background_tasks: BackgroundTasks,
+@app.post("/fetch/events", status_code=202)
+def fetch_events(
+    response: Response,
     max_events: int = 100000,
-    db: Session = Depends(get_db)
+    all_tenants: bool = False
 ):
-    """Fetch and store SIEM events from Sophos API."""
-    try:
-        result = sophos_client.fetch_siem_events(db, max_events)
-        return {
-            "message": "SIEM events fetched successfully",
-            "result": result,
-            "timestamp": datetime.utcnow()
-        }
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+    """Queue a SIEM event sync from the Sophos API; follow it at ``/jobs/{id}``."""
+    if all_tenants:
+        return enqueue(response, "siem_events", sophos_client.sync_tenants, "siem_events", max_events=max_events)
+    return enqueue(response, "siem_events", run_with_session, sophos_client.fetch_siem_events, max_events=max_events)
 
+@app.post("/backfill/events", status_code=202)
+def backfill_events(
+    response: Response,
+    hours: int = 24,
+    slice_minutes: int = 60,
+    all_tenants: bool = False
+):
+    """Queue a backfill of recent SIEM events as time slices fetched in parallel, resuming interrupted runs."""
+    if all_tenants:
+        return enqueue(response, "siem_backfill", sophos_client.sync_tenants, "siem_backfill",
+                       hours=hours, slice_minutes=slice_minutes)
+    return enqueue(response, "siem_backfill", sophos_client.backfill_siem_events,
+                   hours=hours, slice_minutes=slice_minutes)
+
+@app.get("/jobs")
+async def list_jobs(status: str = None):
+    """List recent sync jobs, newest first."""
+    jobs = [job.to_dict() for job in job_registry.list() if status is None or job.status == status]
+    return {"total": len(jobs), "jobs": jobs}
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    """Get a sync job's status and progress: pages, rows, rate and ETA."""
+    job = job_registry.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"No job '{job_id}'")
+    return job.to_dict()
+
+@app.delete("/jobs/{job_id}")
+async def cancel_job(job_id: str):
+    """Cancel a sync job. A running sync stops after the page it is storing."""
+    job = job_registry.cancel(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"No job '{job_id}'")
+    if job.status not in ("cancelling", "cancelled"):
+        raise HTTPException(status_code=409, detail=f"Job '{job_id}' already {job.status}")
+    return job.to_dict()
+
+@app.get("/sync/state")
+def get_sync_state(db: Session = Depends(get_db)):
+    """Get the saved incremental sync position of every stream."""
+    states = db.query(SyncState).order_by(SyncState.stream).all()
+    return {"streams": [sync_state_to_dict(state) for state in states]}
+
+@app.post("/sync/reset/{stream}")
+def reset_sync_cursor(stream: str, forget: bool = False, db: Session = Depends(get_db)):
+    """Reset the saved cursor of a stream; the next sync resumes from its high-water mark.
+    
+    ``forget=true`` deletes the stream's state so the next sync starts over.
+    """
+    if not reset_sync_state(db, stream, forget):
+        raise HTTPException(status_code=404, detail=f"No sync state for stream '{stream}'")
+    return {
+        "message": f"State of '{stream}' forgotten" if forget else f"Cursor for '{stream}' reset",
+        "timestamp": datetime.utcnow()
+    }
+
+@app.get("/db/pool")
+async def get_db_pool():
+    """Get database connection pool usage."""
+    return pool_stats()
 
+@app.get("/rate-limits")
+async def get_rate_limits():
+    """Get the current request rate and throttle counts per API host/tenant."""
+    return {"limiters": rate_limit_stats()}
 
 @app.get("/data/endpoints")
-async def get_endpoints(
-    skip: int = 0,
+def get_endpoints(
+    cursor: str = None,
     limit: int = 100,
+    skip: int = 0,
     online_only: bool = False,
+    tenant_id: str = None,
+    include_deleted: bool = False,
+    count_mode: Literal["exact", "estimated", "none"] = "estimated",
     db: Session = Depends(get_db)
 ):
-    """Get stored endpoint data with pagination."""
+    """Get stored endpoint data, ordered by hostname, with cursor pagination.
+    
+    Pass the returned ``next_cursor`` to get the following page. ``skip``
+    still works without a cursor but gets slower the deeper it goes.
+    ``count_mode`` picks how ``total`` is computed, see ``count_rows``.
+    """
     query = db.query(Endpoint)
     
+    if not include_deleted:
+        query = query.filter(Endpoint.deleted_at.is_(None))
+    if tenant_id:
+        query = query.filter(Endpoint.tenant_id == tenant_id)
     if online_only:
         query = query.filter(Endpoint.online_status == True)
     
-    total = query.count()
-    endpoints = query.offset(skip).limit(limit).all()
+    total, count_mode = count_rows(query, ENDPOINTS, {
+        "online_only": online_only, "tenant_id": tenant_id, "include_deleted": include_deleted
+    }, count_mode)
+    try:
+        endpoints, next_cursor = keyset_page(
+            query, ENDPOINT_SORT_KEY, lambda ep: (ep.hostname or "", ep.id), (str, int),
+            cursor, min(limit, MAX_PAGE_SIZE), skip=skip
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     
     return {
         "total": total,
+        "count_mode": count_mode,
         "skip": skip,
         "limit": limit,
+        "next_cursor": next_cursor,
         "endpoints": [
             {
                 "id": ep.id,
                 "endpoint_id": ep.endpoint_id,
+                "tenant_id": ep.tenant_id,
                 "hostname": ep.hostname,
                 "os_name": ep.os_name,
                 "endpoint_type": ep.endpoint_type,
@@ -136,39 +290,68 @@ async def get_endpoints(
                 "group_name": ep.group_name,
                 "ip_addresses": ep.ip_addresses,
                 "created_at": ep.created_at,
-                "updated_at": ep.updated_at
+                "updated_at": ep.updated_at,
+                "deleted_at": ep.deleted_at
             }
             for ep in endpoints
         ]
     }
 
 @app.get("/data/events")
-async def get_events(
-    skip: int = 0,
+def get_events(
+    cursor: str = None,
     limit: int = 100,
+    skip: int = 0,
     severity: str = None,
     event_type: str = None,
+    tenant_id: str = None,
+    start: datetime = None,
+    end: datetime = None,
+    count_mode: Literal["exact", "estimated", "none"] = "estimated",
     db: Session = Depends(get_db)
 ):
-    """Get stored SIEM events with filtering and pagination."""
+    """Get stored SIEM events, newest first, with filtering and cursor pagination.
+    
+    Pass the returned ``next_cursor`` to get the following page; every page
+    costs the same however deep it is. ``start``/``end`` bound
+    ``created_at``, so only the matching monthly partitions are scanned.
+    ``count_mode`` picks how ``total`` is computed, see ``count_rows``.
+    """
     query = db.query(SIEMEvent)
     
+    if start:
+        query = query.filter(SIEMEvent.created_at >= start)
+    if end:
+        query = query.filter(SIEMEvent.created_at < end)
+    if tenant_id:
+        query = query.filter(SIEMEvent.tenant_id == tenant_id)
     if severity:
         query = query.filter(SIEMEvent.severity == severity)
     if event_type:
         query = query.filter(SIEMEvent.event_type == event_type)
     
-    total = query.count()
-    events = query.order_by(desc(SIEMEvent.created_at)).offset(skip).limit(limit).all()
+    total, count_mode = count_rows(query, EVENTS, {
+        "severity": severity, "event_type": event_type, "tenant_id": tenant_id, "start": start, "end": end
+    }, count_mode)
+    try:
+        events, next_cursor = keyset_page(
+            query, (SIEMEvent.created_at, SIEMEvent.id), lambda ev: (ev.created_at, ev.id),
+            (datetime.fromisoformat, int), cursor, min(limit, MAX_PAGE_SIZE), descending=True, skip=skip
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     
     return {
         "total": total,
+        "count_mode": count_mode,
         "skip": skip,
         "limit": limit,
+        "next_cursor": next_cursor,
         "events": [
             {
                 "id": ev.id,
                 "event_id": ev.event_id,
+                "tenant_id": ev.tenant_id,
                 "endpoint_id": ev.endpoint_id,
                 "event_type": ev.event_type,
                 "severity": ev.severity,
@@ -184,38 +367,191 @@ async def get_events(
         ]
     }
 
+@app.get("/data/events/histogram")
+def get_event_histogram(
+    bucket: Literal["minute", "hour", "day"] = "hour",
+    start: datetime = None,
+    end: datetime = None,
+    group_by: Literal["severity", "type", "endpoint_id", "group"] = None,
+    tenant_id: str = None,
+    db: Session = Depends(get_db)
+):
+    """Get SIEM event counts per time bucket, optionally per ``group_by`` value.
+    
+    Computed in one grouped query, from the hourly rollups for hour and day
+    buckets; see ``event_histogram``. Without ``start`` the last hour, day
+    or 30 days are charted for minute, hour and day buckets.
+    """
+    try:
+        return event_histogram(db, bucket, start, end, group_by, tenant_id)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.get("/data/events/{event_id}/raw")
+def get_event_raw(event_id: str, db: Session = Depends(get_db)):
+    """Get the full Sophos payload of one SIEM event."""
+    payload = db.query(SIEMEventPayload).filter(SIEMEventPayload.event_id == event_id).first()
+    if payload is not None:
+        return {"event_id": payload.event_id, "created_at": payload.created_at, "raw_data": payload.raw_data}
+    
+    # Events stored before payloads moved out of siem_events
+    event = db.query(SIEMEvent).options(undefer(SIEMEvent.raw_data)).filter(SIEMEvent.event_id == event_id).first()
+    if event is None or event.raw_data is None:
+        raise HTTPException(status_code=404, detail=f"No raw payload for event '{event_id}'")
+    return {"event_id": event.event_id, "created_at": event.created_at, "raw_data": event.raw_data}
+
+def export_response(query, name: str, format: str, gzip: bool) -> StreamingResponse:
+    media_type, extension = EXPORT_FORMATS[format]
+    filename = f"{name}-{datetime.utcnow():%Y%m%dT%H%M%SZ}.{extension}"
+    if gzip:
+        media_type, filename = "application/gzip", f"{filename}.gz"
+    return StreamingResponse(
+        stream_export(query, format, compress=gzip),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+@app.get("/export/events")
+async def export_events(
+    format: Literal["ndjson", "csv"] = "ndjson",
+    gzip: bool = False,
+    severity: str = None,
+    event_type: str = None,
+    tenant_id: str = None,
+    start: datetime = None,
+    end: datetime = None
+):
+    """Stream every matching SIEM event, oldest first, as NDJSON or CSV.
+    
+    Rows are read through a server-side cursor and written as they arrive,
+    so a month of events is one request in constant memory. ``gzip=true``
+    compresses the stream.
+    """
+    query = events_export_query(start, end, tenant_id, severity, event_type)
+    return export_response(query, "siem-events", format, gzip)
+
+@app.get("/export/endpoints")
+async def export_endpoints(
+    format: Literal["ndjson", "csv"] = "ndjson",
+    gzip: bool = False,
+    online_only: bool = False,
+    tenant_id: str = None,
+    include_deleted: bool = False
+):
+    """Stream every matching endpoint, ordered by hostname, as NDJSON or CSV."""
+    query = endpoints_export_query(tenant_id, online_only, include_deleted)
+    return export_response(query, "endpoints", format, gzip)
+
+@app.get("/stream/events")
+async def stream_events(
+    request: Request,
+    severity: str = None,
+    event_type: str = None,
+    tenant_id: str = None,
+    last_event_id: str = None,
+    last_event_id_header: str = Header(None, alias="Last-Event-ID")
+):
+    """Push newly stored SIEM events as Server-Sent Events.
+    
+    Events arrive as ingestion commits them, filtered by ``severity``,
+    ``event_type`` and ``tenant_id``; nothing is read from the table. A
+    reconnecting client resumes after its ``Last-Event-ID`` (header, or
+    ``last_event_id`` for clients that can't set it). A ``reset`` event means
+    that id could not be resumed and ``overflow`` that the client fell
+    behind and events were dropped; reload from ``/data/events`` then.
+    """
+    filters = {"severity": severity, "event_type": event_type, "tenant_id": tenant_id}
+    resume_from = last_event_id_header or last_event_id
+    
+    async def messages():
+        subscriber, complete = event_broadcaster.subscribe(filters, resume_from)
+        try:
+            yield "retry: 3000\n\n"
+            if not complete:
+                yield sse_message(json.dumps({"last_event_id": resume_from}), event="reset")
+            while True:
+                try:
+                    await asyncio.wait_for(subscriber.ready.wait(), STREAM_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        return
+                    yield ": keep-alive\n\n"
+                    continue
+                
+                events, dropped = subscriber.drain()
+                if dropped:
+                    yield sse_message(json.dumps({"dropped": dropped}), event="overflow")
+                for event_id, event in events:
+                    yield sse_message(json.dumps(jsonable_encoder(event)), event="siem_event", event_id=event_id)
+        finally:
+            event_broadcaster.unsubscribe(subscriber)
+    
+    return StreamingResponse(
+        messages(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.get("/stream/stats")
+async def get_stream_stats():
+    """Get the number of event stream subscribers and events published."""
+    return event_broadcaster.stats()
+
 @app.get("/data/stats")
-async def get_stats(db: Session = Depends(get_db)):
-    """Get aggregated statistics."""
+def get_stats(
+    start: datetime = None,
+    end: datetime = None,
+    tenant_id: str = None,
+    db: Session = Depends(get_db)
+):
+    """Get aggregated statistics.
+    
+    Event counts come from the hourly rollups, so ``start``/``end`` are
+    applied to whole hours and the cost does not grow with stored events.
+    """
     # Endpoint stats
-    total_endpoints = db.query(Endpoint).count()
-    online_endpoints = db.query(Endpoint).filter(Endpoint.online_status == True).count()
+    endpoint_counts = db.query(
+        func.count(Endpoint.id).filter(Endpoint.deleted_at.is_(None)),
+        func.count(Endpoint.id).filter(Endpoint.deleted_at.is_(None), Endpoint.online_status == True),
+        func.count(Endpoint.id).filter(Endpoint.deleted_at.isnot(None))
+    )
+    if tenant_id:
+        endpoint_counts = endpoint_counts.filter(Endpoint.tenant_id == tenant_id)
+    total_endpoints, online_endpoints, retired_endpoints = endpoint_counts.one()
     
     # Event stats
-    total_events = db.query(SIEMEvent).count()
-    events_by_severity = db.query(
-        SIEMEvent.severity,
-        func.count(SIEMEvent.id).label('count')
-    ).group_by(SIEMEvent.severity).all()
-    
-    events_by_type = db.query(
-        SIEMEvent.event_type,
-        func.count(SIEMEvent.id).label('count')
-    ).group_by(SIEMEvent.event_type).limit(10).all()
+    window = {"start": start, "end": end, "tenant_id": tenant_id}
+    events_by_severity = rollup_counts(db, "severity", **window)
+    events_by_type = rollup_counts(db, "type", limit=10, **window)
+    events_by_endpoint = rollup_counts(db, "endpoint", limit=10, **window)
+    events_by_group = rollup_counts(db, "group", **window)
     
     # Recent activity
-    recent_events = db.query(SIEMEvent).order_by(desc(SIEMEvent.created_at)).limit(5).all()
+    recent_events = db.query(SIEMEvent).options(
+        load_only(SIEMEvent.event_id, SIEMEvent.event_type, SIEMEvent.severity, SIEMEvent.created_at)
+    )
+    if start:
+        recent_events = recent_events.filter(SIEMEvent.created_at >= start)
+    if end:
+        recent_events = recent_events.filter(SIEMEvent.created_at < end)
+    if tenant_id:
+        recent_events = recent_events.filter(SIEMEvent.tenant_id == tenant_id)
+    recent_events = recent_events.order_by(desc(SIEMEvent.created_at)).limit(5).all()
     
     return {
         "endpoints": {
             "total": total_endpoints,
             "online": online_endpoints,
-            "offline": total_endpoints - online_endpoints
+            "offline": total_endpoints - online_endpoints,
+            "retired": retired_endpoints
         },
         "events": {
-            "total": total_events,
-            "by_severity": {item.severity: item.count for item in events_by_severity},
-            "by_type": {item.event_type: item.count for item in events_by_type}
+            # Every event has exactly one severity bucket
+            "total": sum(events_by_severity.values()),
+            "by_severity": events_by_severity,
+            "by_type": events_by_type,
+            "by_endpoint": events_by_endpoint,
+            "by_group": events_by_group
         },
         "recent_activity": [
             {
@@ -235,28 +571,91 @@ def run_scheduler():
         schedule.run_pending()
         time.sleep(60)  # Check every minute
 
+def run_with_session(job, *args, **kwargs):
+    """Run a scheduler job with its own DB session, returned to the pool afterwards."""
+    with session_scope() as db:
+        return job(db, *args, **kwargs)
+
+# Full syncs that found their stream busy, run in place of its next scheduled sync
+pending_full_syncs: Dict[str, tuple] = {}
+
+def schedule_job(stream: str, target, *args, **kwargs):
+    """Run a scheduled sync as a job, skipping it while the stream is already syncing.
+
+    A deferred full sync of the stream takes this slot instead.
+    """
+    pending = pending_full_syncs.pop(stream, None)
+    if pending is not None:
+        target, args, kwargs = pending
+        print(f"🔁 Running deferred full {stream} sync")
+    try:
+        job_registry.submit(stream, target, *args, **kwargs)
+    except JobAlreadyRunning as e:
+        if pending is not None:
+            pending_full_syncs[stream] = pending
+        print(f"⏭️  Skipping scheduled sync: {e}")
+
+def schedule_full_job(stream: str, target, *args, **kwargs):
+    """Run a scheduled full sync as a job, deferring it to the stream's next tick while busy."""
+    try:
+        job_registry.submit(stream, target, *args, **kwargs)
+    except JobAlreadyRunning as e:
+        pending_full_syncs[stream] = (target, args, kwargs)
+        print(f"⏳ Deferring scheduled full sync: {e}")
+
 def schedule_data_fetch():
     """Schedule regular data fetching tasks."""
     import os
     print("DEBUG: ENABLE_ENDPOINT_FETCHING =", os.getenv("ENABLE_ENDPOINT_FETCHING"))
     print("DEBUG: ENABLE_SIEM_FETCHING =", os.getenv("ENABLE_SIEM_FETCHING"))
     
-    # Fetch endpoints every 15 minutes (if enabled) for real-time status monitoring
+    # Sync every tenant the credentials manage instead of SOPHOS_TENANT_ID
+    multi_tenant = os.getenv("SOPHOS_MULTI_TENANT", "false").lower() == "true"
+    
+    # Incremental endpoint syncs (endpoints seen since the last watermark) keep
+    # status fresh; slower full syncs also retire decommissioned endpoints
+    incremental_minutes = ENDPOINT_INCREMENTAL_MINUTES
+    full_minutes = int(os.getenv("ENDPOINT_FULL_SYNC_MINUTES", "60"))
+    
     if os.getenv("ENABLE_ENDPOINT_FETCHING", "true").lower() == "true":
-        print("DEBUG: Scheduling endpoint fetching job...")
-        schedule.every(15).minutes.do(lambda: sophos_client.fetch_endpoints(next(get_db()), 100))
-        print("DEBUG: Endpoint job scheduled")
+        print("DEBUG: Scheduling endpoint fetching jobs...")
+        if multi_tenant:
+            schedule.every(incremental_minutes).minutes.do(
+                schedule_job, "endpoints", sophos_client.sync_tenants, "endpoints", page_size=100, incremental=True
+            ).tag("endpoints", "incremental")
+            schedule.every(full_minutes).minutes.do(
+                schedule_full_job, "endpoints", sophos_client.sync_tenants, "endpoints", page_size=100
+            ).tag("endpoints", "full")
+        else:
+            schedule.every(incremental_minutes).minutes.do(
+                schedule_job, "endpoints", run_with_session, sophos_client.fetch_endpoints,
+                page_size=100, incremental=True
+            ).tag("endpoints", "incremental")
+            schedule.every(full_minutes).minutes.do(
+                schedule_full_job, "endpoints", run_with_session, sophos_client.fetch_endpoints, page_size=100
+            ).tag("endpoints", "full")
+        print("DEBUG: Endpoint jobs scheduled")
     else:
         print("DEBUG: Endpoint fetching DISABLED")
     
     # Fetch events every 1 hour (if enabled) for better security monitoring
     if os.getenv("ENABLE_SIEM_FETCHING", "true").lower() == "true":
         print("DEBUG: Scheduling SIEM event fetching job...")
-        schedule.every(1).hours.do(lambda: sophos_client.fetch_siem_events(next(get_db()), 100000))
+        if multi_tenant:
+            schedule.every(1).hours.do(
+                schedule_job, "siem_events", sophos_client.sync_tenants, "siem_events", max_events=100000
+            ).tag("siem_events")
+        else:
+            schedule.every(1).hours.do(
+                schedule_job, "siem_events", run_with_session, sophos_client.fetch_siem_events, max_events=100000
+            ).tag("siem_events")
         print("DEBUG: SIEM job scheduled")
     else:
         print("DEBUG: SIEM fetching DISABLED")
     
+    # Create next months' SIEM partitions and drop expired ones
+    schedule.every(1).days.do(maintain_partitions).tag("maintenance")
+    
     print("DEBUG: Total scheduled jobs:", len(schedule.get_jobs()))
     print("DEBUG: All jobs:", [str(job) for job in schedule.get_jobs()])
 
@@ -274,10 +673,7 @@ async def start_scheduler():
         
         return {
             "message": "Scheduler started successfully",
-            "scheduled_tasks": [
-                "Fetch endpoints every 15 minutes",
-                "Fetch events every 1 hour"
-            ]
+            "scheduled_tasks": [str(job) for job in schedule.get_jobs()]
         }
     else:
         return {"message": "Scheduler is already running"}
@@ -288,22 +684,19 @@ async def stop_scheduler():
     global scheduler_running
     scheduler_running = False
     schedule.clear()
+    pending_full_syncs.clear()
     return {"message": "Scheduler stopped successfully"}
 
 @app.get("/scheduler/status")
 async def get_scheduler_status():
     """Get scheduler status."""
-    jobs = schedule.get_jobs()
-    endpoint_next = None
-    siem_next = None
-    for job in jobs:
-        # Identify jobs by their interval and unit
-        if job.interval == 15 and job.unit == 'minutes':
-            endpoint_next = job.next_run
-        elif job.interval == 1 and job.unit == 'hours':
-            siem_next = job.next_run
+    def next_run(tag):
+        runs = [job.next_run for job in schedule.get_jobs(tag)]
+        return min(runs) if runs else None
+    
     return {
         "running": scheduler_running,
-        "next_endpoint_run": endpoint_next,
-        "next_siem_run": siem_next
-    } 
\ No newline at end of file
+        "next_endpoint_run": next_run("endpoints"),
+        "next_endpoint_full_run": next_run("full"),
+        "next_siem_run": next_run("siem_events")
+    } 
@@ -0,0 +1,56 @@
+import base64
+import json
+from datetime import datetime
+from typing import Any, Callable, List, Optional, Sequence, Tuple
+from sqlalchemy import tuple_
+
+# Largest page a list endpoint returns
+MAX_PAGE_SIZE = 1000
+
+def encode_cursor(values: Sequence[Any]) -> str:
+    """Opaque cursor for the sort key of the last row on a page."""
+    values = [value.isoformat() if isinstance(value, datetime) else value for value in values]
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str, parsers: Sequence[Callable[[Any], Any]]) -> List[Any]:
+    """Sort key values from a cursor, raising ValueError if it is malformed."""
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        if not isinstance(values, list) or len(values) != len(parsers):
+            raise ValueError
+        return [parse(value) for parse, value in zip(parsers, values)]
+    except (TypeError, ValueError, UnicodeDecodeError):
+        raise ValueError(f"Invalid cursor: {cursor}")
+
+def keyset_page(
+    query,
+    keys: Sequence[Any],
+    key_of: Callable[[Any], Sequence[Any]],
+    parsers: Sequence[Callable[[Any], Any]],
+    cursor: Optional[str],
+    limit: int,
+    descending: bool = False,
+    skip: int = 0
+) -> Tuple[List[Any], Optional[str]]:
+    """Fetch one page of ``query`` ordered by ``keys``, starting after ``cursor``.
+
+    Seeks with a row comparison on the sort key instead of OFFSET, so with an
+    index on ``keys`` every page costs the same. ``key_of`` gives a row's
+    sort key and ``parsers`` turn cursor values back into key values.
+    Returns the rows and the cursor of the next page, or None on the last page.
+    ``skip`` is only honoured without a cursor, for offset-paging clients.
+    """
+    if cursor:
+        after = tuple(decode_cursor(cursor, parsers))
+        key = tuple_(*keys)
+        query = query.filter(key < after if descending else key > after)
+
+    query = query.order_by(*[key.desc() if descending else key.asc() for key in keys])
+    if skip and not cursor:
+        query = query.offset(skip)
+    rows = query.limit(limit + 1).all()
+
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, encode_cursor(key_of(rows[-1]))
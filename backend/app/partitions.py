@@ -0,0 +1,149 @@
+import os
+import re
+import threading
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List, Optional, Set
+from sqlalchemy import text
+from .database import engine
+from .versions import bump_version, EVENTS
+
+# siem_events and siem_event_payloads are range-partitioned by month on
+# created_at (see SIEMEvent). Partitions are created ahead of time and on
+# demand by the writer, and retention drops whole partitions instead of
+# deleting rows.
+SIEM_PARTITIONS_AHEAD = int(os.getenv("SIEM_PARTITIONS_AHEAD", "2"))
+# Months of SIEM events to keep; 0 keeps everything
+SIEM_RETENTION_MONTHS = int(os.getenv("SIEM_RETENTION_MONTHS", "0"))
+
+PARTITIONED_TABLES = ("siem_events", "siem_event_payloads")
+PARTITION_SUFFIX = re.compile(r"_p(\d{4})(\d{2})$")
+
+# Serializes partition DDL across processes
+PARTITION_LOCK_ID = 0x51E4E7
+
+_known_partitions: Set[str] = set()
+_partitioned: Dict[str, bool] = {}
+_lock = threading.Lock()
+
+def month_start(value: datetime) -> datetime:
+    """First instant of the month, as naive UTC like the stored timestamps."""
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc)
+    return datetime(value.year, value.month, 1)
+
+def add_months(month: datetime, count: int) -> datetime:
+    index = month.year * 12 + month.month - 1 + count
+    return datetime(index // 12, index % 12 + 1, 1)
+
+def partition_name(table: str, month: datetime) -> str:
+    return f"{table}_p{month:%Y%m}"
+
+def is_partitioned(table: str = "siem_events") -> bool:
+    """Whether a table is partitioned (not a heap created before partitioning)."""
+    if table not in _partitioned:
+        if engine.dialect.name != "postgresql":
+            _partitioned[table] = False
+        else:
+            with engine.connect() as conn:
+                relkind = conn.execute(
+                    text("SELECT relkind FROM pg_class WHERE oid = to_regclass(:table)"),
+                    {"table": table}
+                ).scalar()
+            _partitioned[table] = relkind == "p"
+    return _partitioned[table]
+
+def list_partitions(table: str) -> List[str]:
+    """Names of the monthly partitions currently attached to a table."""
+    with engine.connect() as conn:
+        names = conn.execute(text(
+            "SELECT c.relname FROM pg_inherits i "
+            "JOIN pg_class c ON c.oid = i.inhrelid "
+            "WHERE i.inhparent = to_regclass(:table) ORDER BY c.relname"
+        ), {"table": table}).scalars().all()
+    return [name for name in names if name.startswith(f"{table}_p") and partition_month(name)]
+
+def partition_month(name: str) -> Optional[datetime]:
+    """The month a partition covers, from its ``_pYYYYMM`` suffix."""
+    match = PARTITION_SUFFIX.search(name)
+    return datetime(int(match.group(1)), int(match.group(2)), 1) if match else None
+
+def ensure_partitions(months: Iterable[datetime], tables: Iterable[str] = PARTITIONED_TABLES) -> List[str]:
+    """Create the monthly partitions covering ``months`` that don't exist yet.
+
+    Runs in its own short transaction so the writer's transaction never holds
+    DDL locks, and remembers what exists so the common case costs nothing.
+    """
+    tables = [table for table in tables if is_partitioned(table)]
+    if not tables:
+        return []
+
+    months = {month_start(month) for month in months}
+    with _lock:
+        missing = {
+            partition_name(table, month): (table, month)
+            for table in tables for month in months
+            if partition_name(table, month) not in _known_partitions
+        }
+    if not missing:
+        return []
+
+    created = []
+    with engine.begin() as conn:
+        conn.execute(text("SELECT pg_advisory_xact_lock(:id)"), {"id": PARTITION_LOCK_ID})
+        for name, (table, month) in sorted(missing.items()):
+            exists = conn.execute(text("SELECT to_regclass(:name)"), {"name": name}).scalar()
+            if exists is None:
+                conn.execute(text(
+                    f'CREATE TABLE {name} PARTITION OF {table} '
+                    f"FOR VALUES FROM ('{month:%Y-%m-%d}') TO ('{add_months(month, 1):%Y-%m-%d}')"
+                ))
+                created.append(name)
+
+    with _lock:
+        _known_partitions.update(missing)
+    for name in created:
+        print(f"🗂️  Created partition {name}")
+    return created
+
+def drop_expired_partitions(retention_months: int = SIEM_RETENTION_MONTHS) -> List[str]:
+    """Drop whole partitions older than the retention window, invalidating cached event responses."""
+    if retention_months <= 0:
+        return []
+
+    cutoff = add_months(month_start(datetime.utcnow()), -retention_months)
+    expired = [
+        name
+        for table in PARTITIONED_TABLES if is_partitioned(table)
+        for name in list_partitions(table)
+        # A partition expires once its whole month is before the cutoff
+        if add_months(partition_month(name), 1) <= cutoff
+    ]
+    if not expired:
+        return []
+
+    with engine.begin() as conn:
+        conn.execute(text("SELECT pg_advisory_xact_lock(:id)"), {"id": PARTITION_LOCK_ID})
+        for name in expired:
+            conn.execute(text(f"DROP TABLE IF EXISTS {name}"))
+        # Keep the hourly rollups in step with the events they count
+        conn.execute(text("DELETE FROM siem_event_rollups WHERE bucket < :cutoff"), {"cutoff": cutoff})
+
+    # Cached event responses may still include the dropped rows
+    bump_version(EVENTS)
+    with _lock:
+        _known_partitions.difference_update(expired)
+    for name in expired:
+        print(f"🗑️  Dropped expired partition {name}")
+    return expired
+
+def maintain_partitions() -> Dict[str, Any]:
+    """Create upcoming monthly partitions and drop expired ones."""
+    if engine.dialect.name != "postgresql":
+        return {"partitioned": False, "created": [], "dropped": []}
+    if not is_partitioned("siem_events"):
+        print("⚠️  siem_events is not partitioned; run scripts/partition_siem_events.py to convert it")
+
+    current = month_start(datetime.utcnow())
+    created = ensure_partitions(add_months(current, i) for i in range(SIEM_PARTITIONS_AHEAD + 1))
+    dropped = drop_expired_partitions()
+    return {"partitioned": is_partitioned("siem_events"), "created": created, "dropped": dropped}
@@ -0,0 +1,73 @@
+import queue
+import threading
+from typing import Any, Callable, Iterable, Optional
+
+# Pages fetched ahead of the writer. Bounds memory: the fetcher blocks once
+# this many pages are waiting to be stored.
+DEFAULT_MAX_PENDING_PAGES = 4
+
+_DONE = object()
+
+class _FetchFailed:
+    def __init__(self, error: BaseException):
+        self.error = error
+
+def run_pipeline(
+    pages: Iterable[Any],
+    store_page: Callable[[Any], Optional[bool]],
+    max_pending: int = DEFAULT_MAX_PENDING_PAGES,
+    progress=None
+) -> int:
+    """Fetch pages in a background thread while the caller stores them.
+
+    ``pages`` is iterated by a fetcher thread that hands each page to the
+    calling thread through a bounded queue, so HTTP paging overlaps database
+    writes. Pages are stored in order by ``store_page``; returning False from
+    it stops the pipeline. Errors raised while fetching are re-raised here.
+    With a job ``progress``, a cancelled job stops before its next page.
+    Returns the number of pages stored.
+    """
+    pending = queue.Queue(maxsize=max_pending)
+    stopped = threading.Event()
+
+    def put(item) -> bool:
+        # Block while the queue is full, but give up once the writer stops
+        while not stopped.is_set():
+            try:
+                pending.put(item, timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def fetch():
+        try:
+            for page in pages:
+                if not put(page):
+                    return
+        except BaseException as e:
+            put(_FetchFailed(e))
+            return
+        put(_DONE)
+
+    fetcher = threading.Thread(target=fetch, name="page-fetcher", daemon=True)
+    fetcher.start()
+
+    stored = 0
+    try:
+        while True:
+            item = pending.get()
+            if item is _DONE:
+                break
+            if isinstance(item, _FetchFailed):
+                raise item.error
+            if progress is not None:
+                progress.check_cancelled()
+            stored += 1
+            if store_page(item) is False:
+                break
+    finally:
+        stopped.set()
+        fetcher.join(timeout=5)
+
+    return stored
@@ -0,0 +1,150 @@
+import os
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Optional, Tuple
+
+# Ceiling and burst for each API host/tenant bucket. The limiter starts at
+# the ceiling and halves its rate whenever Sophos throttles us.
+RATE_LIMIT_RPS = float(os.getenv("SOPHOS_RATE_LIMIT_RPS", "10"))
+RATE_LIMIT_BURST = int(os.getenv("SOPHOS_RATE_LIMIT_BURST", "10"))
+MIN_RATE = 0.5
+
+MAX_RETRIES = int(os.getenv("SOPHOS_MAX_RETRIES", "5"))
+BACKOFF_BASE = 0.5
+BACKOFF_MAX = 60.0
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+# requests' connection errors are OSErrors
+RETRY_EXCEPTIONS = (OSError,)
+
+class RateLimiter:
+    """Adaptive token bucket shared by every request to one host/tenant.
+
+    Successful responses raise the rate back towards ``max_rate``; a 429 or
+    5xx halves it and pauses the whole bucket for the Retry-After delay.
+    """
+
+    def __init__(self, max_rate: float = RATE_LIMIT_RPS, burst: int = RATE_LIMIT_BURST):
+        self.max_rate = max_rate
+        self.rate = max_rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self.requests = 0
+        self.throttled = 0
+        self._lock = threading.Lock()
+
+    def _reserve(self) -> float:
+        """Take a token and return how long the caller must wait to use it."""
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+            self.requests += 1
+
+            wait = max(0.0, self.blocked_until - now)
+            if self.tokens < 0:
+                wait = max(wait, -self.tokens / self.rate)
+            return wait
+
+    def acquire(self):
+        """Block until a request may be sent."""
+        wait = self._reserve()
+        if wait > 0:
+            time.sleep(wait)
+
+    def on_success(self):
+        with self._lock:
+            self.rate = min(self.max_rate, self.rate + self.max_rate / 20)
+
+    def on_throttle(self, delay: float):
+        with self._lock:
+            self.throttled += 1
+            self.rate = max(MIN_RATE, self.rate / 2)
+            self.tokens = min(self.tokens, 0.0)
+            self.blocked_until = max(self.blocked_until, time.monotonic() + delay)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "rate": round(self.rate, 2),
+                "max_rate": self.max_rate,
+                "requests": self.requests,
+                "throttled": self.throttled
+            }
+
+_limiters: Dict[Tuple[str, str], RateLimiter] = {}
+_limiters_lock = threading.Lock()
+
+def get_rate_limiter(host: str, tenant_id: str = "") -> RateLimiter:
+    """Return the shared limiter for an API host and tenant."""
+    key = (host, tenant_id)
+    with _limiters_lock:
+        if key not in _limiters:
+            _limiters[key] = RateLimiter()
+        return _limiters[key]
+
+def rate_limit_stats() -> Dict[str, Dict[str, Any]]:
+    """Current rate and throttle counts of every limiter, keyed by host/tenant."""
+    with _limiters_lock:
+        limiters = list(_limiters.items())
+    return {f"{host}/{tenant_id}" if tenant_id else host: limiter.stats() for (host, tenant_id), limiter in limiters}
+
+def retry_delay(headers: Any, attempt: int) -> float:
+    """Seconds to wait before retry ``attempt``.
+
+    Honors a Retry-After header (seconds or HTTP date), otherwise uses
+    exponential backoff with full jitter.
+    """
+    retry_after = headers.get("Retry-After") if headers is not None else None
+    if retry_after:
+        try:
+            delay = float(retry_after)
+        except ValueError:
+            try:
+                delay = (parsedate_to_datetime(retry_after) - datetime.now(timezone.utc)).total_seconds()
+            except (TypeError, ValueError):
+                delay = None
+        if delay is not None:
+            # Spread out clients that were all told the same time
+            return min(BACKOFF_MAX, max(0.0, delay)) + random.uniform(0, BACKOFF_BASE)
+
+    return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt))
+
+def send_with_retry(send: Callable[[], Any], limiter: Optional[RateLimiter], max_retries: int = MAX_RETRIES):
+    """Call ``send`` under ``limiter``, retrying throttled and 5xx responses.
+
+    Connection errors are retried the same way. The last response is
+    returned once retries run out, so callers still see the failure status.
+    """
+    for attempt in range(max_retries + 1):
+        if limiter:
+            limiter.acquire()
+
+        try:
+            response = send()
+        except RETRY_EXCEPTIONS as e:
+            if attempt == max_retries:
+                raise
+            delay = retry_delay(None, attempt)
+            print(f"⚠️  Request failed ({e}), retrying in {delay:.1f}s")
+        else:
+            if response.status_code not in RETRY_STATUSES or attempt == max_retries:
+                if limiter and response.status_code < 400:
+                    limiter.on_success()
+                return response
+            delay = retry_delay(response.headers, attempt)
+            print(f"⚠️  HTTP {response.status_code}, retrying in {delay:.1f}s")
+            # Release the connection of a streamed response we won't read
+            response.close()
+
+        if limiter:
+            limiter.on_throttle(delay)
+        else:
+            time.sleep(delay)
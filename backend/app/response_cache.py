@@ -0,0 +1,133 @@
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+from fastapi import Request
+from fastapi.responses import Response
+from starlette.concurrency import run_in_threadpool
+from .versions import EVENTS, ENDPOINTS, REDIS_KEY_PREFIX, dataset_versions, get_redis, redis
+
+RESPONSE_CACHE_TTL = int(os.getenv("RESPONSE_CACHE_TTL", "300"))
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "512"))
+
+# Cached GET routes and the datasets their responses are built from
+CACHED_ROUTES: Dict[str, List[str]] = {
+    "/data/endpoints": [ENDPOINTS],
+    "/data/events": [EVENTS],
+    "/data/events/histogram": [EVENTS],
+    "/data/stats": [EVENTS, ENDPOINTS],
+}
+
+# Routes whose default window ends at "now" are only cached for a fixed window,
+# since their response changes with the clock as well as with the data
+CACHE_REQUIRED_PARAMS: Dict[str, Tuple[str, ...]] = {
+    "/data/events/histogram": ("start", "end"),
+}
+
+class MemoryStore:
+    """In-process LRU of response bodies with a TTL."""
+
+    def __init__(self, max_size: int = RESPONSE_CACHE_SIZE, ttl: int = RESPONSE_CACHE_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, Tuple[float, bytes]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key: str, body: bytes):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, body)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+class RedisStore:
+    """Response bodies in Redis, shared by every API worker; Redis evicts by TTL."""
+
+    def __init__(self, client, ttl: int = RESPONSE_CACHE_TTL):
+        self.client = client
+        self.ttl = ttl
+
+    def get(self, key: str) -> Optional[bytes]:
+        try:
+            return self.client.get(f"{REDIS_KEY_PREFIX}response:{key}")
+        except redis.RedisError:
+            return None
+
+    def set(self, key: str, body: bytes):
+        try:
+            self.client.set(f"{REDIS_KEY_PREFIX}response:{key}", body, ex=self.ttl)
+        except redis.RedisError as e:
+            print(f"⚠️  Could not cache response in Redis: {e}")
+
+_store = None
+
+def get_store():
+    global _store
+    if _store is None:
+        client = get_redis()
+        _store = RedisStore(client) if client is not None else MemoryStore()
+    return _store
+
+def cache_key(request: Request, versions: List[str]) -> str:
+    """Key and ETag of a response: route, sorted query params and dataset versions."""
+    params = sorted(request.query_params.multi_items())
+    raw = f"{request.url.path}?{params}#{versions}"
+    return hashlib.sha256(raw.encode()).hexdigest()[:32]
+
+async def _call(func, *args):
+    return func(*args)
+
+async def response_cache_middleware(request: Request, call_next):
+    """Serve cached GETs of read routes, answering matching If-None-Match with 304.
+
+    The ETag is derived from the request and the versions of the datasets
+    behind the route, so an unchanged poll is answered without touching
+    the database. Ingestion bumps the versions, which changes every ETag.
+    """
+    datasets = CACHED_ROUTES.get(request.url.path)
+    if request.method != "GET" or datasets is None:
+        return await call_next(request)
+    required = CACHE_REQUIRED_PARAMS.get(request.url.path, ())
+    if not all(request.query_params.get(param) for param in required):
+        return await call_next(request)
+
+    # Redis calls block, so they run in the threadpool; the in-process store is instant
+    offload = run_in_threadpool if get_redis() is not None else _call
+
+    versions = await offload(dataset_versions, datasets)
+    if versions is None:
+        return await call_next(request)
+
+    key = cache_key(request, versions)
+    etag = f'W/"{key}"'
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+
+    if etag in request.headers.get("if-none-match", ""):
+        return Response(status_code=304, headers=headers)
+
+    store = get_store()
+    body = await offload(store.get, key)
+    if body is not None:
+        return Response(body, media_type="application/json", headers={**headers, "X-Cache": "HIT"})
+
+    response = await call_next(request)
+    if response.status_code != 200:
+        return response
+
+    body = b"".join([chunk async for chunk in response.body_iterator])
+    await offload(store.set, key, body)
+    passthrough = {name: value for name, value in response.headers.items() if name != "content-length"}
+    return Response(body, media_type="application/json", headers={**passthrough, **headers, "X-Cache": "MISS"})
@@ -0,0 +1,98 @@
+from collections import Counter
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional
+from sqlalchemy import func, desc, text
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+from .database import SIEMEventRollup
+
+# Rollup dimension -> siem_events column
+ROLLUP_DIMENSIONS = {
+    "severity": "severity",
+    "type": "event_type",
+    "endpoint": "endpoint_id",
+    "group": "group",
+}
+
+def hour_bucket(value: datetime) -> datetime:
+    return value.replace(minute=0, second=0, microsecond=0)
+
+def rollup_rows(rows: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Hourly counts for a batch of siem_events rows, sorted by key.
+
+    Missing values are counted under "" since they are part of the key.
+    """
+    counts = Counter()
+    for row in rows:
+        bucket = hour_bucket(row["created_at"])
+        tenant_id = row.get("tenant_id") or ""
+        for dimension, column in ROLLUP_DIMENSIONS.items():
+            counts[(dimension, bucket, tenant_id, row.get(column) or "")] += 1
+
+    return [
+        {"dimension": dimension, "bucket": bucket, "tenant_id": tenant_id, "value": value, "count": count}
+        for (dimension, bucket, tenant_id, value), count in sorted(counts.items())
+    ]
+
+def add_to_rollups(db: Session, rows: Iterable[Dict[str, Any]]):
+    """Add newly inserted events to the hourly rollups, in the caller's transaction.
+
+    Keys are upserted in sorted order so concurrent writers lock rollup rows
+    in the same order and cannot deadlock.
+    """
+    values = rollup_rows(rows)
+    if not values:
+        return
+
+    table = SIEMEventRollup.__table__
+    stmt = pg_insert(table).values(values)
+    db.execute(stmt.on_conflict_do_update(
+        index_elements=[table.c.dimension, table.c.bucket, table.c.tenant_id, table.c.value],
+        set_={"count": table.c.count + stmt.excluded.count},
+    ))
+
+def rollup_counts(
+    db: Session,
+    dimension: str,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    tenant_id: Optional[str] = None,
+    limit: Optional[int] = None
+) -> Dict[Optional[str], int]:
+    """Event counts per value of a dimension, largest first, over whole hours.
+
+    ``start`` is rounded down to its hour; buckets before ``end`` are included.
+    """
+    total = func.sum(SIEMEventRollup.count).label("count")
+    query = db.query(SIEMEventRollup.value, total).filter(SIEMEventRollup.dimension == dimension)
+    if start:
+        query = query.filter(SIEMEventRollup.bucket >= hour_bucket(start))
+    if end:
+        query = query.filter(SIEMEventRollup.bucket < end)
+    if tenant_id:
+        query = query.filter(SIEMEventRollup.tenant_id == tenant_id)
+
+    query = query.group_by(SIEMEventRollup.value).order_by(desc(total))
+    if limit:
+        query = query.limit(limit)
+    return {value or None: int(count) for value, count in query.all()}
+
+def rebuild_rollups(db: Session) -> int:
+    """Recompute every rollup from siem_events, e.g. for events stored before rollups existed."""
+    selects = " UNION ALL ".join(
+        f"SELECT '{dimension}', date_trunc('hour', created_at), coalesce(tenant_id, ''), "
+        f"coalesce(\"{column}\", ''), count(*) FROM siem_events "
+        f"WHERE created_at IS NOT NULL GROUP BY 2, 3, 4"
+        for dimension, column in ROLLUP_DIMENSIONS.items()
+    )
+    try:
+        db.execute(text(f"LOCK TABLE {SIEMEventRollup.__tablename__} IN EXCLUSIVE MODE"))
+        db.execute(text(f"DELETE FROM {SIEMEventRollup.__tablename__}"))
+        rows = db.execute(text(
+            f"INSERT INTO {SIEMEventRollup.__tablename__} (dimension, bucket, tenant_id, value, count) {selects}"
+        )).rowcount
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    return rows
@@ -1,235 +1,542 @@
-import requests
-import json
-from datetime import datetime, timedelta
-import time
-from typing import List, Dict, Any
+from datetime import datetime, timedelta, timezone
+from typing import List, Dict, Any, Iterator, Optional
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from sqlalchemy.orm import Session
-from .database import Endpoint, SIEMEvent
+from .writers import (
+    upsert_endpoints, sweep_endpoints, stale_online_endpoints, insert_siem_events, parse_timestamp, naive_utc,
+    SIEM_BATCH_SIZE
+)
+from .sync_state import (
+    get_sync_state, save_sync_state, reset_sync_state, start_generation, migrate_sync_state,
+    siem_stream, endpoint_stream, backfill_stream, SIEM_STREAM
+)
+from .tenants import discover_tenants
+from .database import session_scope
+from .pipeline import run_pipeline
+from .streaming import parse_page
+from .auth import TokenManager
+from .rate_limit import get_rate_limiter
+from .http_client import create_session, DEFAULT_API_HOST, ENDPOINTS_PATH, SIEM_EVENTS_PATH, HTTP_TIMEOUT
 import os
 
+# Tenants synced at the same time when fanning out over many tenants
+TENANT_WORKERS = int(os.getenv("SOPHOS_TENANT_WORKERS", "4"))
+
+# Interval of the scheduled incremental endpoint syncs
+ENDPOINT_INCREMENTAL_MINUTES = int(os.getenv("ENDPOINT_INCREMENTAL_MINUTES", "2"))
+# Incremental endpoint syncs ask for endpoints seen since the last watermark,
+# minus this overlap for reports the API indexes a little late. Nothing is
+# lost with a short one: a reporting endpoint shows up again at its next
+# heartbeat and a silent one is re-checked by id (ENDPOINT_OFFLINE_AFTER).
+# Half the incremental interval by default; a longer overlap only re-reads
+# endpoints the previous run already stored.
+ENDPOINT_WATERMARK_OVERLAP = timedelta(minutes=float(
+    os.getenv("ENDPOINT_WATERMARK_OVERLAP_MINUTES", ENDPOINT_INCREMENTAL_MINUTES / 2)
+))
+if ENDPOINT_WATERMARK_OVERLAP >= timedelta(minutes=ENDPOINT_INCREMENTAL_MINUTES):
+    print(f"⚠️  ENDPOINT_WATERMARK_OVERLAP_MINUTES is not shorter than ENDPOINT_INCREMENTAL_MINUTES "
+          f"({ENDPOINT_INCREMENTAL_MINUTES}); incremental syncs will re-read endpoints already stored")
+# Endpoints stored as online that have not reported for this long are
+# re-checked by id: they went offline and stopped showing up in the window.
+# Must be longer than the agents' heartbeat plus LAST_SEEN_RESOLUTION.
+ENDPOINT_OFFLINE_AFTER = timedelta(minutes=float(os.getenv("ENDPOINT_OFFLINE_AFTER_MINUTES", "15")))
+# Endpoint ids per request when re-checking endpoints by id
+ENDPOINT_IDS_PER_REQUEST = 100
+
+# The SIEM API only accepts a from_date within the last 24 hours
+SIEM_MAX_LOOKBACK = timedelta(hours=24)
+# Backfill time slices fetched at the same time, per tenant
+SIEM_BACKFILL_WORKERS = int(os.getenv("SIEM_BACKFILL_WORKERS", "4"))
+
+class SIEMCursorRejected(RuntimeError):
+    """Raised when the SIEM API refuses the cursor a sync resumed from."""
+
+def siem_from_date(high_water: datetime) -> int:
+    """SIEM ``from_date`` resuming at ``high_water``, clamped to the API's lookback."""
+    from_date = max(high_water, datetime.utcnow() - SIEM_MAX_LOOKBACK)
+    return int(from_date.replace(tzinfo=timezone.utc).timestamp())
+
 class SophosClient:
-    def __init__(self):
+    def __init__(
+        self,
+        tenant_id: Optional[str] = None,
+        api_host: Optional[str] = None,
+        token_manager: Optional[TokenManager] = None
+    ):
         self.client_id = os.getenv("SOPHOS_CLIENT_ID", "")
         self.client_secret = os.getenv("SOPHOS_CLIENT_SECRET", "")
-        self.tenant_id = os.getenv("SOPHOS_TENANT_ID", "")
-        self.access_token = None
+        self.tenant_id = tenant_id if tenant_id is not None else os.getenv("SOPHOS_TENANT_ID", "")
+        self.api_host = api_host or os.getenv("SOPHOS_API_HOST", DEFAULT_API_HOST)
+        self.timeout = HTTP_TIMEOUT
+        if token_manager:
+            self.session = token_manager.session
+            self.token_manager = token_manager
+        else:
+            # Pooled keep-alive session, reused for every token and page request
+            self.session = create_session()
+            # Shared token cache, refreshed before expiry and on 401
+            self.token_manager = TokenManager(self.client_id, self.client_secret, session=self.session)
+        # Shared with every client talking to the same host and tenant
+        self.rate_limiter = get_rate_limiter(self.api_host, self.tenant_id)
+    
+    @property
+    def access_token(self):
+        return self.token_manager.access_token
         
     def get_access_token(self):
-        """Get access token from Sophos API."""
-        token_url = "https://id.sophos.com/api/v2/oauth2/token"
-        
+        """Get a valid access token, refreshing the cached one if needed."""
+        return self.token_manager.get_token()
+
+    def _get(self, url: str, params: Dict[str, Any]):
+        """GET an API page with the current token, retrying once on 401."""
         headers = {
-            "Content-Type": "application/x-www-form-urlencoded"
+            "X-Tenant-ID": self.tenant_id,
+            "Accept": "application/json"
         }
+        return self.token_manager.request(
+            "GET", url, rate_limiter=self.rate_limiter, headers=headers, params=params,
+            timeout=self.timeout, stream=True
+        )
+
+    def for_tenant(self, tenant: Dict[str, Any]) -> "SophosClient":
+        """Client for one discovered tenant, sharing this client's session and token."""
+        return SophosClient(tenant_id=tenant["id"], api_host=tenant["api_host"], token_manager=self.token_manager)
+
+    def discover_tenants(self) -> List[Dict[str, Any]]:
+        """List the tenants these credentials manage, with their API host."""
+        return discover_tenants(self.token_manager)
+
+    def sync_tenants(self, stream: str, max_workers: int = TENANT_WORKERS, progress=None, **kwargs) -> Dict[str, Any]:
+        """Sync ``endpoints``, ``siem_events`` or ``siem_backfill`` for every tenant in parallel.
         
-        data = {
-            "grant_type": "client_credentials",
-            "client_id": self.client_id,
-            "client_secret": self.client_secret,
-            "scope": "token"
-        }
+        Each tenant runs on its own worker with its own DB session, cursor and
+        rate limiter, so total time is bounded by the slowest tenant.
+        """
+        if stream not in ("endpoints", "siem_events", "siem_backfill"):
+            raise ValueError(f"Unknown stream: {stream}")
         
         try:
-            response = requests.post(token_url, headers=headers, data=data)
-            response.raise_for_status()
-            
-            token_data = response.json()
-            self.access_token = token_data.get("access_token")
-            return self.access_token
+            tenants = self.discover_tenants()
         except Exception as e:
-            print(f"❌ Error getting access token: {e}")
-            return None
+            print(f"❌ Error discovering tenants: {e}")
+            return {"success": False, "error": str(e)}
+        
+        def sync(tenant):
+            client = self.for_tenant(tenant)
+            if stream == "siem_backfill":
+                # Each slice opens its own session
+                return client.backfill_siem_events(progress=progress, **kwargs)
+            with session_scope() as db:
+                if stream == "endpoints":
+                    return client.fetch_endpoints(db, progress=progress, **kwargs)
+                return client.fetch_siem_events(db, progress=progress, **kwargs)
+        
+        results = {}
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="tenant-sync") as pool:
+            futures = {pool.submit(sync, tenant): tenant for tenant in tenants}
+            for future in as_completed(futures):
+                tenant = futures[future]
+                try:
+                    results[tenant["id"]] = future.result()
+                except Exception as e:
+                    results[tenant["id"]] = {"success": False, "error": str(e)}
+        
+        return {
+            "success": all(result.get("success") for result in results.values()),
+            "tenant_count": len(tenants),
+            "tenants": results
+        }
 
-    def fetch_endpoints(self, db: Session, page_size: int = 100) -> Dict[str, Any]:
-        """Fetch all endpoints and store in database."""
-        if not self.access_token:
-            self.get_access_token()
+    def _iter_endpoint_pages(
+        self, page_size: int, filters: Optional[Dict[str, Any]] = None, progress=None
+    ) -> Iterator[List[Dict[str, Any]]]:
+        """Yield pages of endpoints matching ``filters``, following the nextKey chain.
+        
+        With ``progress``, the first page asks for the page total and adds it
+        to the pages the job expects.
+        """
+        base_url = self.api_host + ENDPOINTS_PATH
+        next_key = None
+        
+        while True:
+            params = {
+                "pageSize": page_size,
+                **(filters or {})
+            }
             
-        base_url = "https://api-us01.central.sophos.com/endpoint/v1/endpoints"
+            if next_key:
+                params['pageFromKey'] = next_key
+            elif progress is not None:
+                params['pageTotal'] = "true"
+            
+            response = self._get(base_url, params)
+            
+            if response.status_code != 200:
+                response.close()
+                # Raise rather than stop, so a partial run never counts as a
+                # completed generation
+                raise RuntimeError(f"Sophos API returned {response.status_code} for endpoints")
+            
+            data = parse_page(response)
+            endpoints = data.get('items', [])
+            
+            if not next_key and progress is not None:
+                progress.expect(data.get('pages', {}).get('total') or 0)
+            
+            if not endpoints:
+                return
+            
+            yield endpoints
+            
+            next_key = data.get('pages', {}).get('nextKey')
+            if not next_key:
+                return
+
+    def _iter_endpoint_pages_by_id(
+        self, page_size: int, endpoint_ids: List[str], progress=None
+    ) -> Iterator[List[Dict[str, Any]]]:
+        """Yield pages of the given endpoints, a bounded number of ids per request."""
+        for i in range(0, len(endpoint_ids), ENDPOINT_IDS_PER_REQUEST):
+            yield from self._iter_endpoint_pages(
+                page_size, {"ids": endpoint_ids[i:i + ENDPOINT_IDS_PER_REQUEST]}, progress
+            )
+
+    def fetch_endpoints(
+        self, db: Session, page_size: int = 100, incremental: bool = False, progress=None
+    ) -> Dict[str, Any]:
+        """Fetch endpoints and store in database.
         
-        headers = {
-            "Authorization": f"Bearer {self.access_token}",
-            "X-Tenant-ID": self.tenant_id,
-            "Accept": "application/json"
-        }
+        Pages are fetched in a background thread while the previous page is
+        written, see ``run_pipeline``. Each full sync is a numbered generation;
+        once it completes, endpoints it did not see are soft-deleted.
+        
+        With ``incremental`` only endpoints seen since the stored ``lastSeenAt``
+        watermark are fetched, plus online endpoints that have been silent for
+        ``ENDPOINT_OFFLINE_AFTER``, and nothing is retired. The first sync of a
+        tenant is always full. ``progress`` is the running job's, if any.
+        """
+        stream = endpoint_stream(self.tenant_id)
+        state = get_sync_state(db, stream)
+        watermark = state.high_water if state else None
+        if incremental and watermark is None:
+            print("⚠️  No endpoint watermark yet, running a full sync")
+            incremental = False
+        
+        # Everything about this run lives here, not on the shared client
+        generation = None if incremental else start_generation(db, stream)
+        seen_ids = set()
+        newest_seen = None
+        total_endpoints = 0
+        counts = {"inserted": 0, "updated": 0, "unchanged": 0}
+        
+        def store_page(endpoints):
+            nonlocal total_endpoints, newest_seen
+            total_endpoints += len(endpoints)
+            seen_ids.update(endpoint['id'] for endpoint in endpoints if endpoint.get('id'))
+            for endpoint in endpoints:
+                last_seen = parse_timestamp(endpoint.get('lastSeenAt'))
+                if last_seen and (newest_seen is None or last_seen > newest_seen):
+                    newest_seen = last_seen
+            
+            # Store the whole page in one upsert statement
+            page_counts = upsert_endpoints(db, endpoints, self.tenant_id)
+            for key, value in page_counts.items():
+                counts[key] += value
+            if progress is not None:
+                progress.add_page(len(endpoints))
+                progress.complete()
         
-        all_endpoints = []
-        page_count = 0
+        filters = {}
+        if incremental:
+            since = watermark - ENDPOINT_WATERMARK_OVERLAP
+            filters["lastSeenAfter"] = since.strftime('%Y-%m-%dT%H:%M:%S.000Z')
         
         try:
-            while True:
-                page_count += 1
-                
-                params = {
-                    "pageSize": page_size
-                }
-                
-                if page_count > 1 and hasattr(self, 'next_key'):
-                    params['pageFromKey'] = self.next_key
-                
-                response = requests.get(base_url, headers=headers, params=params)
-                
-                if response.status_code == 200:
-                    data = response.json()
-                    endpoints = data.get('items', [])
-                    
-                    if not endpoints:
-                        break
-                    
-                    all_endpoints.extend(endpoints)
-                    
-                    # Store endpoints in database
-                    for endpoint_data in endpoints:
-                        self._store_endpoint(db, endpoint_data)
-                    
-                    pages_info = data.get('pages', {})
-                    if not pages_info.get('nextKey'):
-                        break
-                    
-                    self.next_key = pages_info['nextKey']
-                    time.sleep(0.1)
-                    
-                else:
-                    print(f"❌ Error: {response.status_code}")
-                    break
-                    
+            page_count = run_pipeline(
+                self._iter_endpoint_pages(page_size, filters, progress), store_page, progress=progress
+            )
+            if incremental:
+                # An endpoint that goes offline stops reporting and never shows
+                # up in a lastSeenAfter window, so re-check the overdue ones by
+                # id. Measured on the API's clock, not ours.
+                newest = max(watermark, naive_utc(newest_seen)) if newest_seen else watermark
+                stale_ids = stale_online_endpoints(db, seen_ids, newest - ENDPOINT_OFFLINE_AFTER, self.tenant_id)
+                page_count += run_pipeline(
+                    self._iter_endpoint_pages_by_id(page_size, stale_ids, progress), store_page, progress=progress
+                )
+            # Endpoints stored before tenants were tracked belong to the configured tenant
+            retired = 0 if incremental else sweep_endpoints(
+                db, seen_ids, self.tenant_id, include_untenanted=self.tenant_id == os.getenv("SOPHOS_TENANT_ID", "")
+            )
+            # Only advanced once the run completes; pages are not in lastSeenAt order
+            save_sync_state(db, stream, None, newest_seen)
         except Exception as e:
             print(f"❌ Exception: {str(e)}")
-            return {"success": False, "error": str(e)}
+            return {"success": False, "error": str(e), "mode": "incremental" if incremental else "full",
+                    "generation": generation}
+        
+        if incremental:
+            print(f"✅ Endpoints synced (incremental since {watermark}): "
+                  f"{counts['inserted'] + counts['updated']} changed, {counts['unchanged']} unchanged")
+        else:
+            print(f"✅ Endpoints synced (generation {generation}): "
+                  f"{counts['inserted'] + counts['updated']} changed, "
+                  f"{counts['unchanged']} unchanged, {retired} retired")
         
         return {
             "success": True,
-            "total_endpoints": len(all_endpoints),
-            "pages_processed": page_count
+            "mode": "incremental" if incremental else "full",
+            "generation": generation,
+            "total_endpoints": total_endpoints,
+            "pages_processed": page_count,
+            "retired": retired,
+            "changed": counts["inserted"] + counts["updated"],
+            **counts
         }
 
-    def _store_endpoint(self, db: Session, endpoint_data: Dict[str, Any]):
-        """Store endpoint data in database."""
-        try:
-            # Debug: Print first few endpoints to see available fields
-            if not hasattr(self, '_debug_printed'):
-                print(f"🔍 DEBUG: Sample endpoint data from Sophos API:")
-                print(f"Available fields: {list(endpoint_data.keys())}")
-                print(f"Full data sample: {endpoint_data}")
-                self._debug_printed = True
-            
-            # Check if endpoint already exists
-            existing = db.query(Endpoint).filter(Endpoint.endpoint_id == endpoint_data.get('id')).first()
-            
-            if existing:
-                # Update existing endpoint
-                existing.hostname = endpoint_data.get('hostname')
-                existing.os_name = endpoint_data.get('os', {}).get('name')
-                existing.endpoint_type = endpoint_data.get('type')
-                existing.online_status = endpoint_data.get('online', False)
-                existing.health_status = endpoint_data.get('health', {}).get('overall')
-                existing.group_name = endpoint_data.get('group', {}).get('name')
-                existing.ip_addresses = endpoint_data.get('ipv4Addresses', [])
-                existing.updated_at = datetime.utcnow()
-            else:
-                # Create new endpoint
-                new_endpoint = Endpoint(
-                    endpoint_id=endpoint_data.get('id'),
-                    hostname=endpoint_data.get('hostname'),
-                    os_name=endpoint_data.get('os', {}).get('name'),
-                    endpoint_type=endpoint_data.get('type'),
-                    online_status=endpoint_data.get('online', False),
-                    health_status=endpoint_data.get('health', {}).get('overall'),
-                    group_name=endpoint_data.get('group', {}).get('name'),
-                    ip_addresses=endpoint_data.get('ipv4Addresses', [])
-                )
-                db.add(new_endpoint)
+    def _iter_siem_pages(self, params: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+        """Yield raw SIEM event pages, following the cursor chain.
+        
+        A 4xx for the first page of a chain started from ``params['cursor']``
+        raises SIEMCursorRejected.
+        """
+        url = self.api_host + SIEM_EVENTS_PATH
+        params = dict(params)
+        resumed = 'cursor' in params
+        
+        while True:
+            response = self._get(url, params)
             
-            db.commit()
+            if response.status_code != 200:
+                response.close()
+                if resumed and 400 <= response.status_code < 500:
+                    # Expired or invalid saved cursor
+                    raise SIEMCursorRejected(f"Sophos API returned {response.status_code} for the saved SIEM cursor")
+                # Raise so callers can tell a failed page from the end of the chain
+                raise RuntimeError(f"Sophos API returned {response.status_code} for SIEM events")
+            resumed = False
             
-        except Exception as e:
-            print(f"❌ Error storing endpoint: {e}")
-            db.rollback()
-
-    def fetch_siem_events(self, db: Session, max_events: int = 100000) -> Dict[str, Any]:
-        """Fetch SIEM events and store in database."""
-        if not self.access_token:
-            self.get_access_token()
+            data = parse_page(response)
+            yield data
             
-        url = "https://api-us01.central.sophos.com/siem/v1/events"
-        
-        headers = {
-            "Authorization": f"Bearer {self.access_token}",
-            "X-Tenant-ID": self.tenant_id,
-            "Accept": "application/json"
-        }
+            next_cursor = data.get('next_cursor') or data.get('pages', {}).get('nextKey')
+            if not data.get('items') or not next_cursor or data.get('has_more') is False:
+                return
+            
+            params.pop('from_date', None)
+            params['cursor'] = next_cursor
+
+    def fetch_siem_events(self, db: Session, max_events: int = 100000, progress=None) -> Dict[str, Any]:
+        """Fetch SIEM events and store in database.
         
-        # No time range limit - fetch all events
+        Resumes from the cursor saved in ``sync_state`` by the previous run,
+        so steady-state runs only page through new events. A saved cursor the
+        API rejects is reset and the run retried once from the high-water
+        mark. Pages are fetched in a background thread while the previous
+        page is written.
+        """
         params = {
-            "pageSize": min(max_events, 500)
+            "pageSize": min(max_events, SIEM_BATCH_SIZE)
         }
         
-        all_events = []
+        # Resume from the saved cursor, or from the high-water mark when the
+        # cursor was reset (the API only accepts from_date within 24 hours)
+        stream = siem_stream(self.tenant_id)
+        state = get_sync_state(db, stream)
+        if state is None and stream != SIEM_STREAM and self.tenant_id == os.getenv("SOPHOS_TENANT_ID", ""):
+            # Cursor saved for the configured tenant before tenants were tracked;
+            # moved so a reset of the tenant's stream can't fall back to it
+            state = migrate_sync_state(db, SIEM_STREAM, stream)
+        cursor = state.cursor if state else None
+        if cursor:
+            params['cursor'] = cursor
+        elif state and state.high_water:
+            params['from_date'] = siem_from_date(state.high_water)
+        
+        total_events = 0
+        counts = {"inserted": 0, "duplicates": 0}
+        
+        def store_page(data):
+            nonlocal total_events, cursor
+            events = data.get('items', [])
+            next_cursor = data.get('next_cursor') or data.get('pages', {}).get('nextKey')
+            
+            if not events:
+                if next_cursor:
+                    save_sync_state(db, stream, next_cursor)
+                return False
+            
+            # Stop mid-page at max_events, keeping the current cursor
+            # so the rest of the page is picked up next run
+            truncated = len(events) > max_events - total_events
+            events = events[:max_events - total_events]
+            
+            # Store the page in one transaction
+            page_counts = insert_siem_events(db, events, self.tenant_id)
+            for key, value in page_counts.items():
+                counts[key] += value
+            total_events += len(events)
+            if progress is not None:
+                progress.add_page(len(events))
+                progress.complete(len(events))
+            
+            high_water = max(
+                filter(None, (parse_timestamp(event.get('created_at')) for event in events)),
+                default=None
+            )
+            if not truncated and next_cursor:
+                cursor = next_cursor
+            save_sync_state(db, stream, cursor, high_water)
+            
+            return not truncated and total_events < max_events
+        
+        if progress is not None:
+            # An upper bound; a run that catches up stops early
+            progress.expect(max_events)
         
         try:
-            while len(all_events) < max_events:
-                response = requests.get(url, headers=headers, params=params)
-                
-                if response.status_code == 200:
-                    data = response.json()
-                    events = data.get('items', [])
-                    
-                    if not events:
-                        break
-                    
-                    # Store events in database
-                    for event_data in events:
-                        if len(all_events) < max_events:
-                            self._store_siem_event(db, event_data)
-                            all_events.append(event_data)
-                    
-                    # Check for next page
-                    pages_info = data.get('pages', {})
-                    if not pages_info.get('nextKey'):
-                        break
-                    
-                    params['pageFromKey'] = pages_info['nextKey']
-                    time.sleep(0.1)
-                    
-                else:
-                    print(f"❌ Error: {response.status_code}")
-                    break
-                    
+            try:
+                run_pipeline(self._iter_siem_pages(params), store_page, progress=progress)
+            except SIEMCursorRejected as e:
+                # Nothing was stored from the rejected cursor, so start over
+                # from the high-water mark as a reset would
+                print(f"⚠️  {e}; resetting the cursor of '{stream}' and resuming from its high-water mark")
+                reset_sync_state(db, stream)
+                cursor = None
+                params.pop('cursor')
+                if state.high_water:
+                    params['from_date'] = siem_from_date(state.high_water)
+                run_pipeline(self._iter_siem_pages(params), store_page, progress=progress)
         except Exception as e:
             print(f"❌ Exception: {str(e)}")
             return {"success": False, "error": str(e)}
         
         return {
             "success": True,
-            "total_events": len(all_events)
+            "total_events": total_events,
+            **counts
         }
 
-    def _store_siem_event(self, db: Session, event_data: Dict[str, Any]):
-        """Store SIEM event data in database."""
-        try:
-            # Check if event already exists
-            existing = db.query(SIEMEvent).filter(SIEMEvent.event_id == event_data.get('id')).first()
-            
-            if not existing:
-                # Create new event
-                new_event = SIEMEvent(
-                    event_id=event_data.get('id'),
-                    endpoint_id=event_data.get('endpoint_id'),
-                    event_type=event_data.get('type'),
-                    severity=event_data.get('severity'),
-                    source=event_data.get('source'),
-                    name=event_data.get('name'),
-                    location=event_data.get('location'),
-                    group=event_data.get('group'),
-                    created_at=datetime.fromisoformat(event_data.get('created_at', '').replace('Z', '+00:00')) if event_data.get('created_at') else None,
-                    when=datetime.fromisoformat(event_data.get('when', '').replace('Z', '+00:00')) if event_data.get('when') else None,
-                    raw_data=event_data
-                )
-                db.add(new_event)
-                db.commit()
-                
-        except Exception as e:
-            print(f"❌ Error storing SIEM event: {e}")
-            db.rollback()
+    def _backfill_slice(
+        self, slice_start: datetime, slice_end: datetime, from_date: datetime, page_size: int, progress=None
+    ) -> Dict[str, Any]:
+        """Fetch and store the SIEM events of one time slice, checkpointing each page.
+        
+        Events come back oldest first from ``from_date``, so the slice ends at
+        the first event past ``slice_end``. The slice's cursor is saved after
+        every page and it is marked complete by moving its high-water mark to
+        ``slice_end``, so a rerun resumes or skips it.
+        """
+        with session_scope() as db:
+            try:
+                if progress is not None:
+                    # Slices still queued when the job is cancelled never start
+                    progress.check_cancelled()
+                stream = backfill_stream(self.tenant_id, slice_start)
+                state = get_sync_state(db, stream)
+                if state and state.high_water and state.high_water >= slice_end.replace(tzinfo=None):
+                    return {"success": True, "slice_start": slice_start, "complete": True,
+                            "skipped": True, "inserted": 0, "duplicates": 0}
+
+                params = {"pageSize": page_size}
+                cursor = state.cursor if state else None
+                if cursor:
+                    params['cursor'] = cursor
+                else:
+                    params['from_date'] = int(from_date.timestamp())
+
+                counts = {"inserted": 0, "duplicates": 0}
+
+                def store_page(data):
+                    nonlocal cursor
+                    events = data.get('items', [])
+                    in_slice = [
+                        event for event in events
+                        if (parse_timestamp(event.get('created_at')) or slice_start) < slice_end
+                    ]
+
+                    if in_slice:
+                        page_counts = insert_siem_events(db, in_slice, self.tenant_id)
+                        for key, value in page_counts.items():
+                            counts[key] += value
+                    if progress is not None:
+                        progress.add_page(len(in_slice))
+
+                    if len(in_slice) < len(events):
+                        # Reached the next slice
+                        save_sync_state(db, stream, None, slice_end)
+                        return False
 
- 
\ No newline at end of file
+                    cursor = data.get('next_cursor') or data.get('pages', {}).get('nextKey') or cursor
+                    high_water = max(
+                        filter(None, (parse_timestamp(event.get('created_at')) for event in in_slice)),
+                        default=None
+                    )
+                    save_sync_state(db, stream, cursor, high_water)
+
+                run_pipeline(self._iter_siem_pages(params), store_page, progress=progress)
+                # The chain ended before the slice did; nothing more to fetch
+                save_sync_state(db, stream, None, slice_end)
+
+                return {"success": True, "slice_start": slice_start, "complete": True,
+                        "skipped": False, **counts}
+            except Exception as e:
+                print(f"❌ Backfill slice {slice_start:%Y-%m-%d %H:%M} failed: {e}")
+                return {"success": False, "slice_start": slice_start, "error": str(e)}
+
+    def backfill_siem_events(
+        self,
+        hours: int = 24,
+        slice_minutes: int = 60,
+        slice_workers: int = SIEM_BACKFILL_WORKERS,
+        page_size: int = SIEM_BATCH_SIZE,
+        progress=None
+    ) -> Dict[str, Any]:
+        """Load the last ``hours`` of SIEM events as time slices fetched in parallel.
+        
+        Slices are aligned to ``slice_minutes`` so reruns find the checkpoints
+        of an interrupted backfill: complete slices are skipped and partial
+        ones resume from their saved cursor. All slices share the tenant's
+        rate limiter, and pages land through the bulk writer.
+        """
+        now = datetime.now(timezone.utc)
+        start = now - timedelta(hours=hours)
+        if start < now - SIEM_MAX_LOOKBACK:
+            print(f"⚠️  SIEM API only serves the last {SIEM_MAX_LOOKBACK.total_seconds() / 3600:.0f} hours, "
+                  f"backfilling from there")
+            start = now - SIEM_MAX_LOOKBACK
+        
+        # Slices sit on a fixed grid so their checkpoint names survive reruns;
+        # the first one starts fetching at ``start`` rather than its grid line
+        step = timedelta(minutes=slice_minutes)
+        epoch = datetime(1970, 1, 1, tzinfo=timezone.utc)
+        slice_start = epoch + (start - epoch) // step * step
+        slices = []
+        while slice_start < now:
+            slices.append((slice_start, min(slice_start + step, now), max(slice_start, start)))
+            slice_start += step
+        
+        print(f"📥 Backfilling {len(slices)} SIEM slices with {slice_workers} workers")
+        if progress is not None:
+            progress.expect(len(slices))
+        results = []
+        with ThreadPoolExecutor(max_workers=slice_workers, thread_name_prefix="siem-backfill") as pool:
+            futures = [pool.submit(self._backfill_slice, slice_start, slice_end, from_date, page_size, progress)
+                       for slice_start, slice_end, from_date in slices]
+            for future in as_completed(futures):
+                results.append(future.result())
+                if progress is not None:
+                    progress.complete()
+        
+        results.sort(key=lambda result: result["slice_start"])
+        inserted = sum(result.get("inserted", 0) for result in results)
+        print(f"✅ Backfill stored {inserted} new events")
+        
+        return {
+            "success": all(result["success"] for result in results),
+            "slices": len(results),
+            "skipped": sum(1 for result in results if result.get("skipped")),
+            "inserted": inserted,
+            "duplicates": sum(result.get("duplicates", 0) for result in results),
+            "failed": [result for result in results if not result["success"]]
+        }
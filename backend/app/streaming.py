@@ -0,0 +1,24 @@
+from typing import Any, Dict
+
+try:
+    import ijson
+except ImportError:  # fall back to response.json()
+    ijson = None
+
+def parse_page(response) -> Dict[str, Any]:
+    """Decode a JSON page response, parsing the body as it streams in.
+
+    With ijson installed and the request made with ``stream=True``, the body
+    is decoded straight from the socket, so the raw bytes and text of a large
+    page are never held in memory next to the parsed items. The response is
+    closed afterwards, returning its connection to the pool.
+    """
+    try:
+        if ijson is None or response.raw is None:
+            return response.json()
+
+        # Let urllib3 undo gzip before the parser sees the bytes
+        response.raw.decode_content = True
+        return dict(ijson.kvitems(response.raw, "", use_float=True))
+    finally:
+        response.close()
@@ -0,0 +1,106 @@
+from datetime import datetime, timezone
+from typing import Optional, Dict, Any
+from sqlalchemy.orm import Session
+from .database import SyncState
+
+SIEM_STREAM = "siem_events"
+ENDPOINTS_STREAM = "endpoints"
+
+def siem_stream(tenant_id: Optional[str] = None) -> str:
+    """Stream name for a tenant's SIEM cursor."""
+    return f"{SIEM_STREAM}:{tenant_id}" if tenant_id else SIEM_STREAM
+
+def endpoint_stream(tenant_id: Optional[str] = None) -> str:
+    """Stream name for a tenant's endpoint sync generations."""
+    return f"{ENDPOINTS_STREAM}:{tenant_id}" if tenant_id else ENDPOINTS_STREAM
+
+def backfill_stream(tenant_id: Optional[str], slice_start: datetime) -> str:
+    """Stream name for the checkpoint of one SIEM backfill time slice."""
+    return f"siem_backfill:{tenant_id or ''}:{slice_start:%Y%m%dT%H%MZ}"
+
+def get_sync_state(db: Session, stream: str) -> Optional[SyncState]:
+    """Return the saved position for a stream, or None on first sync."""
+    return db.query(SyncState).filter(SyncState.stream == stream).first()
+
+def save_sync_state(db: Session, stream: str, cursor: Optional[str], high_water: Optional[datetime] = None):
+    """Persist the resume cursor and advance the high-water mark of a stream."""
+    if high_water is not None and high_water.tzinfo is not None:
+        # Stored naive UTC, like every other timestamp column
+        high_water = high_water.astimezone(timezone.utc).replace(tzinfo=None)
+
+    try:
+        state = get_sync_state(db, stream)
+        if state is None:
+            state = SyncState(stream=stream)
+            db.add(state)
+
+        state.cursor = cursor
+        if high_water is not None and (state.high_water is None or high_water > state.high_water):
+            state.high_water = high_water
+        state.updated_at = datetime.utcnow()
+
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+
+def migrate_sync_state(db: Session, old_stream: str, new_stream: str) -> Optional[SyncState]:
+    """Move a stream's saved position to a new stream name, deleting the old row."""
+    try:
+        old = get_sync_state(db, old_stream)
+        if old is None:
+            return None
+        state = SyncState(
+            stream=new_stream, cursor=old.cursor, high_water=old.high_water,
+            generation=old.generation, updated_at=datetime.utcnow()
+        )
+        db.add(state)
+        db.delete(old)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    print(f"🔁 Moved sync state '{old_stream}' to '{new_stream}'")
+    return state
+
+def start_generation(db: Session, stream: str) -> int:
+    """Allocate the next sync generation number for a stream."""
+    try:
+        state = get_sync_state(db, stream)
+        if state is None:
+            state = SyncState(stream=stream, generation=0)
+            db.add(state)
+
+        state.generation = (state.generation or 0) + 1
+        state.updated_at = datetime.utcnow()
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    return state.generation
+
+def reset_sync_state(db: Session, stream: str, forget: bool = False) -> bool:
+    """Drop a stream's saved cursor, keeping its high-water mark to resume from.
+
+    With ``forget`` the whole row goes, so the next sync starts from scratch.
+    """
+    try:
+        query = db.query(SyncState).filter(SyncState.stream == stream)
+        if forget:
+            changed = query.delete()
+        else:
+            changed = query.update({SyncState.cursor: None, SyncState.updated_at: datetime.utcnow()})
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    return changed > 0
+
+def sync_state_to_dict(state: SyncState) -> Dict[str, Any]:
+    return {
+        "stream": state.stream,
+        "cursor": state.cursor,
+        "high_water": state.high_water,
+        "generation": state.generation,
+        "updated_at": state.updated_at
+    }
@@ -0,0 +1,63 @@
+from typing import Any, Dict, List
+from .auth import TokenManager
+from .http_client import GLOBAL_API_HOST, WHOAMI_PATH, PARTNER_TENANTS_PATH, ORGANIZATION_TENANTS_PATH
+from .rate_limit import get_rate_limiter
+
+# Tenant listing endpoint and id header for each whoami idType
+TENANT_LISTINGS = {
+    "partner": (PARTNER_TENANTS_PATH, "X-Partner-ID"),
+    "organization": (ORGANIZATION_TENANTS_PATH, "X-Organization-ID"),
+}
+
+def whoami(token_manager: TokenManager) -> Dict[str, Any]:
+    """Identify the credentials: a tenant, partner or organization."""
+    response = token_manager.request(
+        "GET", GLOBAL_API_HOST + WHOAMI_PATH, rate_limiter=get_rate_limiter(GLOBAL_API_HOST)
+    )
+    response.raise_for_status()
+    return response.json()
+
+def discover_tenants(token_manager: TokenManager) -> List[Dict[str, Any]]:
+    """List the tenants these credentials can sync, with their data-region host.
+
+    Tenant credentials yield just their own tenant; partner and organization
+    credentials page through every managed tenant.
+    """
+    identity = whoami(token_manager)
+    id_type = identity.get("idType")
+
+    if id_type == "tenant":
+        return [{
+            "id": identity["id"],
+            "name": None,
+            "api_host": identity.get("apiHosts", {}).get("dataRegion")
+        }]
+
+    if id_type not in TENANT_LISTINGS:
+        raise ValueError(f"Unsupported Sophos identity type: {id_type}")
+
+    path, id_header = TENANT_LISTINGS[id_type]
+    url = identity.get("apiHosts", {}).get("global", GLOBAL_API_HOST) + path
+    headers = {id_header: identity["id"]}
+    rate_limiter = get_rate_limiter(GLOBAL_API_HOST, identity["id"])
+
+    tenants = []
+    page = 1
+    while True:
+        response = token_manager.request(
+            "GET", url, rate_limiter=rate_limiter, headers=headers,
+            params={"page": page, "pageTotal": "true"}
+        )
+        response.raise_for_status()
+        data = response.json()
+
+        for item in data.get("items", []):
+            # Tenants still being provisioned have no host yet
+            if item.get("apiHost"):
+                tenants.append({"id": item["id"], "name": item.get("name"), "api_host": item["apiHost"]})
+
+        if page >= data.get("pages", {}).get("total", page):
+            break
+        page += 1
+
+    return tenants
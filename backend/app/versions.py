@@ -0,0 +1,65 @@
+import os
+import threading
+import uuid
+from typing import Dict, List, Optional
+
+try:
+    import redis
+except ImportError:  # versions stay in-process
+    redis = None
+
+# Datasets whose stored rows change with ingestion
+EVENTS = "events"
+ENDPOINTS = "endpoints"
+
+# With Redis, every API worker and scheduler shares the same versions
+REDIS_URL = os.getenv("REDIS_URL")
+REDIS_KEY_PREFIX = os.getenv("REDIS_KEY_PREFIX", "sophos-aggregator:")
+
+# In-process versions restart at 0, so they carry an id of this process to
+# keep versions from before a restart from matching
+_epoch = uuid.uuid4().hex[:8]
+_versions: Dict[str, int] = {EVENTS: 0, ENDPOINTS: 0}
+_lock = threading.Lock()
+_redis = None
+
+if REDIS_URL and redis is None:
+    print("⚠️  REDIS_URL is set but the redis package is not installed; using in-process caches")
+
+def get_redis():
+    """Shared Redis client, or None when REDIS_URL is unset or redis is missing."""
+    global _redis
+    if _redis is None and REDIS_URL and redis is not None:
+        _redis = redis.Redis.from_url(REDIS_URL, socket_timeout=1)
+    return _redis
+
+def bump_version(dataset: str):
+    """Mark a dataset as changed, invalidating anything derived from it."""
+    with _lock:
+        _versions[dataset] = _versions.get(dataset, 0) + 1
+
+    client = get_redis()
+    if client is not None:
+        try:
+            client.incr(f"{REDIS_KEY_PREFIX}version:{dataset}")
+        except redis.RedisError as e:
+            print(f"⚠️  Could not bump {dataset} version in Redis: {e}")
+
+def dataset_versions(datasets: List[str]) -> Optional[List[str]]:
+    """Current version tokens of datasets, or None if they can't be read."""
+    client = get_redis()
+    if client is None:
+        with _lock:
+            return [f"{_epoch}.{_versions.get(dataset, 0)}" for dataset in datasets]
+
+    try:
+        values = client.mget([f"{REDIS_KEY_PREFIX}version:{dataset}" for dataset in datasets])
+    except redis.RedisError as e:
+        print(f"⚠️  Could not read dataset versions from Redis: {e}")
+        return None
+    return [(value or b"0").decode() for value in values]
+
+def dataset_version(dataset: str) -> Optional[str]:
+    """Current version token of one dataset, or None if it can't be read."""
+    versions = dataset_versions([dataset])
+    return versions[0] if versions else None
@@ -0,0 +1,314 @@
+import hashlib
+import json
+from datetime import datetime, timedelta, timezone
+from typing import List, Dict, Any, Optional, Iterable
+from sqlalchemy import select, update, literal_column, all_, or_, bindparam, String
+from sqlalchemy.dialects.postgresql import insert as pg_insert, ARRAY
+from sqlalchemy.orm import Session
+from .database import Endpoint, SIEMEvent, SIEMEventPayload
+from .partitions import ensure_partitions
+from .rollups import add_to_rollups
+from .versions import bump_version, EVENTS, ENDPOINTS
+from .broadcast import event_broadcaster
+
+# Largest page the SIEM API returns, and the batch size for event inserts
+SIEM_BATCH_SIZE = 500
+
+# Payload fields that change on every poll without the endpoint changing.
+# They are left out of the fingerprint so heartbeats alone never cause a write.
+VOLATILE_ENDPOINT_FIELDS = ("lastSeenAt",)
+
+# ``last_seen_at`` of an otherwise unchanged endpoint is only rewritten once
+# it falls this far behind the payload, so heartbeats cost a write per
+# endpoint every few minutes rather than on every poll
+LAST_SEEN_RESOLUTION = timedelta(minutes=5)
+
+# Columns copied from the Sophos payload on every upsert. ``created_at`` is
+# only written on insert and ``updated_at`` only when the fingerprint changes.
+ENDPOINT_COLUMNS = (
+    "tenant_id",
+    "hostname",
+    "os_name",
+    "endpoint_type",
+    "online_status",
+    "health_status",
+    "group_name",
+    "ip_addresses",
+    "last_seen_at",
+    "content_hash",
+)
+
+def endpoint_fingerprint(endpoint_data: Dict[str, Any]) -> str:
+    """SHA-256 of the endpoint payload with keys sorted and volatile fields dropped."""
+    normalized = {key: value for key, value in endpoint_data.items() if key not in VOLATILE_ENDPOINT_FIELDS}
+    encoded = json.dumps(normalized, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(encoded.encode()).hexdigest()
+
+def endpoint_row(endpoint_data: Dict[str, Any], tenant_id: Optional[str] = None) -> Dict[str, Any]:
+    """Map a Sophos endpoint payload onto ``endpoints`` columns."""
+    last_seen = parse_timestamp(endpoint_data.get('lastSeenAt'))
+    return {
+        "endpoint_id": endpoint_data.get('id'),
+        "tenant_id": tenant_id or (endpoint_data.get('tenant') or {}).get('id'),
+        "hostname": endpoint_data.get('hostname'),
+        "os_name": (endpoint_data.get('os') or {}).get('name'),
+        "endpoint_type": endpoint_data.get('type'),
+        "online_status": endpoint_data.get('online', False),
+        "health_status": (endpoint_data.get('health') or {}).get('overall'),
+        "group_name": (endpoint_data.get('group') or {}).get('name'),
+        "ip_addresses": endpoint_data.get('ipv4Addresses', []),
+        "last_seen_at": naive_utc(last_seen) if last_seen else None,
+        "content_hash": endpoint_fingerprint(endpoint_data),
+    }
+
+def parse_timestamp(value: Any):
+    """Parse a Sophos ISO-8601 timestamp, returning None when missing or invalid."""
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except (TypeError, ValueError):
+        return None
+
+def naive_utc(value: datetime) -> datetime:
+    """Convert an aware timestamp to naive UTC, like every stored timestamp."""
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+def upsert_endpoints(db: Session, endpoints: List[Dict[str, Any]], tenant_id: Optional[str] = None) -> Dict[str, int]:
+    """Write one page of endpoints with a single INSERT ... ON CONFLICT DO UPDATE.
+
+    Each row carries a fingerprint of its payload. Stored fingerprints for the
+    page are read first and matching endpoints are not sent at all, so
+    unchanged rows are not rewritten: only a ``last_seen_at`` that has fallen
+    ``LAST_SEEN_RESOLUTION`` behind is moved forward. Soft-deleted endpoints
+    that reappear are restored. The returned counts distinguish
+    inserted, updated and unchanged endpoints.
+    """
+    # ON CONFLICT cannot touch the same row twice in one statement, so keep
+    # only the last copy of any endpoint repeated within the page.
+    rows_by_id = {}
+    for endpoint_data in endpoints:
+        row = endpoint_row(endpoint_data, tenant_id)
+        if row["endpoint_id"]:
+            rows_by_id[row["endpoint_id"]] = row
+
+    if not rows_by_id:
+        return {"inserted": 0, "updated": 0, "unchanged": 0}
+
+    table = Endpoint.__table__
+
+    try:
+        stored = {}
+        stored_last_seen = {}
+        for endpoint_id, content_hash, deleted_at, last_seen_at in db.execute(
+            select(table.c.endpoint_id, table.c.content_hash, table.c.deleted_at, table.c.last_seen_at)
+            .where(table.c.endpoint_id.in_(list(rows_by_id)))
+        ).all():
+            stored[endpoint_id] = (content_hash, deleted_at)
+            stored_last_seen[endpoint_id] = last_seen_at
+
+        now = datetime.utcnow()
+        rows = []
+        touched = []
+        for endpoint_id, row in rows_by_id.items():
+            if stored.get(endpoint_id) != (row["content_hash"], None):
+                rows.append(dict(row, created_at=now, updated_at=now, deleted_at=None))
+            elif row["last_seen_at"] and (
+                stored_last_seen[endpoint_id] is None
+                or row["last_seen_at"] - stored_last_seen[endpoint_id] >= LAST_SEEN_RESOLUTION
+            ):
+                touched.append({"b_endpoint_id": endpoint_id, "b_last_seen_at": row["last_seen_at"]})
+
+        if touched:
+            # Not a content change: updated_at and the data version stay put
+            db.execute(
+                update(table)
+                .where(table.c.endpoint_id == bindparam("b_endpoint_id"))
+                .values(last_seen_at=bindparam("b_last_seen_at"), updated_at=table.c.updated_at),
+                touched,
+            )
+
+        written = []
+        if rows:
+            stmt = pg_insert(table).values(rows)
+            excluded = stmt.excluded
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[table.c.endpoint_id],
+                set_={**{col: excluded[col] for col in ENDPOINT_COLUMNS}, "updated_at": now, "deleted_at": None},
+                # Re-checked here in case another writer got in first
+                where=table.c.content_hash.is_distinct_from(excluded.content_hash) | table.c.deleted_at.isnot(None),
+            ).returning(literal_column("(xmax = 0)").label("inserted"))
+            written = db.execute(stmt).scalars().all()
+
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+
+    if written:
+        bump_version(ENDPOINTS)
+    inserted = sum(1 for flag in written if flag)
+    updated = len(written) - inserted
+    return {
+        "inserted": inserted,
+        "updated": updated,
+        "unchanged": len(rows_by_id) - len(written),
+    }
+
+def sweep_endpoints(
+    db: Session, seen_ids: Iterable[str], tenant_id: Optional[str] = None, include_untenanted: bool = False
+) -> int:
+    """Soft-delete live endpoints that a completed sync generation did not see.
+
+    Runs as one UPDATE scoped to the tenant and returns the number of
+    endpoints retired. ``include_untenanted`` also sweeps rows stored before
+    tenants were tracked (NULL ``tenant_id``), for the tenant they came from.
+    Does nothing when no endpoints were seen at all, so an empty API response
+    cannot retire the whole fleet.
+    """
+    seen_ids = list(seen_ids)
+    if not seen_ids:
+        return 0
+
+    table = Endpoint.__table__
+    stmt = (
+        update(table)
+        .where(table.c.deleted_at.is_(None))
+        .where(table.c.endpoint_id != all_(bindparam("seen_ids", seen_ids, type_=ARRAY(String))))
+        .values(deleted_at=datetime.utcnow())
+    )
+    if tenant_id and include_untenanted:
+        stmt = stmt.where(or_(table.c.tenant_id == tenant_id, table.c.tenant_id.is_(None)))
+    elif tenant_id:
+        stmt = stmt.where(table.c.tenant_id == tenant_id)
+
+    try:
+        retired = db.execute(stmt).rowcount
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    if retired:
+        bump_version(ENDPOINTS)
+    return retired
+
+def stale_online_endpoints(
+    db: Session, seen_ids: Iterable[str], last_seen_before: datetime, tenant_id: Optional[str] = None
+) -> List[str]:
+    """Ids of live endpoints stored as online that have not reported since ``last_seen_before``.
+
+    Online endpoints report in every few minutes, so one whose stored
+    ``last_seen_at`` is that old has most likely gone offline without the
+    sync noticing. Rows stored before ``last_seen_at`` existed have none and
+    are always returned. Endpoints in ``seen_ids`` were just fetched.
+    """
+    table = Endpoint.__table__
+    stmt = (
+        select(table.c.endpoint_id)
+        .where(table.c.deleted_at.is_(None))
+        .where(table.c.online_status.is_(True))
+        .where(or_(table.c.last_seen_at.is_(None), table.c.last_seen_at < last_seen_before))
+        .where(table.c.endpoint_id != all_(bindparam("seen_ids", list(seen_ids), type_=ARRAY(String))))
+    )
+    if tenant_id:
+        stmt = stmt.where(table.c.tenant_id == tenant_id)
+    return list(db.execute(stmt).scalars())
+
+def siem_event_rows(events: List[Dict[str, Any]], tenant_id: Optional[str] = None) -> List[Dict[str, Any]]:
+    """Map a page of Sophos SIEM events onto ``siem_events`` columns.
+
+    ``raw_data`` is not a column there; ``insert_siem_events`` writes it to
+    ``siem_event_payloads``. Events without an id or a timestamp are skipped:
+    ``created_at`` is part of the conflict key, so it must be the same every
+    time an event is fetched.
+    """
+    fetched_at = datetime.utcnow()
+    rows = []
+    skipped = 0
+    for event_data in events:
+        created_at = parse_timestamp(event_data.get('created_at')) or parse_timestamp(event_data.get('when'))
+        if not event_data.get('id') or created_at is None:
+            skipped += 1
+            continue
+        rows.append({
+            "event_id": event_data.get('id'),
+            "tenant_id": tenant_id or event_data.get('customer_id'),
+            "endpoint_id": event_data.get('endpoint_id'),
+            "event_type": event_data.get('type'),
+            "severity": event_data.get('severity'),
+            "source": event_data.get('source'),
+            "name": event_data.get('name'),
+            "location": event_data.get('location'),
+            "group": event_data.get('group'),
+            # Partition key, so never null, and naive UTC as Postgres returns it
+            "created_at": naive_utc(created_at),
+            "when": parse_timestamp(event_data.get('when')),
+            "raw_data": event_data,
+            "fetched_at": fetched_at,
+        })
+    if skipped:
+        print(f"⚠️  Skipped {skipped} SIEM events without an id or timestamp")
+    return rows
+
+def insert_siem_events(db: Session, events: List[Dict[str, Any]], tenant_id: Optional[str] = None) -> Dict[str, int]:
+    """Insert a page of SIEM events with ON CONFLICT (event_id, created_at) DO NOTHING.
+
+    Events are written in batches of at most ``SIEM_BATCH_SIZE`` rows, all in
+    one transaction, after making sure the monthly partitions they land in
+    exist. The raw payloads of newly inserted events go to
+    ``siem_event_payloads`` and their counts to the hourly rollups, in the
+    same transaction. Events already stored, or repeated within the page, are
+    counted as duplicates. Once committed, the new events are published to
+    ``/stream/events`` subscribers.
+    """
+    fetched = siem_event_rows(events, tenant_id)
+    if not fetched:
+        return {"inserted": 0, "duplicates": 0}
+
+    # RETURNING reports an event repeated within the page once, but matching
+    # it back to the page would count, roll up and publish every copy, so
+    # keep only the last one.
+    rows = list({(row["event_id"], row["created_at"]): row for row in fetched}.values())
+
+    ensure_partitions(row["created_at"] for row in rows)
+
+    table = SIEMEvent.__table__
+    payloads = SIEMEventPayload.__table__
+    inserted = 0
+    new_events = []
+
+    try:
+        for start in range(0, len(rows), SIEM_BATCH_SIZE):
+            batch = rows[start:start + SIEM_BATCH_SIZE]
+            stmt = pg_insert(table).values(
+                [{key: value for key, value in row.items() if key != "raw_data"} for row in batch]
+            ).on_conflict_do_nothing(
+                index_elements=[table.c.event_id, table.c.created_at]
+            ).returning(table.c.id, table.c.event_id, table.c.created_at)
+            new_ids = {(event_id, created_at): id for id, event_id, created_at in db.execute(stmt).all()}
+            inserted += len(new_ids)
+
+            new_rows = [
+                {**row, "id": new_ids[(row["event_id"], row["created_at"])]}
+                for row in batch if (row["event_id"], row["created_at"]) in new_ids
+            ]
+            if new_rows:
+                db.execute(pg_insert(payloads).values([
+                    {"event_id": row["event_id"], "created_at": row["created_at"], "raw_data": row["raw_data"]}
+                    for row in new_rows
+                ]).on_conflict_do_nothing())
+            new_events.extend(new_rows)
+
+        add_to_rollups(db, new_events)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+
+    if inserted:
+        bump_version(EVENTS)
+        # Only committed events reach /stream/events
+        event_broadcaster.publish(new_events)
+    return {"inserted": inserted, "duplicates": len(fetched) - inserted}
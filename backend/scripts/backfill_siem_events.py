@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+"""
+SIEM event backfill for Sophos Aggregator
+
+Splits the requested window into time slices and fetches them in parallel
+through the bulk writer. Each slice checkpoints its cursor in sync_state, so
+rerunning after a crash skips finished slices and resumes the rest.
+"""
+
+import argparse
+import os
+import sys
+from dotenv import load_dotenv
+
+# Add the parent directory to the path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+load_dotenv()
+
+from app.database import create_tables
+from app.sophos_client import SophosClient, SIEM_BACKFILL_WORKERS
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--hours", type=int, default=24, help="how far back to load (the API serves 24 hours)")
+    parser.add_argument("--slice-minutes", type=int, default=60, help="length of each time slice")
+    parser.add_argument("--workers", type=int, default=SIEM_BACKFILL_WORKERS, help="slices fetched at once per tenant")
+    parser.add_argument("--all-tenants", action="store_true", help="backfill every tenant found via whoami")
+    args = parser.parse_args()
+
+    create_tables()
+    client = SophosClient()
+    options = {"hours": args.hours, "slice_minutes": args.slice_minutes, "slice_workers": args.workers}
+
+    if args.all_tenants:
+        result = client.sync_tenants("siem_backfill", **options)
+    else:
+        result = client.backfill_siem_events(**options)
+
+    if not result["success"]:
+        print(f"❌ Backfill incomplete, rerun to resume: {result}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+API latency benchmark for Sophos Aggregator
+
+Polls the read routes of a running API and reports p50/p99 latency while
+idle and again while a Sophos sync job started with POST /fetch/endpoints
+or /fetch/events runs. With the handlers kept off the event loop both phases should
+look the same; when a handler blocks the loop, p99 during the sync jumps to
+the length of the sync. Each request uses a different limit so it misses the
+response cache and reaches the database.
+"""
+
+import argparse
+import asyncio
+import itertools
+import statistics
+import time
+import httpx
+
+ROUTES = ["/health", "/data/endpoints", "/data/events", "/data/stats"]
+
+def summarize(name, latencies):
+    """Print p50/p99 latency in milliseconds."""
+    if not latencies:
+        print(f"   {name:<18} no requests completed")
+        return
+    latencies = sorted(latency * 1000 for latency in latencies)
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+    print(f"   {name:<18} p50 {statistics.median(latencies):7.2f}ms   p99 {p99:7.2f}ms   "
+          f"max {latencies[-1]:7.2f}ms   n={len(latencies)}")
+
+async def poll(client, until, concurrency):
+    """Request the read routes round-robin until ``until()`` is true, per-route latencies."""
+    latencies = {route: [] for route in ROUTES}
+    limits = itertools.count(1)
+
+    async def worker():
+        for route in itertools.cycle(ROUTES):
+            if until():
+                return
+            params = {} if route in ("/health", "/data/stats") else {"limit": 50 + next(limits) % 1000}
+            t0 = time.perf_counter()
+            response = await client.get(route, params=params)
+            response.raise_for_status()
+            latencies[route].append(time.perf_counter() - t0)
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return latencies
+
+async def run(args):
+    async with httpx.AsyncClient(base_url=args.base_url, timeout=None) as client:
+        print(f"📊 API latency benchmark against {args.base_url}, {args.concurrency} concurrent clients")
+
+        deadline = time.monotonic() + args.seconds
+        idle = await poll(client, lambda: time.monotonic() >= deadline, args.concurrency)
+        print("   idle:")
+        for route, latencies in idle.items():
+            summarize(route, latencies)
+
+        response = await client.post(f"/fetch/{args.sync}", params=args.sync_params)
+        response.raise_for_status()
+        job_id = response.json()["job"]["id"]
+        started = time.perf_counter()
+        job = {"status": "queued"}
+
+        async def follow():
+            # The fetch runs as a job; poll it until it finishes
+            while job["status"] in ("queued", "running", "cancelling"):
+                await asyncio.sleep(0.5)
+                job.update((await client.get(f"/jobs/{job_id}")).json())
+
+        watcher = asyncio.create_task(follow())
+        during = await poll(client, watcher.done, args.concurrency)
+        await watcher
+        print(f"   during /fetch/{args.sync} ({time.perf_counter() - started:.1f}s, job {job['status']}):")
+        for route, latencies in during.items():
+            summarize(route, latencies)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--seconds", type=float, default=10.0, help="length of the idle phase")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--sync", choices=["endpoints", "events"], default="endpoints")
+    args = parser.parse_args()
+    args.sync_params = {"max_events": 10000} if args.sync == "events" else {}
+    asyncio.run(run(args))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Endpoint ingestion benchmark for Sophos Aggregator
+
+Replays the endpoint inventory in data/ as API pages and compares the legacy
+per-row SELECT + commit path with the set-based upsert, reporting pages/sec.
+Rows are written with a "bench-" id prefix and removed afterwards.
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import datetime
+from dotenv import load_dotenv
+
+# Add the parent directory to the path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+load_dotenv()
+
+from app.database import SessionLocal, Endpoint, create_tables
+from app.writers import upsert_endpoints
+
+FIXTURE = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))),
+    "data", "sophos_endpoint_inventory_fixed.json"
+)
+
+def load_pages(copies, page_size):
+    """Build API-shaped pages from the inventory fixture."""
+    with open(FIXTURE) as f:
+        inventory = json.load(f)
+
+    endpoints = []
+    for copy in range(copies):
+        for endpoint in inventory:
+            endpoints.append(dict(endpoint, id=f"bench-{copy}-{endpoint['id']}"))
+
+    return [endpoints[i:i + page_size] for i in range(0, len(endpoints), page_size)]
+
+def legacy_store_page(db, endpoints):
+    """Per-row SELECT, ORM mutate and commit, as the client used to do."""
+    for endpoint_data in endpoints:
+        existing = db.query(Endpoint).filter(Endpoint.endpoint_id == endpoint_data.get('id')).first()
+
+        if existing:
+            existing.hostname = endpoint_data.get('hostname')
+            existing.os_name = endpoint_data.get('os', {}).get('name')
+            existing.endpoint_type = endpoint_data.get('type')
+            existing.online_status = endpoint_data.get('online', False)
+            existing.health_status = endpoint_data.get('health', {}).get('overall')
+            existing.group_name = endpoint_data.get('group', {}).get('name')
+            existing.ip_addresses = endpoint_data.get('ipv4Addresses', [])
+            existing.updated_at = datetime.utcnow()
+        else:
+            db.add(Endpoint(
+                endpoint_id=endpoint_data.get('id'),
+                hostname=endpoint_data.get('hostname'),
+                os_name=endpoint_data.get('os', {}).get('name'),
+                endpoint_type=endpoint_data.get('type'),
+                online_status=endpoint_data.get('online', False),
+                health_status=endpoint_data.get('health', {}).get('overall'),
+                group_name=endpoint_data.get('group', {}).get('name'),
+                ip_addresses=endpoint_data.get('ipv4Addresses', [])
+            ))
+
+        db.commit()
+
+def cleanup(db):
+    """Remove benchmark rows."""
+    db.query(Endpoint).filter(Endpoint.endpoint_id.like("bench-%")).delete(synchronize_session=False)
+    db.commit()
+
+def run(name, store_page, pages):
+    """Run one cold (insert) and one warm (re-sync) pass and print pages/sec."""
+    db = SessionLocal()
+    try:
+        cleanup(db)
+        for label in ("cold", "warm"):
+            started = time.perf_counter()
+            for page in pages:
+                store_page(db, page)
+            elapsed = time.perf_counter() - started
+            print(f"   {name:<8} {label:<5} {len(pages)} pages in {elapsed:.2f}s "
+                  f"({len(pages) / elapsed:.1f} pages/sec)")
+        cleanup(db)
+    finally:
+        db.close()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--copies", type=int, default=1, help="times to replicate the fixture")
+    parser.add_argument("--page-size", type=int, default=100)
+    args = parser.parse_args()
+
+    if not os.getenv("DATABASE_URL"):
+        print("❌ DATABASE_URL environment variable not set")
+        sys.exit(1)
+
+    create_tables()
+    pages = load_pages(args.copies, args.page_size)
+    print(f"📊 Endpoint ingestion benchmark: {sum(len(p) for p in pages)} endpoints, {len(pages)} pages")
+
+    run("legacy", legacy_store_page, pages)
+    run("bulk", upsert_endpoints, pages)
+
+if __name__ == "__main__":
+    main()
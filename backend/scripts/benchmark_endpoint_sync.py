@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+"""
+Endpoint sync benchmark for Sophos Aggregator
+
+Starts a local stand-in for the Sophos endpoints API on a simulated clock,
+where online endpoints report in every --heartbeat-minutes, and runs
+SophosClient.fetch_endpoints against it: one full sync, then an incremental
+sync every ENDPOINT_INCREMENTAL_MINUTES while --churn of the endpoints go
+offline or come back. Reports the API requests (lastSeenAfter window and
+by-id re-check) and bytes per incremental run next to a full sync.
+Rows are written for tenant "bench" with a "bench-" id prefix and removed
+afterwards.
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import threading
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+from dotenv import load_dotenv
+
+# Add the parent directory to the path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+load_dotenv()
+
+from app.database import SessionLocal, Endpoint, SyncState, create_tables
+from app.http_client import create_session
+from app.sophos_client import SophosClient, ENDPOINT_INCREMENTAL_MINUTES, ENDPOINT_OFFLINE_AFTER
+from app.sync_state import endpoint_stream
+from app.writers import parse_timestamp
+
+FIXTURE = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))),
+    "data", "sophos_endpoint_inventory_fixed.json"
+)
+
+TENANT = "bench"
+
+class StandInAPI:
+    """Endpoints whose lastSeenAt follows a simulated clock, and the traffic served."""
+
+    def __init__(self, inventory, copies, online, heartbeat, seed=1):
+        rng = self.rng = random.Random(seed)
+        self.heartbeat = heartbeat
+        self.clock = datetime(2025, 7, 4, 5, 0, tzinfo=timezone.utc)
+        self.endpoints = []
+        for copy in range(copies):
+            for endpoint in inventory:
+                is_online = rng.random() < online
+                self.endpoints.append({
+                    "data": dict(endpoint, id=f"bench-{copy}-{endpoint['id']}", online=is_online),
+                    # Online endpoints report in on their own phase of the heartbeat
+                    "phase": rng.uniform(0, heartbeat.total_seconds()) if is_online else None,
+                })
+        self.endpoints.sort(key=lambda endpoint: endpoint["data"]["id"])
+        self.lock = threading.Lock()
+        self.reset_counters()
+
+    def reset_counters(self):
+        self.requests = 0
+        self.by_id_requests = 0
+        self.bytes = 0
+
+    def advance(self, interval, churn):
+        """Move the clock by ``interval``, switching a ``churn`` share of endpoints on or off."""
+        for endpoint in self.endpoints:
+            if self.rng.random() >= churn:
+                continue
+            if endpoint["phase"] is None:
+                endpoint["phase"] = self.rng.uniform(0, self.heartbeat.total_seconds())
+                endpoint["data"]["online"] = True
+            else:
+                # Stops reporting at its last check-in
+                last_seen = self.last_seen(endpoint)
+                endpoint["data"]["lastSeenAt"] = last_seen.strftime('%Y-%m-%dT%H:%M:%S.%f')[:-3] + "Z"
+                endpoint["phase"] = None
+                endpoint["data"]["online"] = False
+        self.clock += interval
+
+    def last_seen(self, endpoint) -> datetime:
+        if endpoint["phase"] is None:
+            return parse_timestamp(endpoint["data"]["lastSeenAt"])
+        since_report = (self.clock.timestamp() - endpoint["phase"]) % self.heartbeat.total_seconds()
+        return self.clock - timedelta(seconds=since_report)
+
+    def page(self, query):
+        after = parse_timestamp(query["lastSeenAfter"][0]) if "lastSeenAfter" in query else None
+        ids = set(query.get("ids", []))
+        start = int(query.get("pageFromKey", ["0"])[0])
+        size = int(query.get("pageSize", ["100"])[0])
+
+        matching = []
+        for endpoint in self.endpoints:
+            if ids and endpoint["data"]["id"] not in ids:
+                continue
+            last_seen = self.last_seen(endpoint)
+            if after is not None and last_seen <= after:
+                continue
+            matching.append(dict(endpoint["data"], lastSeenAt=last_seen.strftime('%Y-%m-%dT%H:%M:%S.%f')[:-3] + "Z"))
+
+        items = matching[start:start + size]
+        pages = {"nextKey": str(start + size)} if start + size < len(matching) else {}
+        return json.dumps({"items": items, "pages": pages}).encode()
+
+class StandInHandler(BaseHTTPRequestHandler):
+    """Serves the endpoint pages of the server's current ``api``."""
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        api = self.server.api
+        body = api.page(parse_qs(urlparse(self.path).query))
+        with api.lock:
+            api.requests += 1
+            api.by_id_requests += "ids=" in self.path
+            api.bytes += len(body)
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+class StandInTokens:
+    """Token manager stand-in: the stand-in API needs no authorization."""
+
+    def __init__(self):
+        self.session = create_session()
+
+    def request(self, method, url, rate_limiter=None, **kwargs):
+        return self.session.request(method, url, **kwargs)
+
+def cleanup(db):
+    """Remove benchmark rows and the benchmark tenant's watermark."""
+    db.query(Endpoint).filter(Endpoint.endpoint_id.like("bench-%")).delete(synchronize_session=False)
+    db.query(SyncState).filter(SyncState.stream == endpoint_stream(TENANT)).delete(synchronize_session=False)
+    db.commit()
+
+def sync(client, db, page_size, incremental=False):
+    result = client.fetch_endpoints(db, page_size, incremental=incremental)
+    if not result["success"]:
+        raise RuntimeError(result["error"])
+    return result
+
+def run(api, client, db, interval, runs, page_size, churn):
+    """Full sync, then ``runs`` incremental syncs; returns requests, by-id requests, bytes and rows per run."""
+    sync(client, db, page_size)
+    requests_made = by_id_requests = bytes_read = rows = 0
+
+    for _ in range(runs):
+        api.advance(interval, churn)
+        api.reset_counters()
+        result = sync(client, db, page_size, incremental=True)
+        requests_made += api.requests
+        by_id_requests += api.by_id_requests
+        bytes_read += api.bytes
+        rows += result["total_endpoints"]
+
+    return requests_made / runs, by_id_requests / runs, bytes_read / runs, rows / runs
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--copies", type=int, default=5, help="Copies of the inventory fixture")
+    parser.add_argument("--online", type=float, default=0.6, help="Share of endpoints online")
+    parser.add_argument("--heartbeat-minutes", type=float, default=5.0)
+    parser.add_argument("--churn", type=float, default=0.02, help="Share of endpoints going on or offline per run")
+    parser.add_argument("--runs", type=int, default=30)
+    parser.add_argument("--page-size", type=int, default=100)
+    args = parser.parse_args()
+
+    if not os.getenv("DATABASE_URL"):
+        print("❌ DATABASE_URL environment variable not set")
+        sys.exit(1)
+
+    create_tables()
+    with open(FIXTURE) as f:
+        inventory = json.load(f)
+    heartbeat = timedelta(minutes=args.heartbeat_minutes)
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StandInHandler)
+    server.daemon_threads = True
+    server.api = api = StandInAPI(inventory, args.copies, args.online, heartbeat)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    client = SophosClient(
+        tenant_id=TENANT, api_host=f"http://127.0.0.1:{server.server_address[1]}", token_manager=StandInTokens()
+    )
+    interval = timedelta(minutes=ENDPOINT_INCREMENTAL_MINUTES)
+
+    print(f"📊 Endpoint sync benchmark: {len(api.endpoints)} endpoints, {args.online:.0%} online, "
+          f"{args.heartbeat_minutes:g} min heartbeat, {args.churn:.0%} churn, "
+          f"incremental every {ENDPOINT_INCREMENTAL_MINUTES} min, "
+          f"offline after {ENDPOINT_OFFLINE_AFTER.total_seconds() / 60:g} min")
+
+    db = SessionLocal()
+    try:
+        cleanup(db)
+        requests_made, by_id_requests, bytes_read, rows = run(
+            api, client, db, interval, args.runs, args.page_size, args.churn
+        )
+        print(f"   {'incremental':<12} {requests_made:6.1f} requests ({by_id_requests:.1f} by id)   "
+              f"{bytes_read / 1024:8.1f} KB   {rows:7.1f} endpoints per run")
+
+        api.reset_counters()
+        result = sync(client, db, args.page_size)
+        print(f"   {'full sync':<12} {api.requests:6.1f} requests   {api.bytes / 1024:8.1f} KB   "
+              f"{result['total_endpoints']:7.1f} endpoints per run")
+        cleanup(db)
+    finally:
+        db.close()
+        server.shutdown()
+
+if __name__ == "__main__":
+    main()
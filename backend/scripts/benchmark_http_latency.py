@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+HTTP latency benchmark for Sophos Aggregator
+
+Starts a local stand-in for the Sophos API and times page requests made
+with a new connection per call (module-level requests.get), the pooled
+keep-alive session and the async httpx client. --handshake-ms adds a delay
+to every new connection to stand in for the TCP+TLS handshake.
+"""
+
+import argparse
+import asyncio
+import gzip
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import requests
+
+# Add the parent directory to the path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.http_client import create_session, create_async_client
+
+FIXTURE = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))),
+    "data", "sophos_endpoint_inventory_fixed.json"
+)
+
+def make_handler(payload, handshake_ms):
+    """Build a request handler serving one endpoints page."""
+    compressed = gzip.compress(payload)
+
+    class StandInHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        disable_nagle_algorithm = True
+
+        def setup(self):
+            # Called once per connection, not per request
+            time.sleep(handshake_ms / 1000)
+            super().setup()
+
+        def do_GET(self):
+            use_gzip = "gzip" in self.headers.get("Accept-Encoding", "")
+            body = compressed if use_gzip else payload
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            if use_gzip:
+                self.send_header("Content-Encoding", "gzip")
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    return StandInHandler
+
+def summarize(name, latencies, elapsed):
+    """Print p50/p99 latency in milliseconds and throughput."""
+    latencies = sorted(latency * 1000 for latency in latencies)
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+    print(f"   {name:<18} p50 {statistics.median(latencies):7.2f}ms   p99 {p99:7.2f}ms   "
+          f"{len(latencies) / elapsed:8.1f} req/sec")
+
+def time_sync(get, url, requests_count):
+    latencies = []
+    started = time.perf_counter()
+    for _ in range(requests_count):
+        t0 = time.perf_counter()
+        response = get(url)
+        response.content
+        latencies.append(time.perf_counter() - t0)
+    return latencies, time.perf_counter() - started
+
+async def time_async(url, requests_count, concurrency):
+    latencies = []
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async with create_async_client(max_connections=concurrency) as client:
+        async def one():
+            async with semaphore:
+                t0 = time.perf_counter()
+                response = await client.get(url)
+                await response.aread()
+                latencies.append(time.perf_counter() - t0)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(one() for _ in range(requests_count)))
+        return latencies, time.perf_counter() - started
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--page-size", type=int, default=100)
+    parser.add_argument("--handshake-ms", type=float, default=20.0)
+    parser.add_argument("--concurrency", type=int, default=4)
+    args = parser.parse_args()
+
+    with open(FIXTURE) as f:
+        inventory = json.load(f)
+    payload = json.dumps({"items": inventory[:args.page_size], "pages": {}}).encode()
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), make_handler(payload, args.handshake_ms))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}/endpoint/v1/endpoints"
+
+    print(f"📊 HTTP latency benchmark: {args.requests} requests, "
+          f"{len(payload) // 1024} KB page, {args.handshake_ms}ms handshake")
+
+    summarize("requests.get", *time_sync(requests.get, url, args.requests))
+
+    session = create_session()
+    summarize("pooled session", *time_sync(session.get, url, args.requests))
+    session.close()
+
+    summarize(f"async x{args.concurrency}", *asyncio.run(time_async(url, args.requests, args.concurrency)))
+
+    server.shutdown()
+
+if __name__ == "__main__":
+    main()
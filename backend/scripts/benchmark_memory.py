@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+SIEM export memory benchmark for Sophos Aggregator
+
+Serves synthetic SIEM event pages from a local stand-in API and compares peak
+Python heap usage of the old accumulate-then-dump export with the streaming
+iter_siem_events/export_events_to_json path, for growing event counts.
+The streaming peak should stay flat as the event count grows.
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import threading
+import tracemalloc
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+# Add the backend and repository root to the path
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(BACKEND_DIR)
+sys.path.append(os.path.dirname(BACKEND_DIR))
+
+import sophos_siem_events
+from app.http_client import create_session
+
+def make_event(index):
+    """A SIEM event shaped like the Sophos payload."""
+    return {
+        "id": str(uuid.uuid4()),
+        "customer_id": "7b6f33dc-7e03-4d71-9729-689e43882c47",
+        "severity": ["low", "medium", "high"][index % 3],
+        "created_at": f"2025-07-0{1 + index % 7}T04:{index % 60:02d}:13.798Z",
+        "source_info": {"ip": f"10.0.{index % 256}.{index % 200}"},
+        "endpoint_id": str(uuid.UUID(int=index % 705)),
+        "endpoint_type": "computer",
+        "user_id": f"user-{index % 50}",
+        "when": f"2025-07-0{1 + index % 7}T04:{index % 60:02d}:13.000Z",
+        "source": f"LCC-{index % 705}\\Some User",
+        "type": "Event::Endpoint::Threat::CleanedUp",
+        "name": "Threat 'EICAR-AV-Test' has been cleaned up at C:\\Users\\Public\\Downloads\\eicar.com",
+        "location": f"LCC-{index % 705}",
+        "group": "MALWARE",
+    }
+
+def make_handler(total_events, page_size):
+    """Serve total_events events in pages, chained by next_cursor."""
+
+    class StandInHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        disable_nagle_algorithm = True
+
+        def do_GET(self):
+            query = parse_qs(urlparse(self.path).query)
+            start = int(query.get("cursor", ["0"])[0])
+            end = min(total_events, start + page_size)
+            body = json.dumps({
+                "has_more": end < total_events,
+                "next_cursor": str(end),
+                "items": [make_event(i) for i in range(start, end)],
+            }).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    return StandInHandler
+
+class LocalTokenManager:
+    """Sends requests to the stand-in server without an OAuth token."""
+
+    def __init__(self):
+        self.session = create_session()
+
+    def request(self, method, url, rate_limiter=None, **kwargs):
+        return self.session.request(method, url, **kwargs)
+
+def legacy_export(token_manager, api_host):
+    """Accumulate every event, then dump the list, as the CLI used to."""
+    url = api_host + "/siem/v1/events"
+    params = {}
+    all_events = []
+    while True:
+        data = token_manager.request("GET", url, params=params).json()
+        all_events.extend(data.get("items", []))
+        if not data.get("has_more"):
+            break
+        params["cursor"] = data["next_cursor"]
+
+    os.makedirs("data", exist_ok=True)
+    with open(os.path.join("data", "legacy.json"), "w") as f:
+        json.dump(all_events, f, indent=2)
+    return len(all_events)
+
+def streaming_export(token_manager, api_host):
+    _, count = sophos_siem_events.export_events_to_json(
+        sophos_siem_events.iter_siem_events(token_manager, "bench", api_host=api_host),
+        filename="streaming.json"
+    )
+    return count
+
+def peak_mb(export, token_manager, api_host):
+    """Run an export and return (events, peak traced heap in MB)."""
+    tracemalloc.start()
+    try:
+        count = export(token_manager, api_host)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return count, peak / (1024 * 1024)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", default="5000,20000,50000", help="comma-separated event counts")
+    parser.add_argument("--page-size", type=int, default=500)
+    args = parser.parse_args()
+
+    token_manager = LocalTokenManager()
+    os.chdir(tempfile.mkdtemp(prefix="sophos-bench-"))
+    print(f"📊 SIEM export memory benchmark (page size {args.page_size})")
+
+    for total_events in (int(size) for size in args.sizes.split(",")):
+        server = ThreadingHTTPServer(("127.0.0.1", 0), make_handler(total_events, args.page_size))
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        api_host = f"http://127.0.0.1:{server.server_address[1]}"
+
+        # Silence the CLI's per-page progress lines
+        with open(os.devnull, "w") as devnull:
+            stdout, sys.stdout = sys.stdout, devnull
+            try:
+                legacy = peak_mb(legacy_export, token_manager, api_host)
+                streaming = peak_mb(streaming_export, token_manager, api_host)
+            finally:
+                sys.stdout = stdout
+
+        print(f"   {total_events:>7} events   legacy peak {legacy[1]:8.1f} MB   "
+              f"streaming peak {streaming[1]:6.1f} MB")
+        server.shutdown()
+
+if __name__ == "__main__":
+    main()
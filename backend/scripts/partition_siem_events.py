@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Convert siem_events to a monthly range-partitioned table
+
+Databases created before partitioning have siem_events as a plain table.
+This renames it to siem_events_unpartitioned, creates the partitioned table
+with a partition for every month that has events, copies the events over
+one month per transaction (raw payloads into siem_event_payloads), and drops
+the old table unless --keep-old is given. Rerunning after an interruption
+resumes the copy.
+"""
+
+import argparse
+import os
+import sys
+from dotenv import load_dotenv
+
+# Add the parent directory to the path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+load_dotenv()
+
+from sqlalchemy import text
+from app.database import engine, create_tables, SIEMEvent
+from app import partitions
+
+OLD_TABLE = "siem_events_unpartitioned"
+# created_at is the partition key and may not be null
+PARTITION_KEY = 'coalesce(created_at, "when", fetched_at, now())'
+
+def relkind(conn, table):
+    return conn.execute(text("SELECT relkind FROM pg_class WHERE oid = to_regclass(:table)"), {"table": table}).scalar()
+
+def rename_old_table(conn):
+    """Move the plain table, its indexes and id sequence out of the way."""
+    indexes = conn.execute(
+        text("SELECT indexname FROM pg_indexes WHERE tablename = 'siem_events'")
+    ).scalars().all()
+    sequence = conn.execute(text("SELECT pg_get_serial_sequence('siem_events', 'id')")).scalar()
+
+    conn.execute(text(f"ALTER TABLE siem_events RENAME TO {OLD_TABLE}"))
+    for index in indexes:
+        conn.execute(text(f'ALTER INDEX "{index}" RENAME TO "{index}_unpartitioned"'))
+    if sequence:
+        conn.execute(text(f"ALTER SEQUENCE {sequence} RENAME TO siem_events_id_seq_unpartitioned"))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--keep-old", action="store_true", help=f"keep {OLD_TABLE} after copying")
+    args = parser.parse_args()
+
+    if engine.dialect.name != "postgresql":
+        print("❌ Partitioning needs PostgreSQL")
+        sys.exit(1)
+
+    with engine.begin() as conn:
+        kind = relkind(conn, "siem_events")
+        has_old = relkind(conn, OLD_TABLE) is not None
+        if kind == "p" and not has_old:
+            print("✅ siem_events is already partitioned")
+            return
+        if kind == "r":
+            print(f"🔧 Renaming siem_events to {OLD_TABLE}...")
+            rename_old_table(conn)
+
+    # Creates the partitioned siem_events and its indexes
+    create_tables()
+    partitions._partitioned.clear()
+
+    with engine.connect() as conn:
+        months = conn.execute(text(
+            f"SELECT DISTINCT date_trunc('month', {PARTITION_KEY}) FROM {OLD_TABLE} ORDER BY 1"
+        )).scalars().all()
+    partitions.ensure_partitions(months)
+    partitions.maintain_partitions()
+
+    # raw_data moves to siem_event_payloads
+    event_columns = [column.name for column in SIEMEvent.__table__.columns if column.name != "raw_data"]
+    columns = ", ".join(f'"{column}"' for column in event_columns)
+    values = ", ".join(PARTITION_KEY if column == "created_at" else f'"{column}"' for column in event_columns)
+
+    copied = 0
+    for month in months:
+        bounds = {"start": month, "end": partitions.add_months(partitions.month_start(month), 1)}
+        with engine.begin() as conn:
+            result = conn.execute(text(
+                f"INSERT INTO siem_events ({columns}) SELECT {values} FROM {OLD_TABLE} "
+                f"WHERE {PARTITION_KEY} >= :start AND {PARTITION_KEY} < :end "
+                f"ON CONFLICT DO NOTHING"
+            ), bounds)
+            conn.execute(text(
+                f"INSERT INTO siem_event_payloads (event_id, created_at, raw_data) "
+                f"SELECT event_id, {PARTITION_KEY}, raw_data::jsonb FROM {OLD_TABLE} "
+                f"WHERE raw_data IS NOT NULL AND event_id IS NOT NULL "
+                f"AND {PARTITION_KEY} >= :start AND {PARTITION_KEY} < :end "
+                f"ON CONFLICT DO NOTHING"
+            ), bounds)
+        copied += result.rowcount
+        print(f"   {month:%Y-%m}: {result.rowcount} events copied")
+
+    with engine.begin() as conn:
+        # Continue ids after the copied rows
+        conn.execute(text(
+            "SELECT setval(pg_get_serial_sequence('siem_events', 'id'), "
+            "coalesce((SELECT max(id) FROM siem_events), 0) + 1, false)"
+        ))
+        if not args.keep_old:
+            conn.execute(text(f"DROP TABLE {OLD_TABLE}"))
+
+    print(f"✅ siem_events partitioned by month, {copied} events copied")
+    if args.keep_old:
+        print(f"   {OLD_TABLE} kept; drop it once you have checked the copy")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,33 @@
+#!/usr/bin/env python3
+"""
+Rebuild the hourly SIEM event rollups behind /data/stats
+
+The ingestion writer keeps siem_event_rollups up to date as events arrive.
+Run this once after upgrading to fill in events stored before rollups
+existed, or whenever the rollups need recomputing from siem_events.
+"""
+
+import os
+import sys
+from dotenv import load_dotenv
+
+# Add the parent directory to the path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+load_dotenv()
+
+from app.database import SessionLocal, create_tables
+from app.rollups import rebuild_rollups
+
+def main():
+    create_tables()
+    db = SessionLocal()
+    try:
+        print("🔧 Rebuilding SIEM event rollups...")
+        rows = rebuild_rollups(db)
+        print(f"✅ {rows} rollup rows written")
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+import threading
+import time
+from app import auth
+from app.auth import TokenManager
+
+class FakeResponse:
+    def __init__(self, status_code=200, data=None):
+        self.status_code = status_code
+        self.headers = {}
+        self._data = data or {}
+        self.closed = False
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise RuntimeError(f"HTTP {self.status_code}")
+
+    def json(self):
+        return self._data
+
+    def close(self):
+        self.closed = True
+
+class FakeSession:
+    """Issues tokens tok-1, tok-2, ... and answers API requests from ``responses``."""
+
+    def __init__(self, expires_in=3600, responses=()):
+        self.expires_in = expires_in
+        self.responses = list(responses)
+        self.token_requests = 0
+        self.sent_tokens = []
+        self.lock = threading.Lock()
+
+    def post(self, url, **kwargs):
+        with self.lock:
+            self.token_requests += 1
+            number = self.token_requests
+        # Long enough for concurrent callers to pile up behind the refresh
+        time.sleep(0.05)
+        return FakeResponse(data={"access_token": f"tok-{number}", "expires_in": self.expires_in})
+
+    def request(self, method, url, headers=None, **kwargs):
+        self.sent_tokens.append(headers["Authorization"])
+        return self.responses.pop(0)
+
+def test_token_is_cached_until_close_to_expiry(monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr(auth.time, "monotonic", lambda: clock[0])
+    session = FakeSession(expires_in=600)
+    tokens = TokenManager("id", "secret", session=session, refresh_margin=60)
+
+    assert tokens.get_token() == "tok-1"
+    clock[0] += 500
+    assert tokens.get_token() == "tok-1"
+    # Inside the refresh margin
+    clock[0] += 50
+    assert tokens.get_token() == "tok-2"
+    assert session.token_requests == 2
+
+def test_concurrent_callers_share_one_refresh():
+    session = FakeSession()
+    tokens = TokenManager("id", "secret", session=session)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(tokens.get_token())) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert results == ["tok-1"] * 8
+    assert session.token_requests == 1
+
+def test_401_refreshes_and_retries_once():
+    session = FakeSession(responses=[FakeResponse(401), FakeResponse(200)])
+    tokens = TokenManager("id", "secret", session=session)
+
+    response = tokens.request("GET", "https://api.example/endpoints")
+
+    assert response.status_code == 200
+    assert session.sent_tokens == ["Bearer tok-1", "Bearer tok-2"]
+    assert session.token_requests == 2
+
+def test_second_401_is_returned_to_the_caller():
+    session = FakeSession(responses=[FakeResponse(401), FakeResponse(401)])
+    tokens = TokenManager("id", "secret", session=session)
+
+    assert tokens.request("GET", "https://api.example/endpoints").status_code == 401
+    assert session.token_requests == 2
+
+def test_stale_401_does_not_drop_a_newer_token():
+    session = FakeSession()
+    tokens = TokenManager("id", "secret", session=session)
+    tokens.get_token()
+    tokens.invalidate("tok-1")
+    assert tokens.get_token() == "tok-2"
+
+    # A late 401 for the old token leaves tok-2 in place
+    tokens.invalidate("tok-1")
+    assert tokens.get_token() == "tok-2"
+    assert session.token_requests == 2
@@ -0,0 +1,42 @@
+import asyncio
+from app.broadcast import EventBroadcaster
+
+def event(n, severity="high"):
+    return {"event_id": f"e{n}", "severity": severity}
+
+def run(coro):
+    return asyncio.run(coro)
+
+def test_resume_after_last_event_id():
+    async def scenario():
+        broadcaster = EventBroadcaster(buffer_size=10, replay_size=10)
+        broadcaster.publish([event(1), event(2), event(3)])
+        subscriber, complete = broadcaster.subscribe({}, f"{broadcaster.epoch}-1")
+        items, dropped = subscriber.drain()
+        return complete, [item[1]["event_id"] for item in items], dropped
+    complete, ids, dropped = run(scenario())
+    assert complete
+    assert ids == ["e2", "e3"]
+    assert dropped == 0
+
+def test_resume_outside_replay_buffer_is_incomplete():
+    async def scenario():
+        broadcaster = EventBroadcaster(buffer_size=10, replay_size=2)
+        broadcaster.publish([event(n) for n in range(1, 6)])
+        results = [broadcaster.subscribe({}, f"{broadcaster.epoch}-1")[1],
+                   broadcaster.subscribe({}, "otherepoch-4")[1],
+                   broadcaster.subscribe({}, f"{broadcaster.epoch}-3")[1]]
+        return results
+    assert run(scenario()) == [False, False, True]
+
+def test_slow_subscriber_drops_oldest():
+    async def scenario():
+        broadcaster = EventBroadcaster(buffer_size=3, replay_size=10)
+        subscriber, _ = broadcaster.subscribe({"severity": "high"})
+        broadcaster.publish([event(n) for n in range(1, 6)] + [event(6, "low")])
+        items, dropped = subscriber.drain()
+        return [item[1]["event_id"] for item in items], dropped, subscriber.drain()
+    ids, dropped, after = run(scenario())
+    assert ids == ["e3", "e4", "e5"]
+    assert dropped == 2
+    assert after == ([], 0)
@@ -0,0 +1,50 @@
+from collections import OrderedDict
+from unittest import mock
+import pytest
+from app import counts
+from app.counts import count_rows, EXACT_COUNT_THRESHOLD
+
+@pytest.fixture(autouse=True)
+def version(monkeypatch):
+    """Dataset versions the tests bump, with an empty count cache."""
+    versions = {"events": "1"}
+    monkeypatch.setattr(counts, "dataset_version", versions.get)
+    monkeypatch.setattr(counts, "_cache", OrderedDict())
+    return versions
+
+def query(rows):
+    query = mock.MagicMock()
+    query.order_by.return_value.count.return_value = rows
+    return query
+
+def test_large_estimate_is_returned_without_counting(monkeypatch):
+    monkeypatch.setattr(counts, "planner_estimate", lambda query: EXACT_COUNT_THRESHOLD * 10)
+    q = query(123)
+    assert count_rows(q, "events", {}, "estimated") == (EXACT_COUNT_THRESHOLD * 10, "estimated")
+    q.order_by.return_value.count.assert_not_called()
+
+def test_small_estimate_is_counted_exactly_and_cached(monkeypatch):
+    monkeypatch.setattr(counts, "planner_estimate", lambda query: 40)
+    assert count_rows(query(42), "events", {"severity": "high"}, "estimated") == (42, "exact")
+
+    # Served from the cache in either mode until the data changes
+    cached = query(0)
+    assert count_rows(cached, "events", {"severity": "high"}, "estimated") == (42, "exact")
+    assert count_rows(cached, "events", {"severity": "high"}, "exact") == (42, "exact")
+    cached.order_by.return_value.count.assert_not_called()
+
+def test_fallback_count_is_cached(monkeypatch):
+    # No planner estimate (not Postgres)
+    monkeypatch.setattr(counts, "planner_estimate", lambda query: None)
+    assert count_rows(query(7), "events", {}, "estimated") == (7, "exact")
+    assert count_rows(query(0), "events", {}, "estimated") == (7, "exact")
+
+def test_new_version_invalidates_cached_counts(version):
+    assert count_rows(query(7), "events", {}, "exact") == (7, "exact")
+    version["events"] = "2"
+    assert count_rows(query(8), "events", {}, "exact") == (8, "exact")
+
+def test_no_count():
+    q = query(7)
+    assert count_rows(q, "events", {}, "none") == (None, "none")
+    q.order_by.assert_not_called()
@@ -0,0 +1,104 @@
+import contextlib
+import csv
+import gzip
+import io
+import json
+from datetime import datetime
+import pytest
+from sqlalchemy import create_engine, MetaData
+from sqlalchemy.orm import sessionmaker
+from app import export
+from app.database import Endpoint, SIEMEvent
+from app.export import stream_export, events_export_query, endpoints_export_query
+
+@pytest.fixture
+def db(monkeypatch):
+    # The exported columns are portable, so SQLite stands in for Postgres
+    engine = create_engine("sqlite://")
+    Endpoint.__table__.create(engine)
+    # SQLite can't autoincrement part of the (id, created_at) key; tests give ids
+    events = SIEMEvent.__table__.to_metadata(MetaData())
+    events.c.id.autoincrement = False
+    events.create(engine)
+    session = sessionmaker(bind=engine)()
+    monkeypatch.setattr(export, "session_scope", lambda: contextlib.nullcontext(session))
+    # One row per chunk, so framing across chunks is exercised
+    monkeypatch.setattr(export, "EXPORT_BATCH_SIZE", 1)
+    yield session
+    session.close()
+
+def add_event(db, n, created_at, **fields):
+    fields = {"severity": "high", "tenant_id": "t1", **fields}
+    db.add(SIEMEvent(id=n, event_id=f"ev-{n}", created_at=created_at, **fields))
+    db.commit()
+
+def add_endpoint(db, n, **fields):
+    fields = {"tenant_id": "t1", "online_status": True, **fields}
+    db.add(Endpoint(id=n, endpoint_id=f"ep-{n}", hostname=f"host-{n}", **fields))
+    db.commit()
+
+def exported(query, fmt="ndjson", compress=False):
+    data = b"".join(stream_export(query, fmt, compress))
+    return (gzip.decompress(data) if compress else data).decode()
+
+def test_ndjson_is_one_object_per_line_oldest_first(db):
+    add_event(db, 2, datetime(2024, 5, 1, 13), name='Threat "x"\nremoved')
+    add_event(db, 1, datetime(2024, 5, 1, 12))
+
+    text = exported(events_export_query())
+
+    assert text.endswith("\n")
+    lines = [json.loads(line) for line in text.splitlines()]
+    assert [line["event_id"] for line in lines] == ["ev-1", "ev-2"]
+    assert lines[0]["created_at"] == "2024-05-01T12:00:00"
+    assert lines[1]["name"] == 'Threat "x"\nremoved'
+    assert set(lines[0]) == {column.key for column in export.EVENT_EXPORT_COLUMNS}
+
+def test_csv_has_a_header_and_escapes_values(db):
+    add_endpoint(db, 1, group_name='Servers, "prod"\nEU', ip_addresses=["10.0.0.1", "10.0.0.2"])
+
+    rows = list(csv.reader(io.StringIO(exported(endpoints_export_query(), "csv"))))
+
+    assert rows[0] == [column.key for column in export.ENDPOINT_EXPORT_COLUMNS]
+    assert len(rows) == 2
+    row = dict(zip(rows[0], rows[1]))
+    assert row["group_name"] == 'Servers, "prod"\nEU'
+    assert json.loads(row["ip_addresses"]) == ["10.0.0.1", "10.0.0.2"]
+    assert row["deleted_at"] == ""
+
+def test_event_filters_are_applied(db):
+    add_event(db, 1, datetime(2024, 5, 1, 12))
+    add_event(db, 2, datetime(2024, 5, 1, 12, 30), severity="low")
+    add_event(db, 3, datetime(2024, 5, 1, 13), tenant_id="t2")
+    add_event(db, 4, datetime(2024, 5, 1, 14))
+    add_event(db, 5, datetime(2024, 5, 1, 11, 59), event_type="Event::Other")
+
+    query = events_export_query(datetime(2024, 5, 1, 12), datetime(2024, 5, 1, 14), "t1", "high")
+    assert [json.loads(line)["event_id"] for line in exported(query).splitlines()] == ["ev-1"]
+    query = events_export_query(event_type="Event::Other")
+    assert [json.loads(line)["event_id"] for line in exported(query).splitlines()] == ["ev-5"]
+
+def test_endpoint_filters_are_applied(db):
+    add_endpoint(db, 1)
+    add_endpoint(db, 2, deleted_at=datetime(2024, 5, 1))
+    add_endpoint(db, 3, online_status=False)
+    add_endpoint(db, 4, tenant_id="t2")
+
+    def ids(query):
+        return [json.loads(line)["endpoint_id"] for line in exported(query).splitlines()]
+
+    assert ids(endpoints_export_query()) == ["ep-1", "ep-3", "ep-4"]
+    assert ids(endpoints_export_query(tenant_id="t1", online_only=True)) == ["ep-1"]
+    assert ids(endpoints_export_query(include_deleted=True)) == ["ep-1", "ep-2", "ep-3", "ep-4"]
+
+def test_empty_export(db):
+    assert exported(events_export_query()) == ""
+    header = [column.key for column in export.EVENT_EXPORT_COLUMNS]
+    assert list(csv.reader(io.StringIO(exported(events_export_query(), "csv")))) == [header]
+    assert exported(events_export_query(), compress=True) == ""
+
+def test_gzip_export_decompresses_to_the_plain_one(db):
+    add_event(db, 1, datetime(2024, 5, 1, 12))
+    add_event(db, 2, datetime(2024, 5, 1, 13))
+
+    assert exported(events_export_query(), "csv", compress=True) == exported(events_export_query(), "csv")
@@ -0,0 +1,66 @@
+from datetime import datetime
+from unittest import mock
+import pytest
+from app.histogram import event_histogram
+
+def fake_db(*row_sets):
+    """Session whose queries return ``row_sets`` in order."""
+    query = mock.MagicMock()
+    query.filter.return_value = query
+    query.group_by.return_value = query
+    query.order_by.return_value = query
+    query.all.side_effect = [list(rows) for rows in row_sets]
+    db = mock.MagicMock()
+    db.query.return_value = query
+    return db
+
+def test_empty_buckets_are_zero_filled():
+    rows = [(datetime(2024, 5, 1, 1), 4), (datetime(2024, 5, 1, 3), 2)]
+    result = event_histogram(fake_db(rows), "hour", datetime(2024, 5, 1, 0, 30), datetime(2024, 5, 1, 5))
+
+    assert result["source"] == "rollups"
+    assert result["start"] == datetime(2024, 5, 1, 0)
+    assert [(entry["bucket"].hour, entry["count"]) for entry in result["buckets"]] == [
+        (0, 0), (1, 4), (2, 0), (3, 2), (4, 0)
+    ]
+    assert result["total"] == 6
+
+def bounds(query_filter):
+    """Datetimes a filter() call compares against."""
+    return [getattr(clause.right, "value", None) for clause in query_filter.args]
+
+def test_hour_end_falls_in_is_counted_from_events():
+    rollups = [(datetime(2024, 5, 1, 1), 4), (datetime(2024, 5, 1, 4), 2)]
+    events = [(datetime(2024, 5, 1, 5), 3)]
+    db = fake_db(rollups, events)
+    result = event_histogram(db, "hour", datetime(2024, 5, 1, 0, 30), datetime(2024, 5, 1, 5, 30))
+
+    assert [entry["count"] for entry in result["buckets"]] == [0, 4, 0, 0, 2, 3]
+    assert result["total"] == 9
+    rollup_filter, events_filter = db.query.return_value.filter.call_args_list
+    # Rollups stop at the last whole hour; events cover the rest up to end
+    assert bounds(rollup_filter)[-1] == datetime(2024, 5, 1, 5)
+    assert bounds(events_filter) == [datetime(2024, 5, 1, 5), datetime(2024, 5, 1, 5, 30)]
+
+def test_partial_last_day_adds_its_partial_hour_from_events():
+    rollups = [(datetime(2024, 5, 1), 10), (datetime(2024, 5, 2), 5)]
+    events = [(datetime(2024, 5, 2), "high", 1)]
+    db = fake_db([(bucket, "high", count) for bucket, count in rollups], events)
+    result = event_histogram(db, "day", datetime(2024, 5, 1), datetime(2024, 5, 2, 6, 15), group_by="severity")
+
+    assert [entry["groups"] for entry in result["buckets"]] == [{"high": 10}, {"high": 6}]
+    assert bounds(db.query.return_value.filter.call_args_list[0])[-1] == datetime(2024, 5, 2, 6)
+
+def test_grouped_buckets_are_zero_filled():
+    rows = [(datetime(2024, 5, 1, 0, 1), "high", 3), (datetime(2024, 5, 1, 0, 1), None, 1)]
+    result = event_histogram(
+        fake_db(rows), "minute", datetime(2024, 5, 1), datetime(2024, 5, 1, 0, 3), group_by="severity"
+    )
+
+    assert result["source"] == "events"
+    assert [entry["groups"] for entry in result["buckets"]] == [{}, {"high": 3, None: 1}, {}]
+    assert [entry["count"] for entry in result["buckets"]] == [0, 4, 0]
+
+def test_too_many_buckets_is_rejected():
+    with pytest.raises(ValueError, match="buckets"):
+        event_histogram(fake_db([]), "minute", datetime(2024, 1, 1), datetime(2024, 5, 1))
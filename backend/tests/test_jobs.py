@@ -0,0 +1,52 @@
+import threading
+import time
+import pytest
+from fastapi.testclient import TestClient
+from app import main
+from app.jobs import JobRegistry, JobAlreadyRunning
+
+def blocking_sync(release, progress=None):
+    while not release.wait(0.01):
+        progress.check_cancelled()
+    return {"success": True}
+
+@pytest.fixture
+def registry(monkeypatch):
+    registry = JobRegistry(max_workers=2)
+    monkeypatch.setattr(main, "job_registry", registry)
+    return registry
+
+def test_second_job_on_stream_is_rejected(registry):
+    release = threading.Event()
+    job = registry.submit("endpoints", blocking_sync, release)
+    with pytest.raises(JobAlreadyRunning) as excinfo:
+        registry.submit("endpoints", blocking_sync, release)
+    assert excinfo.value.job is job
+
+    release.set()
+    job.future.result(timeout=5)
+    assert job.status == "succeeded"
+    registry.submit("endpoints", blocking_sync, release).future.result(timeout=5)
+
+def test_duplicate_fetch_answers_409(registry, monkeypatch):
+    release = threading.Event()
+    monkeypatch.setattr(main.sophos_client, "backfill_siem_events",
+                        lambda progress=None, **kwargs: blocking_sync(release, progress))
+    client = TestClient(main.app)
+    try:
+        first = client.post("/backfill/events")
+        assert first.status_code == 202
+        second = client.post("/backfill/events")
+        assert second.status_code == 409
+        assert second.json()["detail"]["job"]["id"] == first.json()["job"]["id"]
+    finally:
+        release.set()
+
+def test_cancel_running_job(registry):
+    job = registry.submit("siem_events", blocking_sync, threading.Event())
+    while job.status == "queued":
+        time.sleep(0.01)
+    assert registry.cancel(job.id).status == "cancelling"
+    job.future.result(timeout=5)
+    assert job.status == "cancelled"
+    assert registry.cancel(job.id).status == "cancelled"
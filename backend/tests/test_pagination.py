@@ -0,0 +1,84 @@
+from datetime import datetime
+from types import SimpleNamespace
+import pytest
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.orm import Query
+from app.database import SIEMEvent
+from app.pagination import encode_cursor, decode_cursor, keyset_page
+
+EVENT_PARSERS = (datetime.fromisoformat, int)
+
+def test_cursor_round_trip():
+    key = (datetime(2024, 5, 1, 12, 30, 15, 250000), 42)
+    cursor = encode_cursor(key)
+    assert "=" not in cursor
+    assert decode_cursor(cursor, EVENT_PARSERS) == list(key)
+
+@pytest.mark.parametrize("cursor", [
+    "not base64!",
+    encode_cursor([1, 2, 3]),
+    encode_cursor({"created_at": "2024-05-01"}),
+    encode_cursor(["yesterday", 42]),
+    encode_cursor(["2024-05-01T12:00:00", "forty-two"]),
+])
+def test_bad_cursor_is_rejected(cursor):
+    with pytest.raises(ValueError, match="Invalid cursor"):
+        decode_cursor(cursor, EVENT_PARSERS)
+
+class FakeQuery:
+    """Builds a real query but answers all() with ``rows``, keeping the SQL it would have run."""
+
+    def __init__(self, rows, query=None):
+        self.rows = rows
+        self.query = query if query is not None else Query(SIEMEvent)
+        self.sql = None
+
+    def __getattr__(self, name):
+        def build(*args):
+            self.query = getattr(self.query, name)(*args)
+            return self
+        return build
+
+    def all(self):
+        self.sql = str(self.query.statement.compile(dialect=postgresql.dialect()))
+        return self.rows
+
+def events(*ids):
+    return [SimpleNamespace(created_at=datetime(2024, 5, 1, 12), id=n) for n in ids]
+
+def page(query, cursor=None, limit=2, **options):
+    return keyset_page(
+        query, (SIEMEvent.created_at, SIEMEvent.id), lambda ev: (ev.created_at, ev.id),
+        EVENT_PARSERS, cursor, limit, **options
+    )
+
+def test_page_seeks_past_the_cursor_in_key_order():
+    query = FakeQuery(events(3, 4))
+    rows, next_cursor = page(query, encode_cursor((datetime(2024, 5, 1, 12), 2)), skip=10)
+
+    assert [row.id for row in rows] == [3, 4]
+    assert next_cursor is None
+    assert "WHERE (siem_events.created_at, siem_events.id) > (%(param_1)s, %(param_2)s)" in query.sql
+    assert query.sql.endswith(
+        "ORDER BY siem_events.created_at ASC, siem_events.id ASC \n LIMIT %(param_3)s"
+    )
+    # The cursor replaces the offset
+    assert "OFFSET" not in query.sql
+
+def test_descending_page_seeks_backwards():
+    query = FakeQuery(events(9, 8, 7))
+    rows, next_cursor = page(query, encode_cursor((datetime(2024, 5, 1, 12), 10)), descending=True)
+
+    assert "(siem_events.created_at, siem_events.id) < (%(param_1)s, %(param_2)s)" in query.sql
+    assert "ORDER BY siem_events.created_at DESC, siem_events.id DESC" in query.sql
+    # One row past the limit tells there is a next page, which starts after the last row returned
+    assert [row.id for row in rows] == [9, 8]
+    assert decode_cursor(next_cursor, EVENT_PARSERS) == [datetime(2024, 5, 1, 12), 8]
+
+def test_first_page_honours_skip_without_a_cursor():
+    query = FakeQuery(events())
+    assert page(query, skip=10) == ([], None)
+    assert "WHERE" not in query.sql
+    assert query.sql.endswith("LIMIT %(param_1)s OFFSET %(param_2)s")
+    params = query.query.statement.compile(dialect=postgresql.dialect()).params
+    assert (params["param_1"], params["param_2"]) == (3, 10)
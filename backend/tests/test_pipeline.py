@@ -0,0 +1,79 @@
+import itertools
+import threading
+import time
+import pytest
+from app.pipeline import run_pipeline
+
+def fetchers():
+    return [thread for thread in threading.enumerate() if thread.name == "page-fetcher"]
+
+def wait_until(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+def test_pages_are_stored_in_order():
+    stored = []
+    assert run_pipeline(iter([1, 2, 3]), stored.append) == 3
+    assert stored == [1, 2, 3]
+
+def test_fetch_error_reaches_the_caller_after_earlier_pages():
+    def pages():
+        yield 1
+        raise RuntimeError("Sophos API returned 500")
+
+    stored = []
+    with pytest.raises(RuntimeError, match="500"):
+        run_pipeline(pages(), stored.append)
+    assert stored == [1]
+
+def test_store_error_stops_the_fetcher():
+    def store_page(page):
+        raise ValueError("bad page")
+
+    with pytest.raises(ValueError):
+        run_pipeline(itertools.count(), store_page)
+    wait_until(lambda: not fetchers())
+
+def test_fetcher_blocks_while_the_queue_is_full():
+    produced = []
+    release = threading.Event()
+
+    def pages():
+        for n in range(20):
+            produced.append(n)
+            yield n
+
+    def store_page(page):
+        release.wait(2)
+
+    worker = threading.Thread(target=run_pipeline, args=(pages(), store_page, 2))
+    worker.start()
+    # One page being stored, two queued and one waiting to be queued
+    wait_until(lambda: len(produced) == 4)
+    time.sleep(0.1)
+    assert len(produced) == 4
+    release.set()
+    worker.join(5)
+    assert len(produced) == 20
+
+def test_store_returning_false_stops_early():
+    fetched = []
+
+    def pages():
+        for n in itertools.count():
+            fetched.append(n)
+            yield n
+
+    stored = []
+
+    def store_page(page):
+        stored.append(page)
+        return page < 2
+
+    assert run_pipeline(pages(), store_page, max_pending=1) == 3
+    assert stored == [0, 1, 2]
+    wait_until(lambda: not fetchers())
+    # Only the pages already queued were fetched past the stop
+    assert len(fetched) <= len(stored) + 2
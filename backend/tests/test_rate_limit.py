@@ -0,0 +1,51 @@
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+from app import rate_limit
+from app.rate_limit import RateLimiter, retry_delay, send_with_retry, BACKOFF_BASE, BACKOFF_MAX
+
+class FakeResponse:
+    def __init__(self, status_code, headers=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+def test_retry_delay_honors_retry_after_seconds():
+    delay = retry_delay({"Retry-After": "7"}, 0)
+    assert 7 <= delay <= 7 + BACKOFF_BASE
+
+def test_retry_delay_honors_retry_after_date():
+    when = datetime.now(timezone.utc) + timedelta(seconds=30)
+    delay = retry_delay({"Retry-After": format_datetime(when, usegmt=True)}, 0)
+    assert 28 <= delay <= 30 + BACKOFF_BASE
+
+def test_retry_delay_caps_retry_after():
+    assert retry_delay({"Retry-After": "3600"}, 0) <= BACKOFF_MAX + BACKOFF_BASE
+
+def test_retry_delay_backs_off_without_retry_after():
+    for attempt in range(10):
+        delay = retry_delay({"Retry-After": "soon"}, attempt)
+        assert 0 <= delay <= min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt)
+
+def test_rate_limiter_pauses_for_retry_after(monkeypatch):
+    sleeps = []
+    monkeypatch.setattr(rate_limit.time, "sleep", sleeps.append)
+    limiter = RateLimiter(max_rate=10, burst=10)
+    throttled = FakeResponse(429, {"Retry-After": "2"})
+    responses = iter([throttled, FakeResponse(200)])
+
+    response = send_with_retry(lambda: next(responses), limiter)
+
+    assert response.status_code == 200
+    assert throttled.closed
+    assert limiter.throttled == 1
+    # The whole bucket waited out Retry-After before the retry
+    assert len(sleeps) == 1 and 2 <= sleeps[0] <= 2 + BACKOFF_BASE
+    assert limiter.rate < limiter.max_rate
+
+def test_send_with_retry_returns_last_failure(monkeypatch):
+    monkeypatch.setattr(rate_limit.time, "sleep", lambda delay: None)
+    response = send_with_retry(lambda: FakeResponse(503), None, max_retries=2)
+    assert response.status_code == 503
@@ -0,0 +1,110 @@
+import pytest
+from fastapi import FastAPI
+from fastapi.responses import JSONResponse
+from fastapi.testclient import TestClient
+from app import response_cache, versions
+from app.response_cache import response_cache_middleware, MemoryStore
+from app.versions import bump_version, EVENTS, ENDPOINTS
+
+@pytest.fixture
+def api(monkeypatch):
+    """App with the cache middleware in front of stand-in read routes; counts handler calls."""
+    monkeypatch.setattr(versions, "REDIS_URL", None)
+    monkeypatch.setattr(response_cache, "_store", MemoryStore())
+    calls = []
+    app = FastAPI()
+    app.middleware("http")(response_cache_middleware)
+
+    @app.api_route("/data/endpoints", methods=["GET", "POST"])
+    def endpoints(page: int = 1):
+        calls.append("endpoints")
+        return {"page": page, "items": [f"ep-{len(calls)}"]}
+
+    @app.get("/data/stats")
+    def stats():
+        calls.append("stats")
+        return JSONResponse({"detail": "database unavailable"}, status_code=500)
+
+    @app.get("/data/events/histogram")
+    def histogram(start: str = None, end: str = None):
+        calls.append("histogram")
+        return {"buckets": []}
+
+    client = TestClient(app)
+    client.calls = calls
+    return client
+
+def test_second_get_is_served_from_the_cache(api):
+    first = api.get("/data/endpoints")
+    second = api.get("/data/endpoints")
+
+    assert (first.headers["X-Cache"], second.headers["X-Cache"]) == ("MISS", "HIT")
+    assert second.json() == first.json()
+    assert second.headers["ETag"] == first.headers["ETag"]
+    assert api.calls == ["endpoints"]
+
+def test_query_params_are_part_of_the_key(api):
+    api.get("/data/endpoints?page=1")
+    response = api.get("/data/endpoints?page=2")
+
+    assert response.headers["X-Cache"] == "MISS"
+    assert response.json()["page"] == 2
+
+def test_matching_if_none_match_is_answered_with_304(api):
+    etag = api.get("/data/endpoints").headers["ETag"]
+    response = api.get("/data/endpoints", headers={"If-None-Match": etag})
+
+    assert response.status_code == 304
+    assert response.content == b""
+    assert response.headers["ETag"] == etag
+    assert api.calls == ["endpoints"]
+
+def test_version_bump_invalidates_the_cached_response(api):
+    first = api.get("/data/endpoints")
+    bump_version(EVENTS)
+    assert api.get("/data/endpoints").headers["X-Cache"] == "HIT"
+
+    bump_version(ENDPOINTS)
+    response = api.get("/data/endpoints", headers={"If-None-Match": first.headers["ETag"]})
+
+    assert response.status_code == 200
+    assert response.headers["X-Cache"] == "MISS"
+    assert response.headers["ETag"] != first.headers["ETag"]
+    assert response.json() != first.json()
+
+def test_non_get_requests_are_not_cached(api):
+    api.post("/data/endpoints")
+    response = api.post("/data/endpoints")
+
+    assert "ETag" not in response.headers
+    assert api.calls == ["endpoints", "endpoints"]
+
+def test_error_responses_are_not_cached(api):
+    assert api.get("/data/stats").status_code == 500
+    response = api.get("/data/stats")
+
+    assert response.status_code == 500
+    assert "X-Cache" not in response.headers
+    assert api.calls == ["stats", "stats"]
+
+def test_histogram_is_only_cached_for_a_fixed_window(api):
+    api.get("/data/events/histogram")
+    assert "ETag" not in api.get("/data/events/histogram").headers
+
+    window = "/data/events/histogram?start=2024-05-01T00:00:00&end=2024-05-02T00:00:00"
+    api.get(window)
+    assert api.get(window).headers["X-Cache"] == "HIT"
+    assert api.calls == ["histogram"] * 3
+
+def test_memory_store_evicts_least_recently_used_and_expired(monkeypatch):
+    clock = [100.0]
+    monkeypatch.setattr(response_cache.time, "monotonic", lambda: clock[0])
+    store = MemoryStore(max_size=2, ttl=60)
+    store.set("a", b"1")
+    store.set("b", b"2")
+    store.get("a")
+    store.set("c", b"3")
+
+    assert (store.get("a"), store.get("b"), store.get("c")) == (b"1", None, b"3")
+    clock[0] += 61
+    assert store.get("a") is None
@@ -0,0 +1,51 @@
+from datetime import datetime
+from unittest import mock
+from sqlalchemy.dialects import postgresql
+from app.rollups import rollup_rows, add_to_rollups
+
+def test_rollup_rows_count_each_dimension_per_hour():
+    rows = [
+        {"created_at": datetime(2024, 5, 1, 12, 5), "tenant_id": "t1", "severity": "high",
+         "event_type": "Malware", "endpoint_id": "ep-1", "group": "MALWARE"},
+        {"created_at": datetime(2024, 5, 1, 12, 55), "tenant_id": "t1", "severity": "high",
+         "event_type": "Web", "endpoint_id": None, "group": "WEB"},
+        {"created_at": datetime(2024, 5, 1, 13, 0), "tenant_id": None, "severity": "low",
+         "event_type": "Web", "endpoint_id": "ep-1", "group": "WEB"},
+    ]
+    counts = {
+        (row["dimension"], row["bucket"].hour, row["tenant_id"], row["value"]): row["count"]
+        for row in rollup_rows(rows)
+    }
+
+    assert counts[("severity", 12, "t1", "high")] == 2
+    assert counts[("type", 12, "t1", "Malware")] == 1
+    assert counts[("endpoint", 12, "t1", "")] == 1
+    assert counts[("severity", 13, "", "low")] == 1
+    # Every event is counted once per dimension
+    assert sum(count for key, count in counts.items() if key[0] == "group") == 3
+
+def test_rollup_rows_are_sorted_by_key():
+    rows = [
+        {"created_at": datetime(2024, 5, 1, hour), "tenant_id": "t1", "severity": severity}
+        for hour, severity in ((13, "low"), (12, "high"), (12, "critical"))
+    ]
+    keys = [(row["dimension"], row["bucket"], row["tenant_id"], row["value"]) for row in rollup_rows(rows)]
+    assert keys == sorted(keys)
+    assert rollup_rows([]) == []
+
+def test_rollups_are_incremented_in_one_upsert():
+    db = mock.MagicMock()
+    add_to_rollups(db, [{"created_at": datetime(2024, 5, 1, 12, 5), "tenant_id": "t1", "severity": "high"}])
+
+    sql = str(db.execute.call_args.args[0].compile(dialect=postgresql.dialect()))
+    assert db.execute.call_count == 1
+    assert sql.startswith("INSERT INTO siem_event_rollups (dimension, bucket, tenant_id, value, count)")
+    assert sql.endswith(
+        "ON CONFLICT (dimension, bucket, tenant_id, value) "
+        "DO UPDATE SET count = (siem_event_rollups.count + excluded.count)"
+    )
+
+def test_no_new_events_touch_no_rollups():
+    db = mock.MagicMock()
+    add_to_rollups(db, [])
+    db.execute.assert_not_called()
@@ -0,0 +1,293 @@
+import contextlib
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+from unittest import mock
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from app.database import SyncState
+from app.sync_state import (
+    get_sync_state, save_sync_state, reset_sync_state, migrate_sync_state,
+    siem_stream, endpoint_stream, backfill_stream, SIEM_STREAM
+)
+from app import sophos_client
+from app.sophos_client import SophosClient, SIEM_MAX_LOOKBACK, ENDPOINT_WATERMARK_OVERLAP, ENDPOINT_OFFLINE_AFTER
+
+@pytest.fixture
+def db():
+    # sync_state only uses portable column types, so SQLite stands in for Postgres
+    engine = create_engine("sqlite://")
+    SyncState.__table__.create(engine)
+    session = sessionmaker(bind=engine)()
+    yield session
+    session.close()
+
+def test_first_sync_has_no_state(db):
+    assert get_sync_state(db, SIEM_STREAM) is None
+
+def test_cursor_is_replaced_and_high_water_only_advances(db):
+    save_sync_state(db, SIEM_STREAM, "c1", datetime(2024, 5, 1, 12))
+    save_sync_state(db, SIEM_STREAM, "c2", datetime(2024, 5, 1, 11))
+
+    state = get_sync_state(db, SIEM_STREAM)
+    assert state.cursor == "c2"
+    assert state.high_water == datetime(2024, 5, 1, 12)
+
+def test_high_water_is_stored_as_naive_utc(db):
+    save_sync_state(db, SIEM_STREAM, None, datetime(2024, 5, 1, 14, tzinfo=timezone(timedelta(hours=2))))
+    assert get_sync_state(db, SIEM_STREAM).high_water == datetime(2024, 5, 1, 12)
+
+def test_page_without_timestamps_keeps_high_water(db):
+    save_sync_state(db, SIEM_STREAM, "c1", datetime(2024, 5, 1, 12))
+    save_sync_state(db, SIEM_STREAM, "c2")
+    assert get_sync_state(db, SIEM_STREAM).high_water == datetime(2024, 5, 1, 12)
+
+def test_reset_keeps_high_water_to_resume_from(db):
+    save_sync_state(db, SIEM_STREAM, "c1", datetime(2024, 5, 1, 12))
+    assert reset_sync_state(db, SIEM_STREAM)
+
+    state = get_sync_state(db, SIEM_STREAM)
+    assert state.cursor is None
+    assert state.high_water == datetime(2024, 5, 1, 12)
+
+def test_forget_deletes_the_stream(db):
+    save_sync_state(db, SIEM_STREAM, "c1", datetime(2024, 5, 1, 12))
+    assert reset_sync_state(db, SIEM_STREAM, forget=True)
+    assert get_sync_state(db, SIEM_STREAM) is None
+
+def test_reset_of_unknown_stream_reports_nothing_changed(db):
+    assert not reset_sync_state(db, "nope")
+
+def test_legacy_cursor_moves_to_the_tenant_stream(db):
+    save_sync_state(db, SIEM_STREAM, "c1", datetime(2024, 5, 1, 12))
+    state = migrate_sync_state(db, SIEM_STREAM, siem_stream("t1"))
+
+    assert (state.stream, state.cursor, state.high_water) == ("siem_events:t1", "c1", datetime(2024, 5, 1, 12))
+    assert get_sync_state(db, SIEM_STREAM) is None
+    # A reset of the tenant's stream no longer has an old cursor to fall back to
+    reset_sync_state(db, siem_stream("t1"))
+    assert migrate_sync_state(db, SIEM_STREAM, siem_stream("t1")) is None
+
+def page_response(status_code, data=None):
+    return mock.MagicMock(status_code=status_code, raw=None, **{"json.return_value": data})
+
+def test_rejected_saved_cursor_resumes_from_clamped_high_water(db, monkeypatch):
+    stream = siem_stream("t1")
+    save_sync_state(db, stream, "expired", datetime.utcnow() - 2 * SIEM_MAX_LOOKBACK)
+    requests = []
+    responses = [
+        page_response(400),
+        page_response(200, {"items": [{"id": "ev-1"}], "next_cursor": "c2", "has_more": False}),
+    ]
+    client = SophosClient(tenant_id="t1", token_manager=mock.MagicMock())
+    monkeypatch.setattr(client, "_get", lambda url, params: requests.append(dict(params)) or responses.pop(0))
+    monkeypatch.setattr(sophos_client, "insert_siem_events",
+                        lambda db, events, tenant_id: {"inserted": len(events), "duplicates": 0})
+
+    result = client.fetch_siem_events(db)
+
+    assert result["success"] and result["total_events"] == 1
+    assert requests[0]["cursor"] == "expired"
+    assert "cursor" not in requests[1]
+    earliest = (datetime.now(timezone.utc) - SIEM_MAX_LOOKBACK).timestamp()
+    assert abs(requests[1]["from_date"] - earliest) < 60
+    assert get_sync_state(db, stream).cursor == "c2"
+
+def test_rejected_cursor_is_retried_only_once(db, monkeypatch):
+    stream = siem_stream("t1")
+    save_sync_state(db, stream, "expired", datetime.utcnow() - timedelta(hours=1))
+    client = SophosClient(tenant_id="t1", token_manager=mock.MagicMock())
+    monkeypatch.setattr(client, "_get", lambda url, params: page_response(400))
+
+    result = client.fetch_siem_events(db)
+
+    assert not result["success"]
+    assert "400 for SIEM events" in result["error"]
+    state = get_sync_state(db, stream)
+    assert state.cursor is None
+    assert state.high_water is not None
+
+WATERMARK = datetime(2024, 5, 2, 8)
+
+@pytest.fixture
+def endpoint_sync(db, monkeypatch):
+    """Client for tenant t1 whose endpoint pages come from ``responses``; records requests and writes."""
+    sync = SimpleNamespace(requests=[], responses=[], stored=[], stale_ids=[], stale_calls=[])
+    client = SophosClient(tenant_id="t1", token_manager=mock.MagicMock())
+    monkeypatch.setattr(client, "_get",
+                        lambda url, params: sync.requests.append(dict(params)) or sync.responses.pop(0))
+
+    def upsert_endpoints(db, endpoints, tenant_id):
+        sync.stored.extend(endpoint["id"] for endpoint in endpoints)
+        return {"inserted": 0, "updated": len(endpoints), "unchanged": 0}
+
+    def stale_online_endpoints(db, seen_ids, last_seen_before, tenant_id):
+        sync.stale_calls.append((set(seen_ids), last_seen_before))
+        return sync.stale_ids
+
+    monkeypatch.setattr(sophos_client, "upsert_endpoints", upsert_endpoints)
+    monkeypatch.setattr(sophos_client, "stale_online_endpoints", stale_online_endpoints)
+    monkeypatch.setattr(sophos_client, "sweep_endpoints", lambda *args, **kwargs: 0)
+    sync.client = client
+    return sync
+
+def endpoint_page(*endpoints):
+    return page_response(200, {"items": list(endpoints), "pages": {}})
+
+def test_incremental_endpoint_sync_reads_from_watermark_minus_overlap(db, endpoint_sync):
+    save_sync_state(db, endpoint_stream("t1"), None, WATERMARK)
+    endpoint_sync.responses = [endpoint_page(
+        {"id": "ep-1", "lastSeenAt": "2024-05-02T08:01:30.000Z"},
+        {"id": "ep-2", "lastSeenAt": "2024-05-02T07:59:50.000Z"},
+    )]
+
+    result = endpoint_sync.client.fetch_endpoints(db, incremental=True)
+
+    assert result["success"] and result["mode"] == "incremental" and result["generation"] is None
+    since = WATERMARK - ENDPOINT_WATERMARK_OVERLAP
+    assert endpoint_sync.requests[0]["lastSeenAfter"] == since.strftime('%Y-%m-%dT%H:%M:%S.000Z')
+    # Advanced to the newest lastSeenAt, whatever order the page had
+    assert get_sync_state(db, endpoint_stream("t1")).high_water == datetime(2024, 5, 2, 8, 1, 30)
+
+def test_incremental_endpoint_sync_rechecks_overdue_online_endpoints_by_id(db, endpoint_sync):
+    save_sync_state(db, endpoint_stream("t1"), None, WATERMARK)
+    endpoint_sync.stale_ids = ["ep-9"]
+    endpoint_sync.responses = [
+        endpoint_page({"id": "ep-1", "lastSeenAt": "2024-05-02T08:01:30.000Z"}),
+        endpoint_page({"id": "ep-9", "online": False, "lastSeenAt": "2024-05-02T07:40:00.000Z"}),
+    ]
+
+    result = endpoint_sync.client.fetch_endpoints(db, incremental=True)
+
+    assert result["success"] and result["pages_processed"] == 2
+    # Overdue is measured from the newest report the API returned
+    assert endpoint_sync.stale_calls == [({"ep-1"}, datetime(2024, 5, 2, 8, 1, 30) - ENDPOINT_OFFLINE_AFTER)]
+    assert endpoint_sync.requests[1]["ids"] == ["ep-9"]
+    assert "lastSeenAfter" not in endpoint_sync.requests[1]
+    assert endpoint_sync.stored == ["ep-1", "ep-9"]
+    assert get_sync_state(db, endpoint_stream("t1")).high_water == datetime(2024, 5, 2, 8, 1, 30)
+
+def test_incremental_endpoint_sync_without_new_reports_keeps_the_watermark(db, endpoint_sync):
+    save_sync_state(db, endpoint_stream("t1"), None, WATERMARK)
+    endpoint_sync.responses = [endpoint_page()]
+
+    assert endpoint_sync.client.fetch_endpoints(db, incremental=True)["success"]
+    assert endpoint_sync.stale_calls == [(set(), WATERMARK - ENDPOINT_OFFLINE_AFTER)]
+    assert get_sync_state(db, endpoint_stream("t1")).high_water == WATERMARK
+
+def test_failed_incremental_endpoint_sync_keeps_the_watermark(db, endpoint_sync):
+    save_sync_state(db, endpoint_stream("t1"), None, WATERMARK)
+    endpoint_sync.responses = [
+        page_response(200, {"items": [{"id": "ep-1", "lastSeenAt": "2024-05-02T08:01:30.000Z"}],
+                            "pages": {"nextKey": "k2"}}),
+        page_response(500),
+    ]
+
+    assert not endpoint_sync.client.fetch_endpoints(db, incremental=True)["success"]
+    assert get_sync_state(db, endpoint_stream("t1")).high_water == WATERMARK
+
+def test_incremental_endpoint_sync_without_watermark_runs_full(db, endpoint_sync):
+    endpoint_sync.responses = [endpoint_page({"id": "ep-1", "lastSeenAt": "2024-05-02T08:01:30.000Z"})]
+
+    result = endpoint_sync.client.fetch_endpoints(db, incremental=True)
+
+    assert result["mode"] == "full" and result["generation"] == 1
+    assert "lastSeenAfter" not in endpoint_sync.requests[0]
+    assert endpoint_sync.stale_calls == []
+    assert get_sync_state(db, endpoint_stream("t1")).high_water == datetime(2024, 5, 2, 8, 1, 30)
+
+def test_backfill_slices_sit_on_the_grid_and_cover_the_window(monkeypatch):
+    slices = []
+    client = SophosClient(tenant_id="t1", token_manager=mock.MagicMock())
+    monkeypatch.setattr(client, "_backfill_slice", lambda slice_start, slice_end, from_date, page_size, progress: (
+        slices.append((slice_start, slice_end, from_date))
+        or {"success": True, "slice_start": slice_start, "inserted": 0, "duplicates": 0}
+    ))
+
+    before = datetime.now(timezone.utc)
+    result = client.backfill_siem_events(hours=3, slice_minutes=60)
+    after = datetime.now(timezone.utc)
+
+    assert result["success"] and result["slices"] == len(slices)
+    slices.sort()
+    for slice_start, slice_end, from_date in slices:
+        assert slice_start == slice_start.replace(minute=0, second=0, microsecond=0)
+    # Contiguous, from three hours ago up to now
+    assert all(end == next_start for (_, end, _), (next_start, _, _) in zip(slices, slices[1:]))
+    assert before - timedelta(hours=3) <= slices[0][2] <= after - timedelta(hours=3)
+    assert slices[0][0] <= slices[0][2] < slices[0][1]
+    assert all(from_date == slice_start for slice_start, _, from_date in slices[1:])
+    assert before <= slices[-1][1] <= after
+
+def test_backfill_window_is_clamped_to_the_api_lookback(monkeypatch):
+    from_dates = []
+    client = SophosClient(tenant_id="t1", token_manager=mock.MagicMock())
+    monkeypatch.setattr(client, "_backfill_slice", lambda slice_start, slice_end, from_date, page_size, progress: (
+        from_dates.append(from_date) or {"success": True, "slice_start": slice_start}
+    ))
+
+    client.backfill_siem_events(hours=72, slice_minutes=60)
+
+    earliest = datetime.now(timezone.utc) - SIEM_MAX_LOOKBACK
+    assert abs((min(from_dates) - earliest).total_seconds()) < 60
+
+SLICE_START = datetime(2024, 5, 2, 8, tzinfo=timezone.utc)
+SLICE_END = datetime(2024, 5, 2, 9, tzinfo=timezone.utc)
+
+@pytest.fixture
+def backfill(db, monkeypatch):
+    """Client for tenant t1 whose SIEM pages come from ``responses``; records requests and stored events."""
+    sync = SimpleNamespace(requests=[], responses=[], stored=[])
+    client = SophosClient(tenant_id="t1", token_manager=mock.MagicMock())
+    monkeypatch.setattr(client, "_get",
+                        lambda url, params: sync.requests.append(dict(params)) or sync.responses.pop(0))
+    monkeypatch.setattr(sophos_client, "session_scope", lambda: contextlib.nullcontext(db))
+
+    def insert_siem_events(db, events, tenant_id):
+        sync.stored.extend(event["id"] for event in events)
+        return {"inserted": len(events), "duplicates": 0}
+
+    monkeypatch.setattr(sophos_client, "insert_siem_events", insert_siem_events)
+    sync.client = client
+    sync.stream = backfill_stream("t1", SLICE_START)
+    return sync
+
+def siem_page(*events, next_cursor=None):
+    items = [{"id": event_id, "created_at": created_at} for event_id, created_at in events]
+    return page_response(200, {"items": items, "next_cursor": next_cursor, "has_more": next_cursor is not None})
+
+def test_completed_backfill_slice_is_skipped(db, backfill):
+    save_sync_state(db, backfill.stream, None, SLICE_END)
+
+    result = backfill.client._backfill_slice(SLICE_START, SLICE_END, SLICE_START, 500)
+
+    assert result["success"] and result["skipped"]
+    assert backfill.requests == []
+
+def test_backfill_slice_checkpoints_its_cursor_after_each_page(db, backfill):
+    backfill.responses = [
+        siem_page(("ev-1", "2024-05-02T08:10:00.000Z"), next_cursor="c2"),
+        page_response(500),
+    ]
+
+    result = backfill.client._backfill_slice(SLICE_START, SLICE_END, SLICE_START, 500)
+
+    assert not result["success"]
+    assert backfill.requests[0]["from_date"] == int(SLICE_START.timestamp())
+    state = get_sync_state(db, backfill.stream)
+    assert (state.cursor, state.high_water) == ("c2", datetime(2024, 5, 2, 8, 10))
+
+def test_backfill_slice_resumes_from_its_saved_cursor(db, backfill):
+    save_sync_state(db, backfill.stream, "c2", datetime(2024, 5, 2, 8, 10))
+    backfill.responses = [siem_page(("ev-2", "2024-05-02T08:40:00.000Z"), ("ev-3", "2024-05-02T09:05:00.000Z"),
+                                    next_cursor="c3")]
+
+    result = backfill.client._backfill_slice(SLICE_START, SLICE_END, SLICE_START, 500)
+
+    assert result["success"] and not result["skipped"]
+    assert backfill.requests[0]["cursor"] == "c2"
+    assert "from_date" not in backfill.requests[0]
+    # ev-3 belongs to the next slice, which completes this one
+    assert backfill.stored == ["ev-2"]
+    state = get_sync_state(db, backfill.stream)
+    assert (state.cursor, state.high_water) == (None, datetime(2024, 5, 2, 9))
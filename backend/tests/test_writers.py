@@ -0,0 +1,283 @@
+from datetime import datetime
+from unittest import mock
+import pytest
+from sqlalchemy.dialects import postgresql
+from app import writers
+from app.writers import (
+    endpoint_fingerprint, upsert_endpoints, sweep_endpoints, stale_online_endpoints, insert_siem_events, SIEM_BATCH_SIZE
+)
+
+def compiled(stmt):
+    return str(stmt.compile(dialect=postgresql.dialect()))
+
+def fake_db(*results):
+    """Session whose execute() returns ``results`` in order and records the statements."""
+    db = mock.MagicMock()
+    db.execute.side_effect = list(results)
+    return db
+
+def returning(*values):
+    result = mock.MagicMock()
+    result.scalars.return_value.all.return_value = list(values)
+    return result
+
+def all_rows(*rows):
+    """Result whose all() returns ``rows``."""
+    result = mock.MagicMock()
+    result.all.return_value = list(rows)
+    return result
+
+def endpoint(n, **fields):
+    return {"id": f"ep-{n}", "hostname": f"host-{n}", "health": {"overall": "good"}, **fields}
+
+ENDPOINT = {
+    "id": "ep-1",
+    "hostname": "host-1",
+    "health": {"overall": "good", "threats": {"status": "good"}},
+    "ipv4Addresses": ["10.0.0.1"],
+    "lastSeenAt": "2024-05-01T12:00:00.000Z",
+}
+
+def test_fingerprint_ignores_key_order_and_last_seen():
+    reordered = dict(reversed(list(ENDPOINT.items())))
+    reordered["lastSeenAt"] = "2024-05-02T08:00:00.000Z"
+    assert endpoint_fingerprint(reordered) == endpoint_fingerprint(ENDPOINT)
+
+def test_fingerprint_changes_with_content():
+    changed = {**ENDPOINT, "health": {"overall": "bad", "threats": {"status": "good"}}}
+    assert endpoint_fingerprint(changed) != endpoint_fingerprint(ENDPOINT)
+
+def test_upsert_is_one_statement_on_endpoint_id():
+    db = fake_db(all_rows(), returning(True, False))
+    upsert_endpoints(db, [endpoint(1), endpoint(2)])
+
+    lookup, upsert = [call.args[0] for call in db.execute.call_args_list]
+    assert "WHERE endpoints.endpoint_id IN (__[POSTCOMPILE_endpoint_id_1])" in compiled(lookup)
+    sql = compiled(upsert)
+    assert "ON CONFLICT (endpoint_id) DO UPDATE SET" in sql
+    assert ("WHERE endpoints.content_hash IS DISTINCT FROM excluded.content_hash "
+            "OR endpoints.deleted_at IS NOT NULL") in sql
+    assert sql.endswith("RETURNING (xmax = 0) AS inserted")
+    db.commit.assert_called_once()
+
+def test_upsert_counts_inserted_updated_and_unchanged():
+    # ep-2 is stored with an old fingerprint, ep-3 with its current one
+    db = fake_db(
+        all_rows(("ep-2", "old", None, None), ("ep-3", endpoint_fingerprint(endpoint(3)), None, None)),
+        returning(True, False),
+    )
+    counts = upsert_endpoints(db, [endpoint(1), endpoint(2), endpoint(3)])
+
+    params = db.execute.call_args.args[0].compile(dialect=postgresql.dialect()).params
+    assert [params["endpoint_id_m0"], params["endpoint_id_m1"]] == ["ep-1", "ep-2"]
+    assert "endpoint_id_m2" not in params
+    assert counts == {"inserted": 1, "updated": 1, "unchanged": 1}
+
+def test_unchanged_page_is_not_written():
+    page = [endpoint(1), endpoint(2, lastSeenAt="2024-05-02T08:00:00.000Z")]
+    db = fake_db(all_rows(
+        ("ep-1", endpoint_fingerprint(page[0]), None, None),
+        ("ep-2", endpoint_fingerprint(page[1]), None, datetime(2024, 5, 2, 8)),
+    ))
+    page[1]["lastSeenAt"] = "2024-05-02T08:02:00.000Z"
+
+    assert upsert_endpoints(db, page) == {"inserted": 0, "updated": 0, "unchanged": 2}
+    assert db.execute.call_count == 1
+    db.commit.assert_called_once()
+
+def test_last_seen_of_unchanged_endpoint_moves_forward_once_behind():
+    page = [endpoint(1, lastSeenAt="2024-05-02T08:06:00.000Z"), endpoint(2, lastSeenAt="2024-05-02T08:03:00.000Z")]
+    db = fake_db(all_rows(*[(data["id"], endpoint_fingerprint(data), None, datetime(2024, 5, 2, 8)) for data in page]),
+                 mock.MagicMock())
+
+    assert upsert_endpoints(db, page) == {"inserted": 0, "updated": 0, "unchanged": 2}
+    touch = db.execute.call_args
+    assert compiled(touch.args[0]) == (
+        "UPDATE endpoints SET last_seen_at=%(b_last_seen_at)s, updated_at=endpoints.updated_at "
+        "WHERE endpoints.endpoint_id = %(b_endpoint_id)s"
+    )
+    # ep-2 is less than LAST_SEEN_RESOLUTION behind
+    assert touch.args[1] == [{"b_endpoint_id": "ep-1", "b_last_seen_at": datetime(2024, 5, 2, 8, 6)}]
+    db.commit.assert_called_once()
+
+def test_changed_endpoint_stores_last_seen_as_naive_utc():
+    db = fake_db(all_rows(), returning(True))
+    upsert_endpoints(db, [endpoint(1, lastSeenAt="2024-05-02T10:06:00.000+02:00")])
+
+    params = db.execute.call_args.args[0].compile(dialect=postgresql.dialect()).params
+    assert params["last_seen_at_m0"] == datetime(2024, 5, 2, 8, 6)
+
+def test_retired_endpoint_that_reappears_is_restored():
+    data = endpoint(1)
+    db = fake_db(all_rows(("ep-1", endpoint_fingerprint(data), datetime(2024, 5, 1), None)), returning(False))
+    assert upsert_endpoints(db, [data]) == {"inserted": 0, "updated": 1, "unchanged": 0}
+
+    stmt = db.execute.call_args.args[0]
+    assert "deleted_at = %(" in compiled(stmt).split("DO UPDATE SET", 1)[1]
+    assert stmt.compile(dialect=postgresql.dialect()).params["deleted_at_m0"] is None
+
+def test_upsert_keeps_last_copy_of_repeated_endpoint():
+    db = fake_db(all_rows(), returning(True))
+    counts = upsert_endpoints(db, [endpoint(1, hostname="old"), endpoint(1, hostname="new"), {"hostname": "no-id"}])
+
+    params = db.execute.call_args.args[0].compile(dialect=postgresql.dialect()).params
+    assert params["endpoint_id_m0"] == "ep-1"
+    assert params["hostname_m0"] == "new"
+    assert "endpoint_id_m1" not in params
+    assert counts == {"inserted": 1, "updated": 0, "unchanged": 0}
+
+def test_upsert_of_empty_page_skips_the_database():
+    db = fake_db()
+    assert upsert_endpoints(db, [{"hostname": "no-id"}]) == {"inserted": 0, "updated": 0, "unchanged": 0}
+    db.execute.assert_not_called()
+
+def test_failed_upsert_rolls_back():
+    db = fake_db(all_rows(), RuntimeError("boom"))
+    with pytest.raises(RuntimeError):
+        upsert_endpoints(db, [endpoint(1)])
+    db.rollback.assert_called_once()
+    db.commit.assert_not_called()
+
+def updated(rowcount):
+    result = mock.MagicMock()
+    result.rowcount = rowcount
+    return result
+
+def test_sweep_retires_unseen_live_endpoints_of_the_tenant():
+    db = fake_db(updated(2))
+    assert sweep_endpoints(db, {"ep-1", "ep-2"}, "t1") == 2
+
+    stmt = db.execute.call_args.args[0]
+    sql = compiled(stmt)
+    assert sql.startswith("UPDATE endpoints SET deleted_at=")
+    where = sql.split(" WHERE ", 1)[1]
+    assert "endpoints.deleted_at IS NULL" in where
+    assert "endpoints.endpoint_id != ALL (%(seen_ids)s::VARCHAR[])" in where
+    assert "endpoints.tenant_id = %(tenant_id_1)s" in where
+    params = stmt.compile(dialect=postgresql.dialect()).params
+    assert sorted(params["seen_ids"]) == ["ep-1", "ep-2"]
+    assert params["tenant_id_1"] == "t1"
+    db.commit.assert_called_once()
+
+def test_sweep_of_the_configured_tenant_includes_untenanted_rows():
+    db = fake_db(updated(3))
+    sweep_endpoints(db, ["ep-1"], "t1", include_untenanted=True)
+
+    where = compiled(db.execute.call_args.args[0]).split(" WHERE ", 1)[1]
+    assert "(endpoints.tenant_id = %(tenant_id_1)s OR endpoints.tenant_id IS NULL)" in where
+
+def test_single_tenant_sweep_is_not_scoped():
+    db = fake_db(updated(0))
+    sweep_endpoints(db, ["ep-1"])
+    assert "tenant_id" not in compiled(db.execute.call_args.args[0])
+
+def test_sweep_without_seen_endpoints_retires_nothing():
+    db = fake_db()
+    assert sweep_endpoints(db, [], "t1") == 0
+    db.execute.assert_not_called()
+
+def scalars(*values):
+    result = mock.MagicMock()
+    result.scalars.return_value = iter(values)
+    return result
+
+def test_stale_online_endpoints_are_the_overdue_ones_not_just_seen():
+    db = fake_db(scalars("ep-3"))
+    assert stale_online_endpoints(db, ["ep-1"], datetime(2024, 5, 2, 8), "t1") == ["ep-3"]
+
+    stmt = db.execute.call_args.args[0]
+    where = compiled(stmt).split("WHERE", 1)[1]
+    assert "endpoints.deleted_at IS NULL AND endpoints.online_status IS true" in where
+    assert "(endpoints.last_seen_at IS NULL OR endpoints.last_seen_at < %(last_seen_at_1)s)" in where
+    assert "endpoints.endpoint_id != ALL (%(seen_ids)s::VARCHAR[])" in where
+    assert "endpoints.tenant_id = %(tenant_id_1)s" in where
+    params = stmt.compile(dialect=postgresql.dialect()).params
+    assert (params["last_seen_at_1"], params["seen_ids"]) == (datetime(2024, 5, 2, 8), ["ep-1"])
+
+def siem_event(n, **fields):
+    return {"id": f"ev-{n}", "type": "Event::Endpoint::Threat", "severity": "high",
+            "created_at": "2024-05-01T12:00:00.000Z", **fields}
+
+@pytest.fixture
+def partitions(monkeypatch):
+    """Months the writer asked partitions for, instead of creating them."""
+    months = []
+    monkeypatch.setattr(writers, "ensure_partitions", lambda created: months.extend(created))
+    return months
+
+CREATED = datetime(2024, 5, 1, 12)
+
+def test_siem_insert_skips_conflicts_and_stores_new_payloads(partitions, monkeypatch):
+    broadcaster = mock.MagicMock()
+    monkeypatch.setattr(writers, "event_broadcaster", broadcaster)
+    db = fake_db(all_rows((7, "ev-1", CREATED)), mock.MagicMock(), mock.MagicMock())
+    counts = insert_siem_events(db, [siem_event(1), siem_event(2), {"type": "no-id"}])
+
+    events, payloads, rollups = [call.args[0] for call in db.execute.call_args_list]
+    sql = compiled(events)
+    assert "raw_data" not in sql
+    assert "ON CONFLICT (event_id, created_at) DO NOTHING" in sql
+    assert sql.endswith("RETURNING siem_events.id, siem_events.event_id, siem_events.created_at")
+
+    sql = compiled(payloads)
+    assert sql.startswith("INSERT INTO siem_event_payloads (event_id, created_at, raw_data)")
+    assert "ON CONFLICT DO NOTHING" in sql
+    params = payloads.compile(dialect=postgresql.dialect()).params
+    assert params["event_id_m0"] == "ev-1"
+    assert params["raw_data_m0"]["id"] == "ev-1"
+    assert "event_id_m1" not in params
+
+    # Only the new event is counted in the rollups, once per dimension
+    params = rollups.compile(dialect=postgresql.dialect()).params
+    assert compiled(rollups).startswith("INSERT INTO siem_event_rollups")
+    assert sorted(value for name, value in params.items() if name.startswith("count_m")) == [1, 1, 1, 1]
+
+    assert counts == {"inserted": 1, "duplicates": 1}
+    db.commit.assert_called_once()
+    # Stream subscribers get the committed new event with its row id
+    [published] = broadcaster.publish.call_args.args[0]
+    assert (published["id"], published["event_id"]) == (7, "ev-1")
+
+def test_siem_event_repeated_in_a_page_is_stored_once(partitions, monkeypatch):
+    broadcaster = mock.MagicMock()
+    monkeypatch.setattr(writers, "event_broadcaster", broadcaster)
+    db = fake_db(all_rows((7, "ev-1", CREATED)), mock.MagicMock(), mock.MagicMock())
+    counts = insert_siem_events(db, [siem_event(1, severity="low"), siem_event(1)])
+
+    events, payloads, rollups = [call.args[0] for call in db.execute.call_args_list]
+    params = events.compile(dialect=postgresql.dialect()).params
+    assert (params["event_id_m0"], params["severity_m0"]) == ("ev-1", "high")
+    assert "event_id_m1" not in params
+    assert "event_id_m1" not in payloads.compile(dialect=postgresql.dialect()).params
+    params = rollups.compile(dialect=postgresql.dialect()).params
+    assert sorted(value for name, value in params.items() if name.startswith("count_m")) == [1, 1, 1, 1]
+    assert len(broadcaster.publish.call_args.args[0]) == 1
+    assert counts == {"inserted": 1, "duplicates": 1}
+
+def test_siem_insert_batches_a_page_in_one_transaction(partitions):
+    db = fake_db(all_rows(), all_rows(), all_rows())
+    events = [siem_event(n) for n in range(SIEM_BATCH_SIZE * 2 + 1)]
+    counts = insert_siem_events(db, events)
+
+    batch_sizes = [
+        sum(1 for name in call.args[0].compile(dialect=postgresql.dialect()).params if name.startswith("event_id_m"))
+        for call in db.execute.call_args_list
+    ]
+    assert batch_sizes == [SIEM_BATCH_SIZE, SIEM_BATCH_SIZE, 1]
+    assert counts == {"inserted": 0, "duplicates": len(events)}
+    db.commit.assert_called_once()
+
+def test_events_are_keyed_by_their_own_timestamp(partitions):
+    db = fake_db(all_rows())
+    insert_siem_events(db, [
+        siem_event(1, created_at="2024-05-01T14:00:00.000+02:00"),
+        siem_event(2, created_at=None, when="2024-06-03T08:00:00.000Z"),
+        siem_event(3, created_at=None),
+    ])
+
+    params = db.execute.call_args_list[0].args[0].compile(dialect=postgresql.dialect()).params
+    created = [params["created_at_m0"], params["created_at_m1"]]
+    # Naive UTC, as Postgres returns them, so RETURNING keys match
+    assert created == [CREATED, datetime(2024, 6, 3, 8)]
+    assert "created_at_m2" not in params
+    assert list(partitions) == created
@@ -4,43 +4,26 @@ Sophos Central Endpoint Inventory
 Fetches ALL endpoints from Sophos Central with proper pagination
 """
 
-import requests
 import json
 from datetime import datetime
-import time
 import os
+import sys
 
-def get_access_token(client_id, client_secret):
-    """Get access token from Sophos API."""
-    token_url = "https://id.sophos.com/api/v2/oauth2/token"
-    
-    headers = {
-        "Content-Type": "application/x-www-form-urlencoded"
-    }
-    
-    data = {
-        "grant_type": "client_credentials",
-        "client_id": client_id,
-        "client_secret": client_secret,
-        "scope": "token"
-    }
-    
-    try:
-        response = requests.post(token_url, headers=headers, data=data)
-        response.raise_for_status()
-        
-        token_data = response.json()
-        return token_data.get("access_token")
-    except Exception as e:
-        print(f"❌ Error getting access token: {e}")
-        return None
+# Reuse the backend's pooled HTTP session, token cache and rate limiter
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend"))
+from app.http_client import create_session, DEFAULT_API_HOST
+from app.rate_limit import get_rate_limiter
+from app.auth import TokenManager
+
+# One keep-alive session for every request, instead of a new connection per page
+session = create_session()
 
-def get_endpoint_inventory_fixed(access_token, tenant_id, page_size=100):
+def get_endpoint_inventory_fixed(token_manager, tenant_id, page_size=100):
     """Get ALL endpoints from Sophos Central with proper pagination."""
-    base_url = "https://api-us01.central.sophos.com/endpoint/v1/endpoints"
+    base_url = DEFAULT_API_HOST + "/endpoint/v1/endpoints"
+    rate_limiter = get_rate_limiter(DEFAULT_API_HOST, tenant_id)
     
     headers = {
-        "Authorization": f"Bearer {access_token}",
         "X-Tenant-ID": tenant_id,
         "Accept": "application/json"
     }
@@ -65,7 +48,7 @@ def get_endpoint_inventory_fixed(access_token, tenant_id, page_size=100):
             if page_count > 1 and hasattr(get_endpoint_inventory_fixed, 'next_key'):
                 params['pageFromKey'] = get_endpoint_inventory_fixed.next_key
             
-            response = requests.get(base_url, headers=headers, params=params)
+            response = token_manager.request("GET", base_url, rate_limiter=rate_limiter, headers=headers, params=params)
             
             if response.status_code == 200:
                 data = response.json()
@@ -87,9 +70,6 @@ def get_endpoint_inventory_fixed(access_token, tenant_id, page_size=100):
                 # Store next key for next iteration
                 get_endpoint_inventory_fixed.next_key = pages_info['nextKey']
                 
-                # Small delay to avoid rate limiting
-                time.sleep(0.1)
-                
             else:
                 print(f"   ❌ Error: {response.status_code} - {response.text}")
                 break
@@ -220,8 +200,8 @@ def main():
     
     # Get access token
     print("🔑 Obtaining access token...")
-    access_token = get_access_token(CLIENT_ID, CLIENT_SECRET)
-    if not access_token:
+    token_manager = TokenManager(CLIENT_ID, CLIENT_SECRET, session=session)
+    if not token_manager.get_token():
         print("❌ Failed to get access token")
         return
     
@@ -229,7 +209,7 @@ def main():
     
     # Get ALL endpoints with proper pagination (faster with larger page size)
     print(f"\n📡 Fetching ALL endpoint inventory...")
-    all_endpoints = get_endpoint_inventory_fixed(access_token, TENANT_ID, page_size=100)
+    all_endpoints = get_endpoint_inventory_fixed(token_manager, TENANT_ID, page_size=100)
     
     if all_endpoints:
         # Analyze endpoints
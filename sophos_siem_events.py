@@ -1,39 +1,31 @@
-import requests
+import heapq
 import json
+import textwrap
 from datetime import datetime, timedelta
-import time
+import os
+import sys
 
-def get_access_token(client_id, client_secret):
-    """Get access token from Sophos API."""
-    token_url = "https://id.sophos.com/api/v2/oauth2/token"
-    
-    headers = {
-        "Content-Type": "application/x-www-form-urlencoded"
-    }
-    
-    data = {
-        "grant_type": "client_credentials",
-        "client_id": client_id,
-        "client_secret": client_secret,
-        "scope": "token"
-    }
-    
-    try:
-        response = requests.post(token_url, headers=headers, data=data)
-        response.raise_for_status()
-        
-        token_data = response.json()
-        return token_data.get("access_token")
-    except Exception as e:
-        print(f"❌ Error getting access token: {e}")
-        return None
+try:
+    import ijson
+except ImportError:
+    ijson = None
 
-def get_siem_events(access_token, tenant_id, event_type=None, days_back=7, page_size=100):
-    """Get SIEM events with optional filtering."""
-    base_url = "https://api-us01.central.sophos.com/siem/v1/events"
+# Reuse the backend's pooled HTTP session, token cache and rate limiter
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend"))
+from app.http_client import create_session, DEFAULT_API_HOST
+from app.rate_limit import get_rate_limiter
+from app.auth import TokenManager
+from app.streaming import parse_page
+
+# One keep-alive session for every request, instead of a new connection per page
+session = create_session()
+
+def iter_siem_events(token_manager, tenant_id, event_type=None, days_back=7, page_size=100, api_host=DEFAULT_API_HOST):
+    """Yield SIEM events one page at a time, with optional filtering."""
+    base_url = api_host + "/siem/v1/events"
+    rate_limiter = get_rate_limiter(api_host, tenant_id)
     
     headers = {
-        "Authorization": f"Bearer {access_token}",
         "X-Tenant-ID": tenant_id
     }
     
@@ -50,7 +42,7 @@ def get_siem_events(access_token, tenant_id, event_type=None, days_back=7, page_
     if event_type:
         params["eventType"] = event_type
     
-    all_events = []
+    total = 0
     has_more = True
     
     print(f"📡 Fetching SIEM events from {start_date.strftime('%Y-%m-%d')} to {end_date.strftime('%Y-%m-%d')}")
@@ -59,37 +51,45 @@ def get_siem_events(access_token, tenant_id, event_type=None, days_back=7, page_
     
     while has_more:
         try:
-            response = requests.get(base_url, headers=headers, params=params)
+            response = token_manager.request(
+                "GET", base_url, rate_limiter=rate_limiter, headers=headers, params=params, stream=True
+            )
             response.raise_for_status()
             
-            data = response.json()
-            events = data.get("items", [])
-            all_events.extend(events)
-            
-            print(f"   ✅ Retrieved {len(events)} events (Total: {len(all_events)})")
-            
-            has_more = data.get("has_more", False)
-            
-            # Small delay to avoid rate limiting
-            time.sleep(0.1)
-            
+            # Parsed straight off the socket; only this page is held in memory
+            data = parse_page(response)
         except Exception as e:
             print(f"❌ Error fetching events: {e}")
             break
-    
-    return all_events
+        
+        events = data.get("items", [])
+        total += len(events)
+        print(f"   ✅ Retrieved {len(events)} events (Total: {total})")
+        
+        yield from events
+        
+        has_more = data.get("has_more", False) and bool(data.get("next_cursor"))
+        params["cursor"] = data.get("next_cursor")
+
+def get_siem_events(token_manager, tenant_id, event_type=None, days_back=7, page_size=100):
+    """Get SIEM events with optional filtering, as a list."""
+    return list(iter_siem_events(token_manager, tenant_id, event_type, days_back, page_size))
+
+def load_exported_events(filepath):
+    """Stream events back out of an exported JSON file."""
+    with open(filepath, 'rb') as f:
+        if ijson is None:
+            yield from json.load(f)
+        else:
+            yield from ijson.items(f, "item", use_float=True)
 
 def analyze_events(events):
-    """Analyze events and provide statistics."""
-    if not events:
-        print("❌ No events to analyze")
-        return
-    
-    print(f"\n📊 SIEM EVENTS ANALYSIS")
-    print("=" * 60)
-    print(f"Total Events: {len(events)}")
+    """Analyze events and provide statistics.
     
+    Takes any iterable and makes a single pass, so events can be streamed.
+    """
     # Event type analysis
+    total_events = 0
     event_types = {}
     severity_counts = {}
     endpoint_counts = {}
@@ -97,6 +97,8 @@ def analyze_events(events):
     group_counts = {}
     
     for event in events:
+        total_events += 1
+        
         # Event type
         event_type = event.get("type", "Unknown")
         event_types[event_type] = event_types.get(event_type, 0) + 1
@@ -117,6 +119,14 @@ def analyze_events(events):
         group = event.get("group", "Unknown")
         group_counts[group] = group_counts.get(group, 0) + 1
     
+    if not total_events:
+        print("❌ No events to analyze")
+        return
+    
+    print(f"\n📊 SIEM EVENTS ANALYSIS")
+    print("=" * 60)
+    print(f"Total Events: {total_events}")
+    
     # Display statistics
     print(f"\n🔍 Event Types:")
     for event_type, count in sorted(event_types.items(), key=lambda x: x[1], reverse=True):
@@ -140,7 +150,9 @@ def analyze_events(events):
 
 def display_recent_events(events, limit=20):
     """Display recent events in a formatted table."""
-    if not events:
+    # Keeps only the newest `limit` events while iterating
+    recent_events = heapq.nlargest(limit, events, key=lambda x: x.get("created_at", ""))
+    if not recent_events:
         print("❌ No events to display")
         return
     
@@ -149,10 +161,7 @@ def display_recent_events(events, limit=20):
     print(f"{'Time':<20} {'Type':<35} {'Severity':<8} {'Source':<25} {'Name':<30}")
     print("=" * 120)
     
-    # Sort by creation time (newest first)
-    sorted_events = sorted(events, key=lambda x: x.get("created_at", ""), reverse=True)
-    
-    for event in sorted_events[:limit]:
+    for event in recent_events:
         created_at = event.get("created_at", "")
         if created_at:
             try:
@@ -177,50 +186,62 @@ def display_recent_events(events, limit=20):
     
     print("=" * 120)
 
-def get_events_by_type(access_token, tenant_id, event_types=None):
-    """Get events filtered by specific types."""
+def get_events_by_type(token_manager, tenant_id, event_types=None):
+    """Get events filtered by specific types, as lazy per-type iterators."""
     if not event_types:
         event_types = ["threat", "malware", "firewall", "dlp", "web", "device", "user", "system"]
     
-    print(f"\n🔍 Fetching Events by Type")
-    print("=" * 60)
-    
-    all_events_by_type = {}
-    
-    for event_type in event_types:
-        print(f"📡 Fetching {event_type} events...")
-        events = get_siem_events(access_token, tenant_id, event_type=event_type, days_back=7)
-        all_events_by_type[event_type] = events
-        print(f"   ✅ Retrieved {len(events)} {event_type} events")
-    
-    return all_events_by_type
+    return {
+        event_type: iter_siem_events(token_manager, tenant_id, event_type=event_type, days_back=7)
+        for event_type in event_types
+    }
+
+def write_json_array(f, events, indent=""):
+    """Write events as a JSON array one at a time, returning how many were written."""
+    count = 0
+    f.write("[")
+    for event in events:
+        f.write(",\n" if count else "\n")
+        f.write(textwrap.indent(json.dumps(event, indent=2), indent + "  "))
+        count += 1
+    f.write(f"\n{indent}]" if count else "]")
+    return count
 
 def export_events_to_json(events, filename="sophos_siem_events.json"):
-    """Export events to JSON file."""
+    """Export events to JSON file, streaming them to disk.
+    
+    Returns the file path and number of events written.
+    """
+    filepath = os.path.join("data", filename)
     try:
         # Ensure data folder exists
-        import os
         os.makedirs("data", exist_ok=True)
         
         # Save to data folder
-        filepath = os.path.join("data", filename)
         with open(filepath, 'w') as f:
-            json.dump(events, f, indent=2)
+            count = write_json_array(f, events)
         print(f"✅ Events exported to {filepath}")
+        return filepath, count
     except Exception as e:
         print(f"❌ Error exporting events: {e}")
+        return filepath, 0
 
 def export_events_by_type_to_json(events_by_type, filename="sophos_siem_events_by_type.json"):
-    """Export events grouped by type to JSON file."""
+    """Export events grouped by type to JSON file, streaming each type's events."""
     try:
         # Ensure data folder exists
-        import os
         os.makedirs("data", exist_ok=True)
         
         # Save to data folder
         filepath = os.path.join("data", filename)
         with open(filepath, 'w') as f:
-            json.dump(events_by_type, f, indent=2)
+            f.write("{")
+            for index, (event_type, events) in enumerate(events_by_type.items()):
+                f.write(",\n" if index else "\n")
+                f.write(f"  {json.dumps(event_type)}: ")
+                count = write_json_array(f, events, indent="  ")
+                print(f"   ✅ Retrieved {count} {event_type} events")
+            f.write("\n}" if events_by_type else "}")
         print(f"✅ Events by type exported to {filepath}")
     except Exception as e:
         print(f"❌ Error exporting events by type: {e}")
@@ -235,33 +256,32 @@ def main():
     print("=" * 60)
     
     # Get access token
-    access_token = get_access_token(CLIENT_ID, CLIENT_SECRET)
-    if not access_token:
+    token_manager = TokenManager(CLIENT_ID, CLIENT_SECRET, session=session)
+    if not token_manager.get_token():
         print("❌ Failed to get access token")
         return
     
     print("✅ Access token obtained successfully")
     
-    # Get all SIEM events (last 7 days)
+    # Get all SIEM events (last 7 days), streamed straight to the export file
     print(f"\n📡 Fetching all SIEM events...")
-    all_events = get_siem_events(access_token, TENANT_ID, days_back=7)
+    filepath, total_events = export_events_to_json(iter_siem_events(token_manager, TENANT_ID, days_back=7))
     
-    if all_events:
+    if total_events:
         # Analyze events
-        analyze_events(all_events)
+        analyze_events(load_exported_events(filepath))
         
         # Display recent events
-        display_recent_events(all_events, limit=20)
-        
-        # Export all events
-        export_events_to_json(all_events)
+        display_recent_events(load_exported_events(filepath), limit=20)
         
         # Get events by type
-        events_by_type = get_events_by_type(access_token, TENANT_ID)
+        print(f"\n🔍 Fetching Events by Type")
+        print("=" * 60)
+        events_by_type = get_events_by_type(token_manager, TENANT_ID)
         export_events_by_type_to_json(events_by_type)
         
         print(f"\n🎉 SIEM Events retrieval completed!")
-        print(f"   Total events retrieved: {len(all_events)}")
+        print(f"   Total events retrieved: {total_events}")
         print(f"   Time range: Last 7 days")
         print(f"   Files created: data/sophos_siem_events.json, data/sophos_siem_events_by_type.json")
     else: